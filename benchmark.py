@@ -0,0 +1,277 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from config import SystemConfig
+from scenario.hex_grid import generate_hexagonal_grid
+from scenario.signal_calculation import calculate_Rxlev_bs, calculate_Rxlev_rbs
+from scenario.ue_movement import simulate_ue_movement
+
+# 各階段的規模點：quick 供開發時快速檢查，full 接近實際模擬規模
+SCALES = {
+    'quick': {
+        'hex_grid_layers': [1, 5, 10],
+        'movement': [(1, 3601), (100, 3601)],
+        'rxlev_layers': [1, 2],
+        'rxlev_size': (10, 3601),
+        'handover': [(1, 3601), (10, 3601)],
+        'csv': [(10, 3601)],
+        'plot': [(1, 3601)]
+    },
+    'full': {
+        'hex_grid_layers': [1, 5, 10, 20],
+        'movement': [(1, 36001), (100, 36001), (1000, 3601)],
+        'rxlev_layers': [1, 2, 4],
+        'rxlev_size': (100, 3601),
+        'handover': [(1, 36001), (100, 3601)],
+        'csv': [(10, 36001)],
+        'plot': [(1, 3601), (1, 36001)]
+    }
+}
+
+def make_config(num_ue, num_steps, seed=0, **overrides):
+    """建立指定UE數量與時間步數(間隔0.1秒)的系統配置"""
+    config = SystemConfig(seed=seed, NUM_UE=num_ue, **overrides)
+    config.T = config.T[0] + np.arange(num_steps) * (config.T[1] - config.T[0])
+    return config
+
+def make_positions(config):
+    return simulate_ue_movement(config.ue_initial_positions, config.V, config.T, config.MAP_SIZE, rng=config.rng)
+
+def make_signals(config, ue_positions):
+    Rxlev_bs = calculate_Rxlev_bs(config.Pt_bs, config.Gt_bs, config.Gr_bs, config.bs_coords,
+                                  ue_positions, config.wavelength, rng=config.rng)
+    Rxlev_rbs = calculate_Rxlev_rbs(config.Pt_rbs, config.Gt_rbs, config.Gr_rbs, config.rbs_coords,
+                                    ue_positions, config.wavelength, rng=config.rng)
+    return Rxlev_bs, Rxlev_rbs
+
+def attack_periods_for(T):
+    """在時間序列中段放一次攻擊，與預設情境的比例相近"""
+    duration = T[-1] - T[0]
+    return [(T[0] + 0.3 * duration, T[0] + 0.5 * duration)]
+
+def bench_hex_grid(scale, workdir):
+    for layers in scale['hex_grid_layers']:
+        num_cells = 1 + 3 * layers * (layers + 1)
+        yield {'layers': layers}, num_cells, 'cells', lambda layers=layers: generate_hexagonal_grid(500, 500, 250, layers)
+
+def bench_movement(scale, workdir):
+    for num_ue, num_steps in scale['movement']:
+        config = make_config(num_ue, num_steps)
+
+        def run(config=config):
+            return simulate_ue_movement(config.ue_initial_positions, config.V, config.T, config.MAP_SIZE,
+                                        rng=np.random.default_rng(0))
+        yield {'NUM_UE': num_ue, 'steps': num_steps}, num_ue * num_steps, 'UE-timesteps', run
+
+def bench_rxlev(scale, workdir):
+    num_ue, num_steps = scale['rxlev_size']
+    for layers in scale['rxlev_layers']:
+        config = make_config(num_ue, num_steps, LAYERS=layers, NUM_BS=None)
+        ue_positions = make_positions(config)
+
+        def run(config=config, ue_positions=ue_positions):
+            return make_signals(config, ue_positions)
+        params = {'NUM_UE': num_ue, 'steps': num_steps, 'NUM_BS': config.NUM_BS, 'NUM_RBS': config.NUM_RBS}
+        yield params, num_ue * num_steps, 'UE-timesteps', run
+
+def bench_handover(scale, workdir):
+    from visualization.rogue_bs_signal_plot import rogue_bs_data
+
+    for num_ue, num_steps in scale['handover']:
+        config = make_config(num_ue, num_steps)
+        Rxlev_bs, Rxlev_rbs = make_signals(config, make_positions(config))
+
+        def run(config=config, Rxlev_bs=Rxlev_bs, Rxlev_rbs=Rxlev_rbs):
+            return rogue_bs_data(config.T, Rxlev_bs, Rxlev_rbs, config.NUM_UE, config.NUM_BS, config.NUM_RBS,
+                                 attack_periods_for(config.T), plot=False, dataset_path=None)
+        yield {'NUM_UE': num_ue, 'steps': num_steps}, num_ue * num_steps, 'UE-timesteps', run
+
+def bench_csv(scale, workdir):
+    from visualization.rogue_bs_signal_plot import rogue_bs_data
+
+    for num_ue, num_steps in scale['csv']:
+        config = make_config(num_ue, num_steps)
+        Rxlev_bs, Rxlev_rbs = make_signals(config, make_positions(config))
+        dataset_path = os.path.join(workdir, f'dataset_{num_ue}_{num_steps}')
+        csv_path = dataset_path + '.csv'
+
+        def run(config=config, Rxlev_bs=Rxlev_bs, Rxlev_rbs=Rxlev_rbs, dataset_path=dataset_path,
+                csv_path=csv_path):
+            return rogue_bs_data(config.T, Rxlev_bs, Rxlev_rbs, config.NUM_UE, config.NUM_BS, config.NUM_RBS,
+                                 attack_periods_for(config.T), plot=False, dataset_path=dataset_path,
+                                 csv_path=csv_path)
+        yield {'NUM_UE': num_ue, 'steps': num_steps}, num_ue * num_steps, 'UE-timesteps', run
+
+def bench_plot(scale, workdir):
+    import matplotlib.pyplot as plt
+    from scenario.handover import simulate_handover
+    from visualization.rogue_bs_signal_plot import plot_all_bs_signal, plot_handover_signal
+
+    for num_ue, num_steps in scale['plot']:
+        config = make_config(num_ue, num_steps)
+        Rxlev_bs, Rxlev_rbs = make_signals(config, make_positions(config))
+        all_signals = np.concatenate([Rxlev_bs, Rxlev_rbs], axis=2)
+        serving, handover, _ = simulate_handover(all_signals, config.NUM_BS)
+        params = {'NUM_UE': num_ue, 'steps': num_steps}
+
+        def run_all(config=config, Rxlev_bs=Rxlev_bs, Rxlev_rbs=Rxlev_rbs):
+            plot_all_bs_signal(config.T, Rxlev_bs, Rxlev_rbs, config.NUM_UE, config.NUM_BS, config.NUM_RBS,
+                               output_dir=workdir)
+            plt.close('all')
+
+        def run_handover(config=config, all_signals=all_signals, serving=serving, handover=handover):
+            plot_handover_signal(config.T, all_signals, serving, handover, config.NUM_BS,
+                                 attack_periods_for(config.T), output_dir=workdir)
+            plt.close('all')
+        yield dict(params, plot='all_bs_signal'), num_ue * num_steps, 'UE-timesteps', run_all
+        yield dict(params, plot='handover_signal'), num_ue * num_steps, 'UE-timesteps', run_handover
+
+# 階段名稱與產生測試案例的函數，每個案例為 (參數, 工作量, 工作量單位, 執行函數)
+BENCHMARKS = {
+    'hex_grid': bench_hex_grid,
+    'ue_movement': bench_movement,
+    'rxlev': bench_rxlev,
+    'handover': bench_handover,
+    'csv': bench_csv,
+    'plot': bench_plot
+}
+
+def measure(run, repeat=3):
+    """
+    量測執行時間與記憶體峰值
+
+    先在 tracemalloc 下執行一次取得峰值(numpy 的配置也會被追蹤)，
+    再不追蹤地重複執行 repeat 次計時，避免追蹤的額外成本影響時間。
+
+    Returns:
+        dict: 最短與中位數時間(秒)、記憶體峰值(bytes)
+    """
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return {'wall_min': min(times), 'wall_median': float(np.median(times)), 'peak_bytes': int(peak)}
+
+def case_key(stage, params):
+    return stage + ' ' + json.dumps(params, sort_keys=True)
+
+def run_benchmarks(scale='quick', stages=None, repeat=3):
+    """
+    執行各階段的基準測試
+
+    Args:
+        scale: 'quick' 或 'full'
+        stages: 要執行的階段名稱列表，None表示全部
+        repeat: 計時重複次數
+
+    Returns:
+        dict: 執行環境資訊與每個案例的結果
+    """
+    results = []
+    workdir = tempfile.mkdtemp(prefix='rogue_bs_bench_')
+    try:
+        for stage in stages or BENCHMARKS:
+            for params, work, unit, run in BENCHMARKS[stage](SCALES[scale], workdir):
+                stats = measure(run, repeat)
+                stats.update(stage=stage, params=params, work=work, unit=unit,
+                             throughput=work / stats['wall_min'] if stats['wall_min'] > 0 else float('inf'))
+                results.append(stats)
+                print(f"{case_key(stage, params):60s} {stats['wall_min']*1e3:10.2f} ms "
+                      f"{stats['peak_bytes']/2**20:9.1f} MiB {stats['throughput']:12.4g} {unit}/s")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'meta': {
+            'scale': scale,
+            'repeat': repeat,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'results': results
+    }
+
+def compare_to_baseline(report, baseline, tolerance=0.2, memory_tolerance=0.2):
+    """
+    與基準結果比較，找出變慢或記憶體用量增加超過容許比例的案例
+
+    Args:
+        report: run_benchmarks 的結果
+        baseline: 先前儲存的結果
+        tolerance: 時間容許增加比例
+        memory_tolerance: 記憶體峰值容許增加比例
+
+    Returns:
+        list[dict]: 退步的案例，含目前值、基準值與比例
+    """
+    reference = {case_key(r['stage'], r['params']): r for r in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        base = reference.get(case_key(result['stage'], result['params']))
+        if base is None:
+            continue
+        for metric, limit in (('wall_min', tolerance), ('peak_bytes', memory_tolerance)):
+            if base[metric] > 0 and result[metric] > base[metric] * (1 + limit):
+                regressions.append({
+                    'case': case_key(result['stage'], result['params']),
+                    'metric': metric,
+                    'current': result[metric],
+                    'baseline': base[metric],
+                    'ratio': result[metric] / base[metric]
+                })
+    return regressions
+
+def write_json(path, data):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="各模擬階段的基準測試")
+    parser.add_argument('--scale', choices=sorted(SCALES), default='quick')
+    parser.add_argument('--stage', action='append', choices=sorted(BENCHMARKS), default=None,
+                        help="只執行指定階段，可重複指定")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default='result/benchmark.json')
+    parser.add_argument('--baseline', default=None, help="比較用的基準JSON檔")
+    parser.add_argument('--save-baseline', default=None, help="將本次結果另存為基準JSON檔")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="時間容許增加比例")
+    parser.add_argument('--memory-tolerance', type=float, default=0.2, help="記憶體峰值容許增加比例")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.scale, args.stage, args.repeat)
+    write_json(args.output, report)
+    if args.save_baseline:
+        write_json(args.save_baseline, report)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.tolerance, args.memory_tolerance)
+        report['regressions'] = regressions
+        write_json(args.output, report)
+        for regression in regressions:
+            print(f"退步: {regression['case']} {regression['metric']} "
+                  f"{regression['baseline']:.4g} -> {regression['current']:.4g} (x{regression['ratio']:.2f})")
+        if regressions:
+            raise SystemExit(1)
+        print("沒有超過容許範圍的退步")
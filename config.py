@@ -3,7 +3,11 @@ from scenario.hex_grid import *
 from scenario.ue_movement import *
 
 class SystemConfig:
-    def __init__(self):
+    def __init__(self, seed=None, **overrides):
+        # 隨機數產生器 (指定種子可重現模擬結果)
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+
         # 物理常數
         self.c = 3 * 10**8  # 光速 (m/s)
         self.frequency = 3.5 * 10**9  # 5G New Radio 頻率 (3.5 GHz)
@@ -16,6 +20,11 @@ class SystemConfig:
         self.Gr_bs = 1  # 接收增益 (1 dBi)
         self.Gt_rbs = 15  # 惡意基站增益 (15 dBi)
         self.Gr_rbs = 1  # 接收增益 (1 dBi)
+
+        # 天線高度
+        self.BS_HEIGHT = 6  # 合法基站高度 (6 m)
+        self.RBS_HEIGHT = 1.5  # 惡意基站高度 (1.5 m)
+        self.UE_HEIGHT = 1  # UE高度 (1 m)
         
         # 移動參數
         self.V = 1  # UE平均速度 (1 m/s)
@@ -25,12 +34,24 @@ class SystemConfig:
         self.MAP_SIZE = 1000  # 1000m*1000m
         
         # 系統參數
-        self.NUM_BS = 7   # 7個合法基站
+        self.LAYERS = 1   # 六角格基站層數 (1層共7個基站)
+        self.NUM_BS = 7   # 7個合法基站，None表示使用所有層的基站
         self.NUM_RBS = 1  # 1個惡意基站
         self.NUM_UE = 1   # 1個UE
         
+        # 覆寫預設參數，例如 SystemConfig(Pt_rbs=25, NUM_UE=100)
+        rbs_coords = overrides.pop('rbs_coords', None)
+        for name, value in overrides.items():
+            if not hasattr(self, name):
+                raise ValueError(f"未知的系統參數: {name}")
+            setattr(self, name, value)
+        self.wavelength = self.c / self.frequency
+
         # 初始化基站和UE位置
         self._initialize_positions()
+        if rbs_coords is not None:
+            self.rbs_coords = np.asarray(rbs_coords, dtype=float).reshape(-1, 2)
+            self.NUM_RBS = len(self.rbs_coords)
         
     def _initialize_positions(self):
         """初始化所有位置"""
@@ -41,11 +62,13 @@ class SystemConfig:
         
         # 生成基站位置
         bs_positions, self.cell_vertices = generate_hexagonal_grid(
-            self.center_x, self.center_y, self.radius, 1)
+            self.center_x, self.center_y, self.radius, self.LAYERS)
+        if self.NUM_BS is None:
+            self.NUM_BS = len(bs_positions)
         self.bs_coords = bs_positions[:self.NUM_BS]
         
         # 生成UE初始位置
-        self.ue_initial_positions = generate_random_positions(self.NUM_UE, self.MAP_SIZE)
+        self.ue_initial_positions = generate_random_positions(self.NUM_UE, self.MAP_SIZE, self.rng)
         
         # 設定惡意基站位置在中間偏下
         rbs_x = self.MAP_SIZE/2  # x座標在正中間
@@ -69,6 +92,11 @@ class SystemConfig:
                 'Gt_rbs': self.Gt_rbs,
                 'Gr_rbs': self.Gr_rbs
             },
+            'height': {
+                'BS_HEIGHT': self.BS_HEIGHT,
+                'RBS_HEIGHT': self.RBS_HEIGHT,
+                'UE_HEIGHT': self.UE_HEIGHT
+            },
             'movement': {
                 'V': self.V,
                 'T': self.T
@@ -80,9 +108,11 @@ class SystemConfig:
                 'radius': self.radius
             },
             'system': {
+                'LAYERS': self.LAYERS,
                 'NUM_BS': self.NUM_BS,
                 'NUM_RBS': self.NUM_RBS,
-                'NUM_UE': self.NUM_UE
+                'NUM_UE': self.NUM_UE,
+                'seed': self.seed
             },
             'positions': {
                 'bs_coords': self.bs_coords,
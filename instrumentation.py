@@ -0,0 +1,123 @@
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+class StageProfiler:
+    """
+    模擬流程各階段的量測工具
+
+    以 `with profiler.stage('signal', work=...)` 包住每個階段，記錄牆鐘時間、
+    CPU時間、tracemalloc 記憶體峰值、陣列大小/型別與吞吐量；可對指定階段另外
+    輸出 cProfile 結果。enabled=False 時 stage() 只回傳共用的空 context manager，
+    幾乎沒有額外成本，可以一直留在 sweep 工作程序中。階段應依序執行而不巢狀，
+    記憶體峰值才不會互相重設。
+    """
+    def __init__(self, enabled=True, trace_memory=True, profile_stage=None, profile_dir='result'):
+        """
+        Args:
+            enabled: 是否量測
+            trace_memory: 是否以 tracemalloc 記錄記憶體峰值(會讓配置變慢)
+            profile_stage: 要以 cProfile 分析的階段名稱，None表示不分析
+            profile_dir: cProfile 輸出目錄，檔名為 profile_<階段>.prof
+        """
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self.profile_stage = profile_stage
+        self.profile_dir = profile_dir
+        self.stages = []
+        self._current = None
+
+    def stage(self, name, work=None, unit='UE-timesteps'):
+        """
+        量測一個階段
+
+        Args:
+            name: 階段名稱
+            work: 工作量，用來計算吞吐量
+            unit: 工作量單位
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return self._stage(name, work, unit)
+
+    @contextmanager
+    def _stage(self, name, work, unit):
+        record = {'stage': name, 'work': work, 'unit': unit, 'arrays': {}}
+        parent, self._current = self._current, record
+
+        started_tracing = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+            memory_start = tracemalloc.get_traced_memory()[0]
+
+        profile = cProfile.Profile() if name == self.profile_stage else None
+        if profile is not None:
+            profile.enable()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_s'] = time.perf_counter() - wall_start
+            record['cpu_s'] = time.process_time() - cpu_start
+            if profile is not None:
+                profile.disable()
+                os.makedirs(self.profile_dir, exist_ok=True)
+                record['profile_path'] = os.path.join(self.profile_dir, f'profile_{name}.prof')
+                profile.dump_stats(record['profile_path'])
+            if self.trace_memory:
+                record['peak_bytes'] = tracemalloc.get_traced_memory()[1] - memory_start
+                if started_tracing:
+                    tracemalloc.stop()
+            if work is not None and record['wall_s'] > 0:
+                record['throughput'] = work / record['wall_s']
+            self._current = parent
+            self.stages.append(record)
+
+    def describe(self, **arrays):
+        """記錄目前階段產生的陣列形狀、型別與大小"""
+        if not self.enabled or self._current is None:
+            return
+        for name, array in arrays.items():
+            self._current['arrays'][name] = {
+                'shape': list(array.shape),
+                'dtype': str(array.dtype),
+                'nbytes': int(array.nbytes)
+            }
+
+    def report(self, **meta):
+        """回傳結構化的量測結果，meta 為額外的執行資訊"""
+        return {'meta': meta, 'stages': list(self.stages)}
+
+    def write_json(self, path, **meta):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(**meta), f, indent=2)
+
+    def summary_table(self):
+        """各階段量測結果的文字表格"""
+        header = f"{'stage':<20s} {'wall (s)':>10s} {'cpu (s)':>10s} {'peak (MiB)':>11s} {'throughput':>14s}"
+        lines = [header, '-' * len(header)]
+        for record in self.stages:
+            peak = f"{record['peak_bytes'] / 2**20:11.1f}" if 'peak_bytes' in record else f"{'-':>11s}"
+            throughput = (f"{record['throughput']:10.3g}/s" if 'throughput' in record else '-').rjust(14)
+            lines.append(f"{record['stage']:<20s} {record['wall_s']:10.3f} {record['cpu_s']:10.3f} {peak} {throughput}")
+        return '\n'.join(lines)
+
+    def stage_times(self):
+        """各階段牆鐘時間 {階段: 秒}，同名階段累加"""
+        times = {}
+        for record in self.stages:
+            times[record['stage']] = times.get(record['stage'], 0.0) + record['wall_s']
+        return times
+
+_NULL_STAGE = nullcontext()
+
+# 不量測時使用的共用實例
+NULL_PROFILER = StageProfiler(enabled=False)
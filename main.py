@@ -1,60 +1,192 @@
+import argparse
+import os
+
+import numpy as np
+
 from config import SystemConfig
+from instrumentation import NULL_PROFILER, StageProfiler
+from scenario.fading import *
+from scenario.features import extract_features
 from scenario.hex_grid import *
 from scenario.signal_calculation import *
+from scenario.stations import *
+from scenario.radio_map import *
+from scenario.sampling import *
+from scenario.spatial_index import build_station_index
+from scenario.stage_cache import StageCache
+from scenario.trajectory_store import TrajectoryStore, load_trace
 from scenario.ue_movement import *
-from visualization.trajectory_plot import *
 from visualization.rogue_bs_signal_plot import *
-import visualization.rogue_bs_signal_plot
 
-import matplotlib.pyplot as plt
+# 設定攻擊時間區間
+ATTACK_PERIODS = [
+    (3000, 3200),    # 第一次攻擊：200秒
+    (3400, 3500)    # 第二次攻擊：100秒
+]
 
-def main():
-    # 初始化系統配置
-    config = SystemConfig()
+def run_stage(config, stage_cache, stage, inputs, compute):
+    """以階段快取執行一個階段；沒有種子時每次結果都不同，不使用快取"""
+    if stage_cache is None or config.seed is None:
+        return compute(), None
+    return stage_cache.cached(stage, inputs, compute, rng=config.rng)
+
+def simulate_mobility(config, profiler=None, stage_cache=None, trajectories=None):
+    """
+    執行 UE 移動階段
+
+    Args:
+        config: SystemConfig
+        profiler: StageProfiler，量測 mobility 階段，None表示不量測
+        stage_cache: StageCache，只在 config.seed 有指定時使用，None表示不使用快取
+        trajectories: TrajectoryStore，指定時以其記憶體映射的軌跡取代隨機路徑點移動模型
+
+    Returns:
+        tuple: (UE位置 (NUM_UE, T, 2)，移動階段的快取鍵值)
+    """
     params = config.get_all_params()
-   
-    # 執行模擬
-    ue_positions = simulate_ue_movement(
-        initial_positions=params['positions']['ue_initial_positions'],
-        speed=params['movement']['V'],
-        time=params['movement']['T'],
-        map_size=params['map']['MAP_SIZE'],
-        pause_time=5  # 固定5秒
-    )
-   
-    # 計算信號強度
-    Rxlev_bs = calculate_Rxlev_bs(
-        Pt_dBm=params['power']['Pt_bs'],
-        Gt_dBi=params['power']['Gt_bs'],
-        Gr_dBi=params['power']['Gr_bs'],
-        station_coords=params['positions']['bs_coords'],
-        ue_positions=ue_positions,
-        wavelength=params['physical']['wavelength']
-    )
-   
-    Rxlev_rbs = calculate_Rxlev_rbs(
-        Pt_dBm=params['power']['Pt_rbs'],
-        Gt_dBi=params['power']['Gt_rbs'],
-        Gr_dBi=params['power']['Gr_rbs'],
-        station_coords=params['positions']['rbs_coords'],
-        ue_positions=ue_positions,
-        wavelength=params['physical']['wavelength']
-    )
-   
+    profiler = profiler or NULL_PROFILER
+    work = params['system']['NUM_UE'] * len(params['movement']['T'])
+
+    with profiler.stage('mobility', work):
+        def compute_mobility():
+            return {'ue_positions': simulate_ue_movement(
+                initial_positions=params['positions']['ue_initial_positions'],
+                speed=params['movement']['V'],
+                time=params['movement']['T'],
+                map_size=params['map']['MAP_SIZE'],
+                pause_time=5,  # 固定5秒
+                rng=config.rng
+            )}
+        if trajectories is not None:
+            if trajectories.num_ue != config.NUM_UE or not np.array_equal(trajectories.T, params['movement']['T']):
+                raise ValueError("軌跡的UE數量或時間軸與 config 不符")
+            ue_positions, mobility_key = trajectories.positions, trajectories.key
+        else:
+            outputs, mobility_key = run_stage(config, stage_cache, 'mobility', {
+                'ue_initial_positions': params['positions']['ue_initial_positions'],
+                'V': params['movement']['V'],
+                'T': params['movement']['T'],
+                'MAP_SIZE': params['map']['MAP_SIZE'],
+                'pause_time': 5
+            }, compute_mobility)
+            ue_positions = outputs['ue_positions']
+        profiler.describe(ue_positions=ue_positions)
+    return ue_positions, mobility_key
+
+def simulate_signals(config, radio_map_resolution=None, radio_map_cache='result/radio_map_cache', profiler=None,
+                     stage_cache=None, fading=None, trajectories=None):
+    """
+    執行 UE 移動與信號計算兩個階段
+
+    Args:
+        config: SystemConfig
+        radio_map_resolution: 柵格圖解析度(m)，指定時以快取的柵格圖查表計算信號強度
+        radio_map_cache: 柵格圖快取目錄
+        profiler: StageProfiler，量測 mobility 與 signal 階段，None表示不量測
+        stage_cache: StageCache，只在 config.seed 有指定時使用，None表示不使用快取
+        fading: scenario.fading 的衰落模型，None表示原本的均勻衰落
+        trajectories: TrajectoryStore，指定時以其記憶體映射的軌跡取代隨機路徑點移動模型
+
+    Returns:
+        tuple: (UE位置 (NUM_UE, T, 2)，基站資料表，信號強度 (NUM_UE, T, NUM_STATIONS))
+    """
+    params = config.get_all_params()
+    profiler = profiler or NULL_PROFILER
+    work = params['system']['NUM_UE'] * len(params['movement']['T'])
+    ue_positions, mobility_key = simulate_mobility(config, profiler, stage_cache, trajectories)
+
+    # 計算信號強度：合法基站與惡意基站在同一批次計算
+    with profiler.stage('signal', work):
+        stations = build_station_table(config)
+
+        def compute_signal():
+            if radio_map_resolution is None:
+                Rxlev = calculate_Rxlev(
+                    stations=stations,
+                    ue_positions=ue_positions,
+                    ue_height=params['height']['UE_HEIGHT'],
+                    rng=config.rng,
+                    fading=fading
+                )
+            else:
+                radio_map = build_radio_map(
+                    stations=stations,
+                    map_size=params['map']['MAP_SIZE'],
+                    resolution=radio_map_resolution,
+                    ue_height=params['height']['UE_HEIGHT'],
+                    cache_dir=radio_map_cache
+                )
+                Rxlev = calculate_Rxlev_radio_map(radio_map, ue_positions, radio_map_resolution, rng=config.rng,
+                                                  fading=fading)
+            return {'Rxlev': Rxlev}
+        outputs, _ = run_stage(config, stage_cache, 'signal', {
+            'mobility': mobility_key,
+            'x': stations.x,
+            'y': stations.y,
+            'height': stations.height,
+            'link_budget_dB': stations.link_budget_dB,
+            'is_rogue': stations.is_rogue,
+            'UE_HEIGHT': params['height']['UE_HEIGHT'],
+            'radio_map_resolution': radio_map_resolution,
+            'fading': repr(fading)
+        }, compute_signal)
+        Rxlev = outputs['Rxlev']
+        profiler.describe(Rxlev=Rxlev)
+    return ue_positions, stations, Rxlev
+
+def run_scenario(config, attack_periods=ATTACK_PERIODS, handover_threshold=3, plot=True,
+                 dataset_path='result/rogue_bs_dataset', csv_path=None, radio_map_resolution=None,
+                 radio_map_cache='result/radio_map_cache', output_dir='result', profiler=None, stage_cache=None,
+                 attack_schedule=None, handover_window=1.0, min_handover_interval=2.0, fading=None,
+                 trajectories=None):
+    """
+    執行單一情境：UE移動、信號計算、基站切換與資料集
+
+    Args:
+        config: SystemConfig
+        attack_periods: 攻擊時間區間列表
+        handover_threshold: 切換閾值
+        plot: 是否繪圖
+        dataset_path: 欄位式資料集輸出目錄，None表示不輸出
+        csv_path: 另外匯出CSV的路徑，None表示不匯出
+        radio_map_resolution: 柵格圖解析度(m)，指定時以快取的柵格圖查表計算信號強度
+        radio_map_cache: 柵格圖快取目錄
+        output_dir: 圖檔輸出目錄
+        profiler: StageProfiler，量測各階段的時間與記憶體，None表示不量測
+        stage_cache: StageCache，重複使用輸入未改變的 UE 移動與信號計算結果；
+            只在 config.seed 有指定時使用，None表示不使用快取
+        attack_schedule: AttackSchedule，指定各惡意基站各自的攻擊區間、功率爬升與目標UE，
+            指定時忽略 attack_periods
+        handover_window: 平均信號的時間窗口(秒)
+        min_handover_interval: 兩次切換的最小間隔(秒)
+        fading: scenario.fading 的衰落模型，None表示原本的均勻衰落
+        trajectories: TrajectoryStore，指定時以其軌跡取代隨機路徑點移動模型，
+            UE數量與時間軸需與 config 相同
+
+    Returns:
+        np.ndarray: 資料集
+    """
+    params = config.get_all_params()
+    profiler = profiler or NULL_PROFILER
+    work = params['system']['NUM_UE'] * len(params['movement']['T'])
+    ue_positions, stations, Rxlev = simulate_signals(config, radio_map_resolution, radio_map_cache, profiler,
+                                                     stage_cache, fading, trajectories)
+    Rxlev_bs = Rxlev[:, :, :stations.num_bs]
+    Rxlev_rbs = Rxlev[:, :, stations.num_bs:]
+
     # 繪製移動路徑圖
-    plot_ue_trajectories(
-        bs_coords=params['positions']['bs_coords'],
-        rbs_coords=params['positions']['rbs_coords'],
-        ue_positions=ue_positions,
-        map_size=params['map']['MAP_SIZE'],
-        radius=params['map']['radius']
-    )
+    if plot:
+        with profiler.stage('plot_trajectory', work):
+            from visualization.trajectory_plot import plot_ue_trajectories
 
-    # 設定攻擊時間區間
-    attack_periods = [
-        (3000, 3200),    # 第一次攻擊：200秒
-        (3400, 3500)    # 第二次攻擊：100秒
-    ]
+            plot_ue_trajectories(
+                bs_coords=params['positions']['bs_coords'],
+                rbs_coords=params['positions']['rbs_coords'],
+                ue_positions=ue_positions,
+                map_size=params['map']['MAP_SIZE'],
+                radius=params['map']['radius'],
+                output_dir=output_dir
+            )
 
     # 調用函數
     rogue_bs_dataset = rogue_bs_data(
@@ -65,12 +197,348 @@ def main():
         NUM_BS=params['system']['NUM_BS'],
         NUM_RBS=params['system']['NUM_RBS'],
         attack_periods=attack_periods,
-        handover_threshold=3,
-        plot=True
+        handover_threshold=handover_threshold,
+        time_window=seconds_to_steps(handover_window, params['movement']['T']),
+        min_time_between_handovers=seconds_to_steps(min_handover_interval, params['movement']['T']),
+        plot=plot,
+        dataset_path=dataset_path,
+        csv_path=csv_path,
+        output_dir=output_dir,
+        profiler=profiler,
+        attack_schedule=attack_schedule
+    )
+    return rogue_bs_dataset
+
+def run_candidate_scenario(config, num_candidates, attack_periods=ATTACK_PERIODS, handover_threshold=3,
+                           handover_window=1.0, min_handover_interval=2.0, block_size=3600,
+                           dataset_path='result/rogue_bs_dataset', csv_path=None, profiler=None, stage_cache=None,
+                           attack_schedule=None, fading=None, trajectories=None):
+    """
+    大量基站部署：每個時間區塊只在最近的候選基站上計算信號與切換，不繪製RSRP圖
+
+    記憶體與 NUM_UE * block_size * 候選數量成正比，與基站總數無關。
+
+    Args:
+        config: SystemConfig
+        num_candidates: 每個位置的合法候選基站數量
+        attack_periods: 攻擊時間區間列表
+        handover_threshold: 切換閾值
+        handover_window: 平均信號的時間窗口(秒)
+        min_handover_interval: 兩次切換的最小間隔(秒)
+        block_size: 每個區塊的時間步數
+        dataset_path: 欄位式資料集輸出目錄
+        csv_path: 另外匯出CSV的路徑，None表示不匯出
+        profiler: StageProfiler，None表示不量測
+        stage_cache: StageCache，只用於 UE 移動階段，None表示不使用快取
+        attack_schedule: AttackSchedule，指定時忽略 attack_periods
+        fading: 每個樣本獨立的衰落模型，None表示原本的均勻衰落
+        trajectories: TrajectoryStore，指定時以其軌跡取代隨機路徑點移動模型
+
+    Returns:
+        dict: rogue_bs_data_candidates 的摘要
+    """
+    if not is_memoryless(fading):
+        raise ValueError("候選基站模式只支援每個樣本獨立的衰落模型")
+    T = config.T
+    ue_positions, _ = simulate_mobility(config, profiler, stage_cache, trajectories)
+    return rogue_bs_data_candidates(
+        T, build_station_table(config), ue_positions, build_station_index(config), num_candidates,
+        attack_periods=attack_periods,
+        handover_threshold=handover_threshold,
+        time_window=seconds_to_steps(handover_window, T),
+        min_time_between_handovers=seconds_to_steps(min_handover_interval, T),
+        block_size=block_size,
+        ue_height=config.UE_HEIGHT,
+        rng=config.rng,
+        fading=fading,
+        dataset_path=dataset_path,
+        csv_path=csv_path,
+        profiler=profiler,
+        attack_schedule=attack_schedule)
+
+def run_handover_sweep(config, handover_thresholds=(3,), handover_windows=(1.0,), min_handover_intervals=(2.0,),
+                       attack_periods=ATTACK_PERIODS, radio_map_resolution=None,
+                       radio_map_cache='result/radio_map_cache', profiler=None, stage_cache=None,
+                       attack_schedule=None, fading=None, return_serving=False):
+    """
+    UE移動與信號只計算一次，在同一組信號上一次評估整個切換參數網格
+
+    Args:
+        config: SystemConfig
+        handover_thresholds: 切換閾值(dB)列表
+        handover_windows: 平均信號的時間窗口(秒)列表
+        min_handover_intervals: 兩次切換的最小間隔(秒)列表
+        attack_periods: 攻擊時間區間列表
+        radio_map_resolution: 柵格圖解析度(m)，指定時以快取的柵格圖查表計算信號強度
+        radio_map_cache: 柵格圖快取目錄
+        profiler: StageProfiler，None表示不量測
+        stage_cache: StageCache，只在 config.seed 有指定時使用，None表示不使用快取
+        attack_schedule: AttackSchedule，指定時忽略 attack_periods
+        fading: scenario.fading 的衰落模型，None表示原本的均勻衰落
+        return_serving: 是否回傳每組參數的服務基站序列 (P, NUM_UE, T)
+
+    Returns:
+        dict: rogue_bs_handover_sweep 的結果，參數以秒表示的 handover_window、
+            min_handover_interval 欄位對應 time_window、min_time_between_handovers
+    """
+    T = config.T
+    _, stations, Rxlev = simulate_signals(config, radio_map_resolution, radio_map_cache, profiler,
+                                          stage_cache, fading)
+    windows = np.asarray(handover_windows, dtype=float)
+    intervals = np.asarray(min_handover_intervals, dtype=float)
+    results = rogue_bs_handover_sweep(
+        T, Rxlev[:, :, :stations.num_bs], Rxlev[:, :, stations.num_bs:], config.NUM_UE,
+        stations.num_bs, stations.num_rbs, attack_periods,
+        handover_thresholds=handover_thresholds,
+        time_windows=[seconds_to_steps(w, T) for w in windows],
+        min_times_between_handovers=[seconds_to_steps(m, T) for m in intervals],
+        return_serving=return_serving, profiler=profiler, attack_schedule=attack_schedule)
+    # 依 handover_settings 的展開順序還原秒數
+    grid = np.meshgrid(np.asarray(handover_thresholds, dtype=float), windows, intervals, indexing='ij')
+    results['handover_window'] = grid[1].ravel()
+    results['min_handover_interval'] = grid[2].ravel()
+    return results
+
+def run_report_scenario(config, report_interval=1.0, on_waypoint=False, report_distance=None,
+                        on_cell_edge=False, attack_periods=ATTACK_PERIODS, handover_threshold=3, handover_window=1.0,
+                        min_handover_interval=2.0, dataset_path='result/rogue_bs_dataset', csv_path=None,
+                        profiler=None, attack_schedule=None, fading=None):
+    """
+    只在量測報告時間點計算信號、切換與資料集，成本與報告數量成正比而非時間格點數
+
+    UE移動仍以 config.T 為時間格點產生連續的路段行程，只在報告時間點內插位置。
+
+    Args:
+        config: SystemConfig
+        report_interval: 週期性量測報告間隔(秒)，None表示只使用事件觸發的報告
+        on_waypoint: 是否在抵達路徑點與出發時各回報一次
+        report_distance: 移動中每前進此距離(m)回報一次，None表示不使用
+        on_cell_edge: 是否在跨越合法基站六角格邊界 (最強合法基站改變) 時回報一次
+        attack_periods: 攻擊時間區間列表
+        handover_threshold: 切換閾值
+        handover_window: 平均信號的時間窗口(秒)
+        min_handover_interval: 兩次切換的最小間隔(秒)
+        dataset_path: 欄位式資料集輸出目錄，None表示不輸出
+        csv_path: 另外匯出CSV的路徑，None表示不匯出
+        profiler: StageProfiler，None表示不量測
+        attack_schedule: AttackSchedule，指定時忽略 attack_periods
+        fading: scenario.fading 的衰落模型，None表示原本的均勻衰落；
+            相關衰落依同一UE前後兩筆報告之間的移動距離計算
+
+    Returns:
+        np.ndarray: 資料集，每筆報告一列
+    """
+    params = config.get_all_params()
+    profiler = profiler or NULL_PROFILER
+    T = params['movement']['T']
+    speed = params['movement']['V']
+
+    with profiler.stage('mobility', params['system']['NUM_UE'] * len(T)):
+        legs = generate_waypoint_legs(params['positions']['ue_initial_positions'], speed, T,
+                                      params['map']['MAP_SIZE'], pause_time=5, rng=config.rng)
+        cell_index = build_station_index(config) if on_cell_edge else None
+        reports = build_report_samples(legs, T, report_interval, on_waypoint, report_distance, speed, cell_index)
+        ue_positions = positions_at(legs, speed, T, reports.ue, reports.tick)
+        profiler.describe(ue_positions=ue_positions)
+
+    with profiler.stage('signal', len(reports)):
+        stations = build_station_table(config)
+        if fading is None:
+            Rxlev = calculate_Rxlev(stations, ue_positions, params['height']['UE_HEIGHT'], rng=config.rng,
+                                    dtype=np.float32)
+        else:
+            # 衰落模型需要逐UE的時間序列，先排成矩形陣列再取回每筆報告
+            index, column = reports.padded_index()
+            Rxlev = calculate_Rxlev(stations, ue_positions[index], params['height']['UE_HEIGHT'],
+                                    rng=config.rng, dtype=np.float32, fading=fading)[reports.ue, column]
+        profiler.describe(Rxlev=Rxlev)
+
+    return rogue_bs_reports(
+        reports,
+        Rxlev_bs=Rxlev[:, :stations.num_bs],
+        Rxlev_rbs=Rxlev[:, stations.num_bs:],
+        NUM_BS=stations.num_bs,
+        NUM_RBS=stations.num_rbs,
+        attack_periods=attack_periods,
+        handover_threshold=handover_threshold,
+        window_seconds=handover_window,
+        min_handover_interval=min_handover_interval,
+        dataset_path=dataset_path,
+        csv_path=csv_path,
+        profiler=profiler,
+        attack_schedule=attack_schedule
     )
+
+def parse_attack_period(text):
+    """將 'start:end' 轉為 (start, end) 秒"""
+    try:
+        start, end = (float(v) for v in text.split(':'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"攻擊區間格式應為 start:end，收到 {text!r}")
+    return (start, end)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="5G 惡意基站信號強度模擬")
+    parser.add_argument('--num-ue', type=int, default=None, help="UE數量")
+    parser.add_argument('--duration', type=float, default=None, help="模擬時間(秒)")
+    parser.add_argument('--timestep', type=float, default=None, help="時間間隔(秒)")
+    parser.add_argument('--layers', type=int, default=None, help="六角格基站層數，使用該層數內所有基站")
+    parser.add_argument('--seed', type=int, default=None, help="隨機種子")
+    parser.add_argument('--attack', type=parse_attack_period, action='append', default=None,
+                        metavar='START:END', help="攻擊時間區間(秒)，可重複指定")
+    parser.add_argument('--handover-threshold', type=float, default=3, help="切換閾值(dB)")
+    parser.add_argument('--handover-window', type=float, default=1.0, help="平均信號的時間窗口(秒)")
+    parser.add_argument('--min-handover-interval', type=float, default=2.0, help="兩次切換的最小間隔(秒)")
+    parser.add_argument('--report-interval', type=float, default=None,
+                        help="只在每隔此秒數的量測報告計算信號與切換，不繪圖")
+    parser.add_argument('--report-on-waypoint', action='store_true',
+                        help="抵達路徑點與出發時額外回報 (使用量測報告模式)")
+    parser.add_argument('--report-distance', type=float, default=None,
+                        help="移動中每前進此距離(m)額外回報 (使用量測報告模式)")
+    parser.add_argument('--report-on-cell-edge', action='store_true',
+                        help="跨越合法基站六角格邊界時額外回報 (使用量測報告模式)")
+    parser.add_argument('--fading', default=None, choices=FADING_MODELS,
+                        help="衰落模型，預設為原本的均勻衰落 x_t ~ U(0, 2)")
+    parser.add_argument('--shadow-sigma', type=float, default=8.0, help="陰影衰落標準差(dB)")
+    parser.add_argument('--shadow-distance', type=float, default=50.0, help="陰影衰落去相關距離(m)")
+    parser.add_argument('--rician-k', type=float, default=3.0, help="Rician K 因子 (線性)")
+    parser.add_argument('--trace', default=None,
+                        help="以外部移動軌跡 (CSV 或 SUMO FCD XML) 取代隨機路徑點模型，重新取樣到模擬時間軸")
+    parser.add_argument('--trace-offset', type=float, nargs=2, default=(0.0, 0.0), metavar=('X', 'Y'),
+                        help="軌跡座標平移量(m)，位置為檔案座標減去此值")
+    parser.add_argument('--candidates', type=int, default=None, metavar='K',
+                        help="大量基站部署：每個時間區塊只在最近K個合法基站與所有惡意基站上計算信號與切換，"
+                             "資料集只儲存最強的K個候選基站，不繪製RSRP圖")
+    parser.add_argument('--candidate-block-size', type=int, default=3600,
+                        help="候選基站模式每個區塊的時間步數")
+    parser.add_argument('--features-window', type=float, default=None,
+                        help="模擬後由資料集產生滑動視窗特徵，指定視窗長度(秒)，輸出到 <output-dir>/features")
+    parser.add_argument('--features-hop', type=float, default=1.0, help="相鄰特徵視窗的間隔(秒)")
+    parser.add_argument('--output-dir', default='result', help="輸出目錄")
+    parser.add_argument('--csv', action='store_true', help="另外匯出CSV (需要pandas)")
+    parser.add_argument('--radio-map-resolution', type=float, default=None,
+                        help="以快取的柵格圖查表計算信號強度，指定解析度(m)")
+    parser.add_argument('--no-plot', action='store_true', help="不繪圖，也不載入matplotlib")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="不使用階段快取 (指定 --seed 時預設重複使用 UE 移動與信號計算結果)")
+    parser.add_argument('--cache-size-mb', type=float, default=2048, help="階段快取大小上限(MB)")
+    parser.add_argument('--profile', action='store_true',
+                        help="量測各階段時間與記憶體，輸出 profile_report.json 並列印摘要")
+    parser.add_argument('--profile-stage', default=None,
+                        choices=['mobility', 'signal', 'plot_trajectory', 'handover', 'plot_rsrp', 'dataset_io', 'features'],
+                        help="以cProfile分析指定階段，輸出 profile_<階段>.prof (隱含 --profile)")
+    return parser
+
+def config_from_args(args):
+    """由命令列參數建立 SystemConfig"""
+    overrides = {}
+    if args.num_ue is not None:
+        overrides['NUM_UE'] = args.num_ue
+    if args.layers is not None:
+        overrides['LAYERS'] = args.layers
+        overrides['NUM_BS'] = None
+    if args.duration is not None or args.timestep is not None:
+        duration = args.duration if args.duration is not None else 3600
+        timestep = args.timestep if args.timestep is not None else 0.1
+        overrides['T'] = np.linspace(0, duration, int(round(duration / timestep)) + 1)
+    return SystemConfig(seed=args.seed, **overrides)
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    report_mode = (args.report_interval is not None or args.report_on_waypoint or args.report_distance is not None
+                   or args.report_on_cell_edge)
+    if report_mode and args.features_window is not None:
+        parser.error("--features-window 不支援量測報告模式")
+    if args.candidates is not None:
+        if report_mode or args.radio_map_resolution is not None or args.features_window is not None:
+            parser.error("--candidates 不支援量測報告模式、--radio-map-resolution 與 --features-window")
+        if args.candidates < 1 or args.candidate_block_size < 1:
+            parser.error("--candidates 與 --candidate-block-size 必須大於0")
+
+    # 初始化系統配置
+    config = config_from_args(args)
+    trajectories = None
+    if args.trace is not None:
+        if report_mode:
+            parser.error("--trace 不支援量測報告模式")
+        # 匯入的軌跡存在輸出目錄，時間軸與UE數量不變時重複使用；UE數量以軌跡為準
+        trajectories = load_trace(args.trace, os.path.join(args.output_dir, 'trajectories'), config.T,
+                                  num_ue=args.num_ue, map_size=config.MAP_SIZE, offset=args.trace_offset)
+        args.num_ue = trajectories.num_ue
+        config = config_from_args(args)
+    profiler = StageProfiler(enabled=args.profile or args.profile_stage is not None,
+                             profile_stage=args.profile_stage, profile_dir=args.output_dir)
+    attack_periods = args.attack if args.attack is not None else ATTACK_PERIODS
+    dataset_path = os.path.join(args.output_dir, 'rogue_bs_dataset')
+    csv_path = os.path.join(args.output_dir, 'rogue_bs_dataset.csv') if args.csv else None
+    fading = None
+    if args.fading is not None:
+        fading = make_fading(args.fading, args.shadow_sigma, args.shadow_distance, args.rician_k)
+    if args.candidates is not None and not is_memoryless(fading):
+        parser.error("--candidates 只支援每個樣本獨立的衰落模型 (uniform、rayleigh、rician)")
+    stage_cache = None
+    if not args.no_cache and not report_mode:
+        stage_cache = StageCache(os.path.join(args.output_dir, 'stage_cache'), int(args.cache_size_mb * 2**20))
+    if args.candidates is not None:
+        rogue_bs_dataset = run_candidate_scenario(
+            config,
+            num_candidates=args.candidates,
+            attack_periods=attack_periods,
+            handover_threshold=args.handover_threshold,
+            handover_window=args.handover_window,
+            min_handover_interval=args.min_handover_interval,
+            block_size=args.candidate_block_size,
+            dataset_path=dataset_path,
+            csv_path=csv_path,
+            profiler=profiler,
+            stage_cache=stage_cache,
+            fading=fading,
+            trajectories=trajectories)
+    elif report_mode:
+        rogue_bs_dataset = run_report_scenario(
+            config,
+            report_interval=args.report_interval,
+            on_waypoint=args.report_on_waypoint,
+            report_distance=args.report_distance,
+            on_cell_edge=args.report_on_cell_edge,
+            attack_periods=attack_periods,
+            handover_threshold=args.handover_threshold,
+            handover_window=args.handover_window,
+            min_handover_interval=args.min_handover_interval,
+            dataset_path=dataset_path,
+            csv_path=csv_path,
+            profiler=profiler,
+            fading=fading)
+    else:
+        rogue_bs_dataset = run_scenario(
+            config,
+            attack_periods=attack_periods,
+            handover_threshold=args.handover_threshold,
+            handover_window=args.handover_window,
+            min_handover_interval=args.min_handover_interval,
+            plot=not args.no_plot,
+            dataset_path=dataset_path,
+            csv_path=csv_path,
+            radio_map_resolution=args.radio_map_resolution,
+            radio_map_cache=os.path.join(args.output_dir, 'radio_map_cache'),
+            output_dir=args.output_dir,
+            profiler=profiler,
+            fading=fading,
+            trajectories=trajectories,
+            stage_cache=stage_cache)
+    if args.features_window is not None:
+        with profiler.stage('features', config.NUM_UE * len(config.T)):
+            extract_features(dataset_path, os.path.join(args.output_dir, 'features'),
+                             window_seconds=args.features_window, hop_seconds=args.features_hop)
+    if profiler.enabled:
+        profiler.write_json(os.path.join(args.output_dir, 'profile_report.json'),
+                            argv=vars(args), NUM_UE=config.NUM_UE, steps=len(config.T), seed=config.seed)
+        print(profiler.summary_table())
     # 顯示全部圖形
     # plt.show()
     return rogue_bs_dataset
 
 if __name__ == "__main__":
-    dataset = main()
\ No newline at end of file
+    dataset = main()
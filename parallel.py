@@ -0,0 +1,289 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from config import SystemConfig
+from scenario.attack_schedule import AttackSchedule
+from scenario.fading import FADING_MODELS, make_fading
+from scenario.handover import simulate_handover
+from scenario.sampling import seconds_to_steps
+from scenario.signal_calculation import calculate_Rxlev
+from scenario.stations import StationTable, build_station_table
+from scenario.ue_movement import generate_waypoint_legs, interpolate_legs
+
+# 基站資料表在共享記憶體中的欄位
+STATION_FIELDS = ('x', 'y', 'height', 'Pt_dBm', 'Gt_dBi', 'Gr_dBi', 'is_rogue')
+
+class SharedArrays:
+    """
+    一組放在 multiprocessing.shared_memory 的具名陣列
+
+    建立者以 create() 配置記憶體並負責 unlink；工作程序以 specs 中的名稱、
+    形狀與型別 attach，取得指向同一塊記憶體的 ndarray，不需要序列化陣列內容。
+    """
+    def __init__(self, arrays, blocks, owner):
+        self.arrays = arrays
+        self._blocks = blocks
+        self._owner = owner
+
+    @classmethod
+    def create(cls, shapes):
+        """
+        Args:
+            shapes: {名稱: (形狀, 型別)}
+
+        Returns:
+            SharedArrays: 內容為0 (新配置的共享記憶體本來就是0，不需要逐頁寫入)
+        """
+        arrays, blocks = {}, {}
+        for name, (shape, dtype) in shapes.items():
+            dtype = np.dtype(dtype)
+            nbytes = max(int(np.prod(shape)) * dtype.itemsize, 1)
+            block = shared_memory.SharedMemory(create=True, size=nbytes)
+            arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+            blocks[name] = block
+        return cls(arrays, blocks, owner=True)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """配置共享記憶體並複製陣列內容"""
+        shared = cls.create({name: (np.shape(a), np.asarray(a).dtype) for name, a in arrays.items()})
+        for name, array in arrays.items():
+            shared.arrays[name][...] = array
+        return shared
+
+    @classmethod
+    def attach(cls, specs):
+        """在工作程序中依 specs 連接既有的共享記憶體"""
+        arrays, blocks = {}, {}
+        for name, (block_name, shape, dtype) in specs.items():
+            # 工作程序與建立者共用同一個 resource tracker，重複註冊不影響建立者的 unlink
+            block = shared_memory.SharedMemory(name=block_name)
+            arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+            blocks[name] = block
+        return cls(arrays, blocks, owner=False)
+
+    @property
+    def specs(self):
+        """可傳給工作程序的 {名稱: (共享記憶體名稱, 形狀, 型別字串)}"""
+        return {name: (self._blocks[name].name, array.shape, array.dtype.str)
+                for name, array in self.arrays.items()}
+
+    def close(self):
+        """釋放陣列並關閉共享記憶體；建立者同時 unlink"""
+        self.arrays = {}
+        for block in self._blocks.values():
+            block.close()
+            if self._owner:
+                block.unlink()
+        self._blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def share_station_table(stations):
+    """將基站資料表各欄位放入共享記憶體"""
+    return SharedArrays.from_arrays({name: getattr(stations, name) for name in STATION_FIELDS})
+
+def attached_station_table(arrays, wavelength):
+    """由共享記憶體中的欄位重建基站資料表"""
+    return StationTable(*(arrays[name] for name in STATION_FIELDS), wavelength)
+
+# 工作程序連接的共享記憶體與情境參數，由 init_worker 設定
+_worker = {}
+
+def init_worker(input_specs, output_specs, settings):
+    """工作程序初始化：連接輸入與輸出共享記憶體，每個程序只做一次"""
+    _worker['inputs'] = SharedArrays.attach(input_specs)
+    _worker['outputs'] = SharedArrays.attach(output_specs)
+    _worker['settings'] = settings
+
+def run_shard(start, stop, seed_seq):
+    """
+    計算 UE[start:stop] 的信號強度與切換，直接寫入共享輸出
+
+    Args:
+        start: 第一個UE
+        stop: 最後一個UE之後
+        seed_seq: 此分片專屬的 SeedSequence，結果與工作程序數量無關
+
+    Returns:
+        tuple: (start, stop, 計算時間(秒))
+    """
+    began = time.perf_counter()
+    inputs, outputs, settings = _worker['inputs'].arrays, _worker['outputs'].arrays, _worker['settings']
+    T = inputs['T']
+    ue_ids = np.arange(start, stop)
+
+    ue_positions = interpolate_legs(inputs['origins'][start:stop], inputs['waypoints'][start:stop],
+                                    inputs['move_starts'][start:stop], settings['speed'], T)
+    stations = attached_station_table(inputs, settings['wavelength'])
+    fading = settings['fading']
+    if fading is not None:
+        # 衰落狀態屬於前一個分片的UE
+        fading.reset()
+    Rxlev = calculate_Rxlev(stations, ue_positions, settings['ue_height'],
+                            rng=np.random.default_rng(seed_seq), dtype=np.float32, fading=fading)
+    del ue_positions
+
+    num_bs = settings['num_bs']
+    schedule = settings['attack_schedule']
+    Rxlev[:, :, num_bs:] = schedule.apply(Rxlev[:, :, num_bs:], T, ue_ids=ue_ids,
+                                          num_ue=settings['num_ue'], t_end=T[-1])
+    serving, handover, labels = simulate_handover(
+        Rxlev, num_bs, settings['handover_threshold'], settings['time_window'],
+        settings['min_time_between_handovers'])
+
+    outputs['serving'][start:stop] = serving
+    outputs['handover'][start:stop] = handover
+    outputs['labels'][start:stop] = labels
+    if 'Rxlev' in outputs:
+        outputs['Rxlev'][start:stop] = Rxlev
+    return start, stop, time.perf_counter() - began
+
+def run_sharded(config, attack_periods=None, handover_threshold=3, handover_window=1.0,
+                min_handover_interval=2.0, workers=None, shard_size=64, keep_rsrp=True,
+                attack_schedule=None, progress=False, fading=None):
+    """
+    將單一大型情境的UE分片，以多個工作程序平行計算信號強度與切換
+
+    UE移動以路段行程 (origins、waypoints、move_starts) 表示，與基站資料表、
+    時間序列一起放在共享記憶體；工作程序各自內插所負責UE的位置，並把結果寫入
+    共享輸出陣列的對應列，不需要序列化任何大型陣列。每個分片的衰落亂數由
+    SeedSequence(config.seed) 衍生，結果只與 shard_size 有關，與工作程序數量無關。
+
+    Args:
+        config: SystemConfig
+        attack_periods: 攻擊時間區間列表
+        handover_threshold: 切換閾值(dB)
+        handover_window: 平均信號的時間窗口(秒)
+        min_handover_interval: 兩次切換的最小間隔(秒)
+        workers: 工作程序數量，None表示使用所有CPU核心，1表示在目前程序中執行
+        shard_size: 每個分片的UE數量，決定每個工作程序同時需要的記憶體
+        keep_rsrp: 是否保留所有基站的信號強度 (NUM_UE, T, NUM_STATIONS) float32
+        attack_schedule: AttackSchedule，指定時忽略 attack_periods
+        progress: 是否列印每個分片完成的進度
+        fading: scenario.fading 的衰落模型，None表示原本的均勻衰落
+
+    Returns:
+        SharedArrays: 輸出陣列 serving、handover、labels (NUM_UE, T)，以及 keep_rsrp 時的 Rxlev；
+            使用完畢後需呼叫 close()
+    """
+    T = np.asarray(config.T, dtype=float)
+    num_ue = config.NUM_UE
+    stations = build_station_table(config)
+    origins, waypoints, move_starts, _ = generate_waypoint_legs(
+        config.ue_initial_positions, config.V, T, config.MAP_SIZE, pause_time=5, rng=config.rng)
+    if attack_schedule is None:
+        attack_schedule = AttackSchedule.from_periods(attack_periods, stations.num_rbs)
+
+    inputs = share_station_table(stations)
+    legs = SharedArrays.from_arrays({'T': T, 'origins': origins, 'waypoints': waypoints,
+                                     'move_starts': move_starts})
+    shapes = {
+        'serving': ((num_ue, len(T)), np.min_scalar_type(len(stations) - 1)),
+        'handover': ((num_ue, len(T)), bool),
+        'labels': ((num_ue, len(T)), bool)
+    }
+    if keep_rsrp:
+        shapes['Rxlev'] = ((num_ue, len(T), len(stations)), np.float32)
+    outputs = SharedArrays.create(shapes)
+
+    settings = {
+        'speed': config.V,
+        'wavelength': stations.wavelength,
+        'ue_height': config.UE_HEIGHT,
+        'num_bs': stations.num_bs,
+        'num_ue': num_ue,
+        'attack_schedule': attack_schedule.clip(T),
+        'handover_threshold': handover_threshold,
+        'time_window': seconds_to_steps(handover_window, T),
+        'min_time_between_handovers': seconds_to_steps(min_handover_interval, T),
+        'fading': fading
+    }
+    input_specs = dict(inputs.specs, **legs.specs)
+    starts = list(range(0, num_ue, shard_size))
+    seed_seqs = np.random.SeedSequence(config.seed).spawn(len(starts))
+    tasks = [(start, min(start + shard_size, num_ue), seed_seq) for start, seed_seq in zip(starts, seed_seqs)]
+
+    try:
+        if workers == 1:
+            # 在目前程序執行時直接使用已配置的陣列
+            _worker['inputs'] = SharedArrays(dict(inputs.arrays, **legs.arrays), {}, owner=False)
+            _worker['outputs'] = SharedArrays(outputs.arrays, {}, owner=False)
+            _worker['settings'] = settings
+            try:
+                for done, task in enumerate(tasks, 1):
+                    report_shard(run_shard(*task), done, len(tasks), progress)
+            finally:
+                close_worker()
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                     initargs=(input_specs, outputs.specs, settings)) as executor:
+                futures = [executor.submit(run_shard, *task) for task in tasks]
+                for done, future in enumerate(as_completed(futures), 1):
+                    report_shard(future.result(), done, len(tasks), progress)
+    except BaseException:
+        outputs.close()
+        raise
+    finally:
+        inputs.close()
+        legs.close()
+    return outputs
+
+def close_worker():
+    """關閉目前程序連接的共享記憶體 (不 unlink)"""
+    for name in ('inputs', 'outputs'):
+        if name in _worker:
+            _worker.pop(name).close()
+    _worker.pop('settings', None)
+
+def report_shard(result, done, total, progress):
+    if progress:
+        start, stop, seconds = result
+        print(f"[{done}/{total}] UE {start}-{stop - 1} 完成，{seconds:.2f} 秒")
+
+def summarize_outputs(outputs):
+    """切換次數與連上惡意基站的比例"""
+    arrays = outputs.arrays
+    return {
+        'num_handovers': int(np.count_nonzero(arrays['handover'])),
+        'rogue_fraction': float(arrays['labels'].mean()),
+        'ue_captured_fraction': float(arrays['labels'].any(axis=1).mean())
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="以多個工作程序分片計算單一大型情境")
+    parser.add_argument('--num-ue', type=int, default=10000, help="UE數量")
+    parser.add_argument('--duration', type=float, default=3600, help="模擬時間(秒)")
+    parser.add_argument('--timestep', type=float, default=0.1, help="時間間隔(秒)")
+    parser.add_argument('--seed', type=int, default=0, help="隨機種子")
+    parser.add_argument('--workers', type=int, default=None, help="工作程序數量，預設為CPU核心數")
+    parser.add_argument('--shard-size', type=int, default=64, help="每個分片的UE數量")
+    parser.add_argument('--handover-threshold', type=float, default=3, help="切換閾值(dB)")
+    parser.add_argument('--no-rsrp', action='store_true',
+                        help="不保留信號強度，只輸出切換結果 (大型情境的信號強度需要大量共享記憶體)")
+    parser.add_argument('--fading', default=None, choices=FADING_MODELS,
+                        help="衰落模型，預設為原本的均勻衰落 x_t ~ U(0, 2)")
+    args = parser.parse_args()
+
+    config = SystemConfig(seed=args.seed, NUM_UE=args.num_ue,
+                          T=np.linspace(0, args.duration, int(round(args.duration / args.timestep)) + 1))
+    from main import ATTACK_PERIODS
+
+    began = time.perf_counter()
+    with run_sharded(config, ATTACK_PERIODS, args.handover_threshold, workers=args.workers,
+                     shard_size=args.shard_size, keep_rsrp=not args.no_rsrp, progress=True,
+                     fading=make_fading(args.fading) if args.fading else None) as outputs:
+        elapsed = time.perf_counter() - began
+        samples = args.num_ue * len(config.T)
+        print(f"{samples} UE-時間點，{elapsed:.2f} 秒 ({samples / elapsed:.3g} /s)，"
+              f"工作程序 {args.workers or os.cpu_count()}")
+        print(summarize_outputs(outputs))
@@ -0,0 +1,258 @@
+import numpy as np
+
+from scenario.ue_movement import get_rng
+
+# 未攻擊時惡意基站的信號強度 (dBm)
+INACTIVE_RXLEV = -100.0
+# 功率爬升開始時相對於目標功率的衰減量 (dB)
+RAMP_FLOOR_DB = -30.0
+
+class AttackSchedule:
+    """
+    多個惡意基站的攻擊排程 (structure of arrays)
+
+    每一筆攻擊區間記錄惡意基站索引、開始與結束時間、功率爬升/下降時間、
+    相對發射功率，以及受攻擊的UE (None表示所有UE)。同一個惡意基站可有多筆區間，
+    重疊時取較大的功率。
+    """
+    def __init__(self, rbs, start, end, ramp_up=0.0, ramp_down=0.0, power_dB=0.0, targets=None):
+        """
+        Args:
+            rbs: 每筆區間的惡意基站索引 (E,)
+            start: 開始時間(秒) (E,)
+            end: 結束時間(秒，不含) (E,)
+            ramp_up: 功率由 RAMP_FLOOR_DB 線性(dB)爬升到目標功率所需時間(秒)，純量或 (E,)
+            ramp_down: 結束前功率下降所需時間(秒)，純量或 (E,)
+            power_dB: 相對於設定發射功率的增減量(dB)，純量或 (E,)
+            targets: 每筆區間受攻擊的UE編號列表，None或元素為None表示所有UE
+        """
+        self.rbs = np.asarray(rbs, dtype=np.int64).reshape(-1)
+        num_entries = len(self.rbs)
+        self.start = np.broadcast_to(np.asarray(start, dtype=float), (num_entries,)).copy()
+        self.end = np.broadcast_to(np.asarray(end, dtype=float), (num_entries,)).copy()
+        self.ramp_up = np.broadcast_to(np.asarray(ramp_up, dtype=float), (num_entries,)).copy()
+        self.ramp_down = np.broadcast_to(np.asarray(ramp_down, dtype=float), (num_entries,)).copy()
+        self.power_dB = np.broadcast_to(np.asarray(power_dB, dtype=float), (num_entries,)).copy()
+        self.targets = list(targets) if targets is not None else [None] * num_entries
+        if len(self.targets) != num_entries:
+            raise ValueError(f"targets 數量 {len(self.targets)} 與攻擊區間數量 {num_entries} 不符")
+
+    def __len__(self):
+        return len(self.rbs)
+
+    @classmethod
+    def from_periods(cls, attack_periods, NUM_RBS=1):
+        """所有惡意基站在相同區間攻擊所有UE，等同原本的 attack_periods"""
+        periods = np.asarray(attack_periods or [], dtype=float).reshape(-1, 2)
+        rbs = np.repeat(np.arange(NUM_RBS), len(periods))
+        return cls(rbs, np.tile(periods[:, 0], NUM_RBS), np.tile(periods[:, 1], NUM_RBS))
+
+    def periods(self):
+        """所有攻擊區間 [(start, end), ...]，依開始時間排序且不重複，供繪圖標示"""
+        return sorted(set(zip(self.start.tolist(), self.end.tolist())))
+
+    def clip(self, T):
+        """確保攻擊時間在範圍內，丟棄開始於最後時間點之後的區間"""
+        keep = self.start < T[-1]
+        return AttackSchedule(self.rbs[keep], self.start[keep], np.minimum(self.end[keep], T[-1]),
+                              self.ramp_up[keep], self.ramp_down[keep], self.power_dB[keep],
+                              [target for target, k in zip(self.targets, keep) if k])
+
+    def _index_ranges(self, T, t_end):
+        """每筆區間在 T 中的索引範圍 [i0, i1)，結束於 t_end 的區間包含最後一個時間點"""
+        i0 = np.searchsorted(T, self.start, side='left')
+        i1 = np.searchsorted(T, self.end, side='left')
+        i1 = np.where(self.end >= t_end, len(T), i1)
+        return i0, np.maximum(i1, i0)
+
+    def _entry_samples(self, T, t_end):
+        """
+        將所有區間展開成 (區間, 時間點) 樣本，一次計算爬升中的功率
+
+        Returns:
+            tuple: 區間索引、時間點索引、相對功率(dB)，長度皆為所有區間的時間點總數
+        """
+        i0, i1 = self._index_ranges(T, t_end)
+        lengths = i1 - i0
+        entry = np.repeat(np.arange(len(self)), lengths)
+        t_idx = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + i0[entry]
+        t = T[t_idx]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            up = np.where(self.ramp_up[entry] > 0, (t - self.start[entry]) / self.ramp_up[entry], 1.0)
+            down = np.where(self.ramp_down[entry] > 0, (self.end[entry] - t) / self.ramp_down[entry], 1.0)
+        ramp = np.clip(np.minimum(up, down), 0.0, 1.0)
+        return entry, t_idx, self.power_dB[entry] + (1.0 - ramp) * RAMP_FLOOR_DB
+
+    def power_offset(self, T, NUM_RBS, t_end=None):
+        """
+        每個惡意基站在每個時間點的相對發射功率，不考慮受攻擊的UE
+
+        不同UE的功率可能不同時 (同一惡意基站重疊的區間鎖定不同UE)，請使用
+        apply / apply_reports，兩者依目標組合分別計算。
+
+        Args:
+            T: 時間點 (B,)，需遞增
+            NUM_RBS: 惡意基站數量
+            t_end: 整個模擬的最後時間點，None表示 T[-1]
+
+        Returns:
+            np.ndarray: 相對功率(dB) (B, NUM_RBS)，未攻擊為 -inf
+        """
+        t_end = T[-1] if t_end is None else t_end
+        offset = np.full((len(T), NUM_RBS), -np.inf)
+        entry, t_idx, values = self._entry_samples(T, t_end)
+        np.maximum.at(offset, (t_idx, self.rbs[entry]), values)
+        return offset
+
+    def activity(self, T, num_ue, NUM_RBS, ue_ids=None, t_end=None):
+        """
+        建立 (UE, T, RBS) 攻擊遮罩
+
+        擁有相同目標組合的UE共用一個 (T, RBS) 遮罩：以 searchsorted 找出每筆區間的
+        索引範圍，在差分陣列上標記起訖後沿時間累加，所有區間一次完成。
+
+        Args:
+            T: 時間點 (B,)
+            num_ue: 總UE數量
+            NUM_RBS: 惡意基站數量
+            ue_ids: 要建立遮罩的UE編號，None表示 0..num_ue-1
+            t_end: 整個模擬的最後時間點，None表示 T[-1]
+
+        Returns:
+            np.ndarray: 是否受攻擊 (len(ue_ids), B, NUM_RBS)
+        """
+        ue_ids = np.arange(num_ue) if ue_ids is None else np.asarray(ue_ids)
+        if not len(self):
+            return np.zeros((len(ue_ids), len(T), NUM_RBS), dtype=bool)
+        group_active, inverse = self._group_activity(T, ue_ids, NUM_RBS, t_end)
+        return group_active[inverse]
+
+    def _groups(self, ue_ids):
+        """每個UE受哪些區間攻擊，依組合分組：(組別的成員遮罩 (G, E), 每個UE所屬的組別 (len(ue_ids),))"""
+        member = np.ones((len(ue_ids), len(self)), dtype=bool)
+        for e, target in enumerate(self.targets):
+            if target is not None:
+                member[:, e] = np.isin(ue_ids, target)
+        groups, inverse = np.unique(member, axis=0, return_inverse=True)
+        return groups, inverse.reshape(-1)
+
+    def _group_activity(self, T, ue_ids, NUM_RBS, t_end=None):
+        """依目標組合分組的攻擊遮罩 (G, B, NUM_RBS)，以及每個UE所屬的組別 (len(ue_ids),)"""
+        t_end = T[-1] if t_end is None else t_end
+        groups, inverse = self._groups(ue_ids)
+
+        i0, i1 = self._index_ranges(T, t_end)
+        diff = np.zeros((len(groups), len(T) + 1, NUM_RBS), dtype=np.int32)
+        g, e = np.nonzero(groups)
+        np.add.at(diff, (g, i0[e], self.rbs[e]), 1)
+        np.add.at(diff, (g, i1[e], self.rbs[e]), -1)
+        return np.cumsum(diff[:, :-1], axis=1) > 0, inverse
+
+    def _group_power_offset(self, T, ue_ids, NUM_RBS, t_end=None):
+        """
+        依目標組合分組的相對功率 (G, B, NUM_RBS)，未攻擊為 -inf，以及每個UE所屬的組別
+
+        每組只取其成員區間的功率，同一惡意基站重疊但鎖定不同UE的區間不會互相影響；
+        有限值的位置即為該組的攻擊遮罩。
+        """
+        t_end = T[-1] if t_end is None else t_end
+        groups, inverse = self._groups(ue_ids)
+        offset = np.full((len(groups), len(T), NUM_RBS), -np.inf)
+        if not len(self):
+            return offset, inverse
+
+        entry, t_idx, values = self._entry_samples(T, t_end)
+        # 每個樣本複製到包含該區間的每一組；(區間, 組別) 配對依區間排序
+        pair_entry, pair_group = np.nonzero(groups.T)
+        counts = np.bincount(pair_entry, minlength=len(self))
+        first = np.cumsum(counts) - counts
+        repeat = counts[entry]
+        sample = np.repeat(np.arange(len(entry)), repeat)
+        within = np.arange(len(sample)) - np.repeat(np.cumsum(repeat) - repeat, repeat)
+        g = pair_group[first[entry[sample]] + within]
+        np.maximum.at(offset, (g, t_idx[sample], self.rbs[entry[sample]]), values[sample])
+        return offset, inverse
+
+    def apply(self, Rxlev_rbs, T, ue_ids=None, num_ue=None, t_end=None):
+        """
+        產生攻擊情境下的惡意基站信號：受攻擊時為原信號加上相對功率，其餘為 INACTIVE_RXLEV
+
+        Args:
+            Rxlev_rbs: 惡意基站信號強度 (U, B, NUM_RBS)
+            T: 時間點 (B,)
+            ue_ids: 這些列對應的UE編號，None表示 0..U-1
+            num_ue: 總UE數量，None表示 U
+            t_end: 整個模擬的最後時間點，None表示 T[-1]
+
+        Returns:
+            np.ndarray: 攻擊後的惡意基站信號 (U, B, NUM_RBS)
+        """
+        num_rows, _, num_rbs = Rxlev_rbs.shape
+        ue_ids = np.arange(num_ue or num_rows) if ue_ids is None else np.asarray(ue_ids)
+        offset, group = self._group_power_offset(T, ue_ids, num_rbs, t_end)
+        active = np.isfinite(offset)
+        offset = np.where(active, offset, 0.0).astype(Rxlev_rbs.dtype)
+        return np.where(active[group], Rxlev_rbs + offset[group], INACTIVE_RXLEV)
+
+    def apply_reports(self, Rxlev_rbs, ue, tick, T, num_ue):
+        """
+        與 apply 相同，但作用在各UE時間點不同的扁平量測報告上
+
+        Args:
+            Rxlev_rbs: 每筆報告的惡意基站信號強度 (N, NUM_RBS)
+            ue: 每筆報告的UE編號 (N,)
+            tick: 每筆報告在 T 上的時間點索引 (N,)
+            T: 時間格點
+            num_ue: UE數量
+
+        Returns:
+            np.ndarray: 攻擊後的惡意基站信號 (N, NUM_RBS)
+        """
+        num_rbs = Rxlev_rbs.shape[1]
+        if not len(self):
+            return np.full(Rxlev_rbs.shape, INACTIVE_RXLEV, dtype=Rxlev_rbs.dtype)
+        # 只在有報告的時間點上建立遮罩，再依每筆報告的UE與時間取出
+        used = np.zeros(len(T), dtype=bool)
+        used[tick] = True
+        time_idx = (np.cumsum(used) - 1)[tick]
+        times = T[used]
+        offset, group = self._group_power_offset(times, np.arange(num_ue), num_rbs, T[-1])
+        offset = offset[group[ue], time_idx]
+        active = np.isfinite(offset)
+        offset = np.where(np.isfinite(offset), offset, 0.0).astype(Rxlev_rbs.dtype)
+        return np.where(active, Rxlev_rbs + offset, INACTIVE_RXLEV)
+
+def random_attack_schedule(NUM_RBS, num_ue, t_start, t_end, intervals_per_rbs=3, mean_duration=120.0,
+                           max_ramp=30.0, power_range_dB=(-3.0, 3.0), target_fraction=1.0, rng=None):
+    """
+    隨機產生多個惡意基站的攻擊排程
+
+    Args:
+        NUM_RBS: 惡意基站數量
+        num_ue: UE數量
+        t_start: 最早開始時間(秒)
+        t_end: 最晚結束時間(秒)
+        intervals_per_rbs: 每個惡意基站的攻擊次數
+        mean_duration: 平均攻擊長度(秒)，指數分布
+        max_ramp: 最長爬升/下降時間(秒)，均勻分布
+        power_range_dB: 相對功率範圍(dB)
+        target_fraction: 每次攻擊鎖定的UE比例，1表示所有UE
+        rng: np.random.Generator、整數種子或None
+
+    Returns:
+        AttackSchedule
+    """
+    rng = get_rng(rng)
+    num_entries = NUM_RBS * intervals_per_rbs
+    start = rng.uniform(t_start, t_end, num_entries)
+    end = np.minimum(start + rng.exponential(mean_duration, num_entries), t_end)
+    ramp_up = rng.uniform(0, max_ramp, num_entries)
+    ramp_down = rng.uniform(0, max_ramp, num_entries)
+    power_dB = rng.uniform(power_range_dB[0], power_range_dB[1], num_entries)
+    if target_fraction >= 1:
+        targets = None
+    else:
+        num_targets = max(int(round(target_fraction * num_ue)), 1)
+        targets = [np.sort(rng.choice(num_ue, num_targets, replace=False)) for _ in range(num_entries)]
+    return AttackSchedule(np.repeat(np.arange(NUM_RBS), intervals_per_rbs), start, end,
+                          ramp_up, ramp_down, power_dB, targets)
@@ -0,0 +1,259 @@
+import json
+import os
+
+import numpy as np
+
+SCHEMA_FILE = 'schema.json'
+
+def dataset_schema(NUM_BS, NUM_RBS, num_ue=None, num_candidates=None):
+    """
+    資料集欄位與型別：ue, time, connected_bs, BS1..BSn, RBS1..RBSm, label
+
+    候選基站模式 (num_candidates 有指定) 不儲存每個合法基站一欄，改為每個時間點
+    信號最強的 num_candidates 個候選基站：cell1_bs..cellk_bs (基站編號，0表示沒有)
+    與 cell1..cellk (信號強度，由強到弱，沒有時為 nan)。
+
+    Args:
+        NUM_BS: 合法基站數量
+        NUM_RBS: 惡意基站數量
+        num_ue: UE數量，用來決定 ue 欄位的整數型別
+        num_candidates: 每個時間點儲存的候選基站數量，None表示儲存所有合法基站
+
+    Returns:
+        list[tuple]: (欄位名稱, numpy型別字串)
+    """
+    station_dtype = np.dtype(np.min_scalar_type(NUM_BS + NUM_RBS)).str
+    ue_dtype = np.min_scalar_type(max((num_ue or 65536) - 1, 0))
+    if num_candidates is None:
+        station_columns = [(f'BS{i+1}', '<f4') for i in range(NUM_BS)]
+    else:
+        station_columns = ([(f'cell{i+1}_bs', station_dtype) for i in range(num_candidates)]
+                           + [(f'cell{i+1}', '<f4') for i in range(num_candidates)])
+    return ([('ue', np.dtype(ue_dtype).str), ('time', '<f8'), ('connected_bs', station_dtype)]
+            + station_columns
+            + [(f'RBS{i+1}', '<f4') for i in range(NUM_RBS)]
+            + [('label', '|b1')])
+
+def ue_major_order(ue, t, previous=None):
+    """
+    資料列是否依UE排列 (UE編號不遞減，同一UE內時間遞增)
+
+    Args:
+        ue: UE編號 (N,)
+        t: 時間 (N,)
+        previous: 前一段資料最後一列的 (ue, time)，None表示從頭開始
+
+    Returns:
+        bool
+    """
+    ue = np.asarray(ue, dtype=np.int64)
+    t = np.asarray(t, dtype=np.float64)
+    if previous is not None:
+        ue = np.concatenate([[previous[0]], ue])
+        t = np.concatenate([[previous[1]], t])
+    step_ue = np.diff(ue)
+    return bool(np.all((step_ue > 0) | ((step_ue == 0) & (np.diff(t) > 0))))
+
+class DatasetWriter:
+    """
+    以欄位為單位逐區塊附加寫入的二進位資料集
+
+    每個欄位一個 .bin 原始檔，另存 schema.json 記錄欄位型別與列數，
+    讀取時可以 memmap 只載入需要的欄位。RSRP 以 float32、基站編號以小整數、
+    標籤以布林儲存。schema.json 的 ue_major 記錄資料列是否依UE排列；
+    依時間區塊附加的資料集為區塊優先，每個區塊內才依UE排列。
+    """
+    def __init__(self, path, NUM_BS, NUM_RBS, num_ue=None, num_candidates=None):
+        self.path = path
+        self.schema = dataset_schema(NUM_BS, NUM_RBS, num_ue, num_candidates)
+        self.num_bs = NUM_BS
+        self.num_rbs = NUM_RBS
+        self.num_candidates = num_candidates
+        self.num_rows = 0
+        self.ue_major = True
+        self._last_row = None
+
+        os.makedirs(path, exist_ok=True)
+        self._files = {name: open(os.path.join(path, f'{name}.bin'), 'wb') for name, _ in self.schema}
+        self._write_schema(complete=False)
+
+    def _write_schema(self, complete):
+        schema = {
+            'columns': [{'name': name, 'dtype': dtype} for name, dtype in self.schema],
+            'num_rows': self.num_rows,
+            'ue_major': self.ue_major,
+            'complete': complete
+        }
+        tmp_path = os.path.join(self.path, SCHEMA_FILE + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(schema, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.path, SCHEMA_FILE))
+
+    def append(self, ue_ids, T, serving, Rxlev_bs, Rxlev_rbs, labels):
+        """
+        附加一個 UE/時間區塊，依UE排列 (每個UE的所有時間點連續)
+
+        Args:
+            ue_ids: 區塊內的UE編號 (NUM_UE,)
+            T: 區塊的時間點 (B,)
+            serving: 服務基站索引 (NUM_UE, B)
+            Rxlev_bs: 合法基站信號強度 (NUM_UE, B, NUM_BS)
+            Rxlev_rbs: 惡意基站信號強度 (NUM_UE, B, NUM_RBS)
+            labels: 是否連上惡意基站 (NUM_UE, B)
+        """
+        num_ue, num_steps = serving.shape
+        self.append_reports(np.repeat(ue_ids, num_steps), np.tile(T, num_ue), serving.ravel(),
+                            Rxlev_bs.reshape(-1, self.num_bs), Rxlev_rbs.reshape(-1, self.num_rbs),
+                            labels.ravel())
+
+    def append_reports(self, ue, t, serving, Rxlev_bs, Rxlev_rbs, labels):
+        """
+        附加扁平的量測報告，每筆報告一列 (各UE的時間點可以不同)
+
+        Args:
+            ue: UE編號 (N,)
+            t: 時間 (N,)
+            serving: 服務基站索引 (N,)
+            Rxlev_bs: 合法基站信號強度 (N, NUM_BS)
+            Rxlev_rbs: 惡意基站信號強度 (N, NUM_RBS)
+            labels: 是否連上惡意基站 (N,)
+        """
+        columns = {f'BS{i+1}': Rxlev_bs[:, i] for i in range(self.num_bs)}
+        self._write(ue, t, serving, columns, Rxlev_rbs, labels)
+
+    def append_candidates(self, ue_ids, T, serving, station_ids, Rxlev_candidates, Rxlev_rbs, labels):
+        """
+        候選基站模式：附加一個 UE/時間區塊，每個時間點只保留信號最強的 num_candidates 個合法候選基站
+
+        Args:
+            ue_ids: 區塊內的UE編號 (NUM_UE,)
+            T: 區塊的時間點 (B,)
+            serving: 服務基站索引 (NUM_UE, B)
+            station_ids: 合法候選基站索引 (NUM_UE, M)，-1為補位
+            Rxlev_candidates: 候選基站信號強度 (NUM_UE, B, M)
+            Rxlev_rbs: 惡意基站信號強度 (NUM_UE, B, NUM_RBS)
+            labels: 是否連上惡意基站 (NUM_UE, B)
+        """
+        num_ue, num_steps = serving.shape
+        k = self.num_candidates
+        strength = np.where(station_ids[:, np.newaxis, :] >= 0, Rxlev_candidates, -np.inf)
+        if strength.shape[2] < k:
+            strength = np.concatenate([strength, np.full((num_ue, num_steps, k - strength.shape[2]), -np.inf)],
+                                      axis=2)
+            station_ids = np.concatenate([station_ids, np.full((num_ue, k - station_ids.shape[1]), -1)], axis=1)
+        top = np.argsort(-strength, axis=2, kind='stable')[:, :, :k]
+        top_ids = np.take_along_axis(np.broadcast_to(station_ids[:, np.newaxis, :], strength.shape), top, axis=2)
+        top_rsrp = np.take_along_axis(strength, top, axis=2)
+        top_ids = np.where(np.isfinite(top_rsrp), top_ids, -1).reshape(-1, k)
+        top_rsrp = np.where(np.isfinite(top_rsrp), top_rsrp, np.nan).reshape(-1, k)
+
+        columns = {}
+        for i in range(k):
+            columns[f'cell{i+1}_bs'] = top_ids[:, i] + 1
+            columns[f'cell{i+1}'] = top_rsrp[:, i]
+        self._write(np.repeat(ue_ids, num_steps), np.tile(T, num_ue), serving.ravel(), columns,
+                    Rxlev_rbs.reshape(-1, self.num_rbs), labels.ravel())
+
+    def _write(self, ue, t, serving, station_columns, Rxlev_rbs, labels):
+        columns = dict(station_columns, ue=ue, time=t, connected_bs=serving + 1, label=labels)
+        for i in range(self.num_rbs):
+            columns[f'RBS{i+1}'] = Rxlev_rbs[:, i]
+
+        for name, dtype in self.schema:
+            self._files[name].write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+        self.num_rows += len(ue)
+        if len(ue):
+            self.ue_major = self.ue_major and ue_major_order(ue, t, self._last_row)
+            self._last_row = (ue[-1], t[-1])
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._write_schema(complete=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class DatasetReader:
+    """
+    延遲載入的欄位式資料集讀取器，只映射需要的欄位，不解析文字
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, SCHEMA_FILE), encoding='utf-8') as f:
+            schema = json.load(f)
+        self.num_rows = schema['num_rows']
+        # 舊版資料集沒有記錄列順序
+        self.recorded_ue_major = schema.get('ue_major')
+        self.dtypes = {column['name']: np.dtype(column['dtype']) for column in schema['columns']}
+        self.columns = list(self.dtypes)
+
+    def column(self, name):
+        """以memmap回傳單一欄位"""
+        if self.num_rows == 0:
+            return np.empty(0, dtype=self.dtypes[name])
+        return np.memmap(os.path.join(self.path, f'{name}.bin'), dtype=self.dtypes[name],
+                         mode='r', shape=(self.num_rows,))
+
+    def is_ue_major(self, block_rows=1_000_000):
+        """
+        資料列是否依UE排列 (UE編號不遞減，同一UE內時間遞增)
+
+        優先使用 schema.json 記錄的列順序，沒有記錄時逐區塊檢查 ue、time 欄位。
+        """
+        if self.recorded_ue_major is not None:
+            return self.recorded_ue_major
+        ue, t = self.column('ue'), self.column('time')
+        for start in range(0, self.num_rows, block_rows):
+            # 多取前一列，檢查區塊交界
+            rows = slice(max(start - 1, 0), start + block_rows)
+            if not ue_major_order(ue[rows], t[rows]):
+                return False
+        return True
+
+    def read(self, columns=None, rows=slice(None)):
+        """
+        讀取部分欄位與列
+
+        Args:
+            columns: 欄位名稱列表，None表示全部
+            rows: 列的slice或索引
+
+        Returns:
+            dict[str, np.ndarray]
+        """
+        return {name: np.asarray(self.column(name)[rows]) for name in (columns or self.columns)}
+
+    def iter_blocks(self, block_rows=1_000_000, columns=None):
+        """逐區塊讀取，每次回傳一個欄位字典"""
+        for start in range(0, self.num_rows, block_rows):
+            yield self.read(columns, slice(start, start + block_rows))
+
+    def to_pandas(self, columns=None, rows=slice(None)):
+        """轉為 pandas DataFrame (需要時才載入pandas)"""
+        import pandas as pd
+        return pd.DataFrame(self.read(columns, rows))
+
+def export_csv(dataset_path, csv_path, columns=None, block_rows=1_000_000):
+    """
+    將欄位式資料集逐區塊匯出為CSV
+
+    Args:
+        dataset_path: 資料集目錄
+        csv_path: CSV輸出路徑
+        columns: 匯出的欄位，None表示全部
+        block_rows: 每次轉換的列數
+    """
+    import pandas as pd
+
+    reader = DatasetReader(dataset_path)
+    columns = columns or reader.columns
+    pd.DataFrame(columns=columns).to_csv(csv_path, index=False)
+    for block in reader.iter_blocks(block_rows, columns):
+        frame = pd.DataFrame(block)
+        if 'label' in frame:
+            frame['label'] = frame['label'].astype(np.int8)
+        frame.to_csv(csv_path, mode='a', header=False, index=False)
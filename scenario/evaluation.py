@@ -0,0 +1,293 @@
+import numpy as np
+
+# 每個區塊的中間陣列大約的記憶體上限 (bytes)
+DEFAULT_CHUNK_BYTES = 256 * 2**20
+# 每個 (執行, UE, 時間點) 需要的中間陣列大小：兩個 int32 索引陣列加上數個布林陣列
+BYTES_PER_SAMPLE = 16
+# 摘要表格的指標與格式
+SUMMARY_FIELDS = (
+    ('runs', 'd'), ('precision', '.4f'), ('recall', '.4f'), ('intervals', 'd'),
+    ('interval_detection_rate', '.4f'), ('mean_time_to_detect_s', '.2f'), ('median_time_to_detect_s', '.2f'),
+    ('false_alarms', 'd'), ('false_alarms_per_ue_hour', '.4g'), ('ue_captured_fraction', '.4f')
+)
+
+def attack_truth(attack_schedule, T, num_ue, NUM_RBS):
+    """
+    攻擊排程的真值遮罩：UE在該時間點是否受任一惡意基站攻擊
+
+    Args:
+        attack_schedule: AttackSchedule
+        T: 時間點 (B,)
+        num_ue: UE數量
+        NUM_RBS: 惡意基站數量
+
+    Returns:
+        np.ndarray: (num_ue, B) bool，可直接當作所有執行共用的 truth
+    """
+    return attack_schedule.clip(T).activity(T, num_ue, NUM_RBS).any(axis=2)
+
+def next_true_index(mask):
+    """
+    每個時間點之後(含)第一個 True 的索引，沒有時為時間長度
+
+    Args:
+        mask: (..., B) bool
+
+    Returns:
+        np.ndarray: (..., B) int32
+    """
+    num_steps = mask.shape[-1]
+    index = np.where(mask, np.arange(num_steps, dtype=np.int32), np.int32(num_steps))
+    return np.minimum.accumulate(index[..., ::-1], axis=-1)[..., ::-1]
+
+def rising_edges(mask):
+    """區間開始的位置：此時間點為 True 且前一個時間點為 False (第0個時間點視前一個為False)"""
+    edges = mask.copy()
+    edges[..., 1:] &= ~mask[..., :-1]
+    return edges
+
+class DetectionEvaluator:
+    """
+    依區塊累積多次蒙地卡羅執行的偵測品質
+
+    每次 update 處理一批執行 (R, U, B) 的真值、偵測結果與服務基站，所有執行與UE
+    同時以陣列運算求得。中間陣列的大小與區塊大小成正比；區塊之間只保留每次執行的
+    指標、每個時間點的總計與每個偵測到的攻擊區間的偵測時間 (float32)。
+    """
+    def __init__(self, num_steps, timestep, NUM_BS=None):
+        """
+        Args:
+            num_steps: 每次執行的時間步數 B
+            timestep: 時間間隔(秒)
+            NUM_BS: 合法基站數量，索引大於等於 NUM_BS 的服務基站視為惡意基站；
+                None表示不計算被惡意基站捕獲的UE比例，也不能省略 detections
+        """
+        self.num_steps = num_steps
+        self.timestep = timestep
+        self.num_bs = NUM_BS
+        # 每個時間點所有執行與UE的總計，用於隨時間變化的 precision/recall
+        self.tp_t = np.zeros(num_steps, dtype=np.int64)
+        self.fp_t = np.zeros(num_steps, dtype=np.int64)
+        self.fn_t = np.zeros(num_steps, dtype=np.int64)
+        # 依攻擊區間開始的時間點累計區間數、偵測到的數量與偵測時間總和
+        self.intervals_t = np.zeros(num_steps, dtype=np.int64)
+        self.detected_t = np.zeros(num_steps, dtype=np.int64)
+        self.delay_sum_t = np.zeros(num_steps)
+        self.runs = []
+        self.time_to_detect = []
+
+    def update(self, truth, detections=None, serving=None):
+        """
+        評估一批執行
+
+        Args:
+            truth: 是否受攻擊 (R, U, B) 或所有執行共用的 (U, B)
+            detections: 偵測器輸出 (R, U, B)，None表示以切換標籤 (serving >= NUM_BS) 作為偵測結果
+            serving: 服務基站索引 (R, U, B)，None表示不計算捕獲比例
+
+        Returns:
+            dict: 此批每次執行的指標，每個值為 (R,) 陣列
+        """
+        if detections is None:
+            if serving is None or self.num_bs is None:
+                raise ValueError("未提供 detections 時需要 serving 與 NUM_BS")
+            detections = np.asarray(serving) >= self.num_bs
+        detections = np.asarray(detections, dtype=bool)
+        num_runs, num_ue, num_steps = detections.shape
+        if num_steps != self.num_steps:
+            raise ValueError(f"時間步數 {num_steps} 與評估器設定的 {self.num_steps} 不符")
+        truth = np.broadcast_to(np.asarray(truth, dtype=bool), detections.shape)
+
+        # 逐時間點的混淆矩陣
+        hit = detections & truth
+        false_positive = detections & ~truth
+        missed = truth & ~detections
+        self.tp_t += hit.sum(axis=(0, 1))
+        self.fp_t += false_positive.sum(axis=(0, 1))
+        self.fn_t += missed.sum(axis=(0, 1))
+        tp = hit.sum(axis=(1, 2))
+        fp = false_positive.sum(axis=(1, 2))
+        fn = missed.sum(axis=(1, 2))
+        del hit, missed
+
+        # 攻擊區間：由開始位置找區間結束與之後第一次偵測，偵測早於結束即為偵測到
+        run, ue, start = np.nonzero(rising_edges(truth))
+        end = next_true_index(~truth)[run, ue, start]
+        first_detection = next_true_index(detections)[run, ue, start]
+        detected = first_detection < end
+        delay = np.where(detected, (first_detection - start) * self.timestep, np.nan)
+        self.time_to_detect.append(delay[detected].astype(np.float32))
+        intervals = np.bincount(run, minlength=num_runs)
+        detected_intervals = np.bincount(run, weights=detected, minlength=num_runs)
+        delay_sum = np.bincount(run, weights=np.nan_to_num(delay), minlength=num_runs)
+        self.intervals_t += np.bincount(start, minlength=num_steps)
+        self.detected_t += np.bincount(start, weights=detected, minlength=num_steps).astype(np.int64)
+        self.delay_sum_t += np.bincount(start, weights=np.nan_to_num(delay), minlength=num_steps)
+
+        # 誤報：偵測開始時並未受攻擊，以未受攻擊的 UE-小時 正規化
+        false_alarms = (rising_edges(detections) & false_positive).sum(axis=(1, 2))
+        idle_hours = (~truth).sum(axis=(1, 2)) * self.timestep / 3600
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            metrics = {
+                'tp': tp, 'fp': fp, 'fn': fn,
+                'precision': tp / (tp + fp),
+                'recall': tp / (tp + fn),
+                'intervals': intervals,
+                'detected_intervals': detected_intervals.astype(np.int64),
+                'interval_detection_rate': detected_intervals / intervals,
+                'mean_time_to_detect_s': delay_sum / detected_intervals,
+                'false_alarms': false_alarms,
+                'idle_ue_hours': idle_hours,
+                'false_alarms_per_ue_hour': false_alarms / idle_hours,
+            }
+        if serving is not None and self.num_bs is not None:
+            metrics['ue_captured_fraction'] = (np.asarray(serving) >= self.num_bs).any(axis=2).mean(axis=1)
+        else:
+            metrics['ue_captured_fraction'] = np.full(num_runs, np.nan)
+        metrics['num_ue'] = np.full(num_runs, num_ue)
+        self.runs.append(metrics)
+        return metrics
+
+    def per_run(self):
+        """到目前為止所有執行的指標 {名稱: (R,) 陣列}，順序與 update 的順序相同"""
+        if not self.runs:
+            return {}
+        return {key: np.concatenate([chunk[key] for chunk in self.runs]) for key in self.runs[0]}
+
+    def times_to_detect(self):
+        """所有偵測到的攻擊區間的偵測時間(秒) float32"""
+        return np.concatenate(self.time_to_detect) if self.time_to_detect else np.zeros(0, dtype=np.float32)
+
+    def precision_recall_over_time(self):
+        """
+        所有執行與UE合計後，每個時間點的 precision 與 recall
+
+        Returns:
+            tuple: (precision (B,), recall (B,))，分母為0時為 nan
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.tp_t / (self.tp_t + self.fp_t), self.tp_t / (self.tp_t + self.fn_t)
+
+    def time_to_detect_by_start(self, T=None):
+        """
+        依攻擊區間開始的時間點彙整偵測時間，例如對應 attack_periods 的每個區間
+
+        Args:
+            T: 時間點 (B,)，None表示以時間步索引表示開始時間
+
+        Returns:
+            dict: start (有攻擊區間開始的時間點)、intervals、detected、mean_time_to_detect_s
+        """
+        index = np.nonzero(self.intervals_t)[0]
+        detected = self.detected_t[index]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean_delay = self.delay_sum_t[index] / detected
+        return {
+            'start': index if T is None else np.asarray(T)[index],
+            'intervals': self.intervals_t[index],
+            'detected': detected,
+            'mean_time_to_detect_s': mean_delay
+        }
+
+    def summary(self):
+        """
+        所有執行合計的指標
+
+        precision/recall 以所有 (執行, UE, 時間點) 樣本計算，誤報率以全部未受攻擊的
+        UE-小時 正規化，被捕獲比例為各次執行的平均。
+        """
+        runs = self.per_run()
+        if not runs:
+            return {'runs': 0}
+        delays = self.times_to_detect()
+        tp, fp, fn = runs['tp'].sum(), runs['fp'].sum(), runs['fn'].sum()
+        intervals = int(runs['intervals'].sum())
+        false_alarms = int(runs['false_alarms'].sum())
+        idle_hours = runs['idle_ue_hours'].sum()
+        captured = runs['ue_captured_fraction']
+        return {
+            'runs': len(runs['tp']),
+            'precision': float(tp / (tp + fp)) if tp + fp else float('nan'),
+            'recall': float(tp / (tp + fn)) if tp + fn else float('nan'),
+            'intervals': intervals,
+            'interval_detection_rate': float(len(delays) / intervals) if intervals else float('nan'),
+            'mean_time_to_detect_s': float(delays.mean(dtype=np.float64)) if len(delays) else float('nan'),
+            'median_time_to_detect_s': float(np.median(delays)) if len(delays) else float('nan'),
+            'false_alarms': false_alarms,
+            'false_alarms_per_ue_hour': float(false_alarms / idle_hours) if idle_hours else float('nan'),
+            'ue_captured_fraction': float(np.nanmean(captured)) if not np.isnan(captured).all() else float('nan'),
+        }
+
+    def summary_table(self):
+        """摘要指標的文字表格"""
+        summary = self.summary()
+        lines = [f"{'metric':<28s} {'value':>12s}", '-' * 41]
+        for name, fmt in SUMMARY_FIELDS:
+            if name not in summary:
+                continue
+            value = summary[name]
+            text = 'nan' if isinstance(value, float) and np.isnan(value) else format(value, fmt)
+            lines.append(f"{name:<28s} {text:>12s}")
+        return '\n'.join(lines)
+
+    def histograms(self, bins=20):
+        """
+        偵測時間與每次執行指標的直方圖
+
+        Args:
+            bins: 每個直方圖的區間數量
+
+        Returns:
+            dict: {名稱: (counts, edges)}，忽略 nan
+        """
+        runs = self.per_run()
+        values = {'time_to_detect_s': self.times_to_detect()}
+        for name in ('precision', 'recall', 'false_alarms_per_ue_hour', 'ue_captured_fraction'):
+            values[name] = runs.get(name, np.zeros(0))
+        result = {}
+        for name, data in values.items():
+            data = data[np.isfinite(data)]
+            value_range = (0.0, 1.0) if name in ('precision', 'recall', 'ue_captured_fraction') else None
+            result[name] = np.histogram(data, bins=bins, range=value_range)
+        return result
+
+def chunk_size(num_ue, num_steps, max_chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """記憶體上限內每個區塊可處理的執行次數"""
+    return max(1, int(max_chunk_bytes // (BYTES_PER_SAMPLE * num_ue * num_steps)))
+
+def evaluate_detection(truth, detections=None, serving=None, timestep=0.1, NUM_BS=None, chunk_runs=None,
+                       max_chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """
+    評估多次執行的偵測品質，依執行切成區塊處理
+
+    輸入可以是 np.memmap (例如 parallel.py 或 stage_cache 的輸出)，每個區塊只把
+    需要的執行讀進記憶體。
+
+    Args:
+        truth: 是否受攻擊 (R, U, B) 或所有執行共用的 (U, B)，例如 attack_truth 的結果
+        detections: 偵測器輸出 (R, U, B)，None表示以切換標籤 (serving >= NUM_BS) 作為偵測結果
+        serving: 服務基站索引 (R, U, B)，None表示不計算捕獲比例
+        timestep: 時間間隔(秒)
+        NUM_BS: 合法基站數量
+        chunk_runs: 每個區塊的執行次數，None表示依 max_chunk_bytes 決定
+        max_chunk_bytes: 每個區塊中間陣列的記憶體上限
+
+    Returns:
+        DetectionEvaluator: 以 summary()、per_run()、histograms() 取得結果
+    """
+    reference = detections if detections is not None else serving
+    if reference is None:
+        raise ValueError("需要 detections 或 serving")
+    num_runs, num_ue, num_steps = np.shape(reference)
+    if chunk_runs is None:
+        chunk_runs = chunk_size(num_ue, num_steps, max_chunk_bytes)
+    shared_truth = np.ndim(truth) == 2
+
+    evaluator = DetectionEvaluator(num_steps, timestep, NUM_BS)
+    for start in range(0, num_runs, chunk_runs):
+        runs = slice(start, min(start + chunk_runs, num_runs))
+        evaluator.update(truth if shared_truth else truth[runs],
+                         None if detections is None else detections[runs],
+                         None if serving is None else serving[runs])
+    return evaluator
@@ -0,0 +1,258 @@
+import numpy as np
+
+from scenario.signal_calculation import draw_uniform_fading_dB
+from scenario.ue_movement import get_rng
+
+# 每次向量化處理的時間步數，中間陣列大小為 (NUM_UE, FADING_BLOCK, NUM_STATIONS)
+FADING_BLOCK = 256
+# 單步的 Δd/d_corr 上限：e^{-30} 已可忽略，截斷不影響結果但避免 e^{L} 溢位
+MAX_STEP_DECAY = 30.0
+# 累積和求解時子區塊內 L 的上限，e^{L} 需小於 float64 上限 (約 e^{709})
+MAX_BLOCK_DECAY = 600.0
+
+def trajectory_steps(ue_positions, previous=None):
+    """
+    每個時間點相對前一個時間點的移動距離
+
+    Args:
+        ue_positions: UE位置序列 (NUM_UE, B, 2)
+        previous: 前一個區塊最後的位置 (NUM_UE, 2)，None表示第一個時間點距離為0
+
+    Returns:
+        np.ndarray: 移動距離 (NUM_UE, B)
+    """
+    positions = np.asarray(ue_positions, dtype=float)
+    start = positions[:, :1] if previous is None else previous[:, np.newaxis]
+    return np.linalg.norm(np.diff(positions, axis=1, prepend=start), axis=2)
+
+def time_blocks(num_steps):
+    """以 FADING_BLOCK 為單位切分時間軸"""
+    return [slice(start, min(start + FADING_BLOCK, num_steps)) for start in range(0, num_steps, FADING_BLOCK)]
+
+def correlated_gaussian(steps, correlation_distance, num_channels, rng, state=None):
+    """
+    沿軌跡距離指數相關的單位高斯過程 (Gudmundson 模型)，處理一個時間區塊
+
+    x_t = a_t x_{t-1} + sqrt(1 - a_t^2) w_t，a_t = exp(-Δd_t / correlation_distance)。
+    可變係數的 AR(1) 在子區塊內以累積和一次求解：
+    x_t = e^{-L_t} (x_{start} + Σ_{i<=t} e^{L_i} b_i w_i)，L 為子區塊內累積的 Δd/d_corr，
+    所有UE與通道同時計算，不逐時間點迴圈。暫停時 Δd=0，數值維持不變。
+    去相關距離很短時 (例如快速衰落的同調距離) 將區塊切成 L 不超過 MAX_BLOCK_DECAY 的
+    子區塊，避免 e^{L} 溢位。
+
+    Args:
+        steps: 移動距離 (NUM_UE, B)
+        correlation_distance: 去相關距離(m)
+        num_channels: 每個UE的獨立通道數 (例如基站數量)
+        rng: np.random.Generator
+        state: 前一個區塊最後的值 (NUM_UE, num_channels)，None表示由平穩分布抽樣
+
+    Returns:
+        tuple: (數值 (NUM_UE, B, num_channels) float64, 最後的值 (NUM_UE, num_channels))
+    """
+    if state is None:
+        state = rng.standard_normal((steps.shape[0], num_channels))
+    decay = np.minimum(steps / correlation_distance, MAX_STEP_DECAY)
+    values = rng.standard_normal(steps.shape + (num_channels,))
+
+    # 依所有UE中最大的單步衰減累積量切分子區塊，每個UE在子區塊內的 L 都有上限
+    bound = np.cumsum(decay.max(axis=0, initial=0.0))
+    cuts = np.flatnonzero(np.diff(bound // MAX_BLOCK_DECAY)) + 1
+    for start, end in zip(np.r_[0, cuts], np.r_[cuts, steps.shape[1]]):
+        sub_decay = decay[:, start:end]
+        L = np.cumsum(sub_decay, axis=1)
+        gain = np.exp(L) * np.sqrt(-np.expm1(-2 * sub_decay))
+
+        sub = values[:, start:end]
+        sub *= gain[:, :, np.newaxis]
+        np.cumsum(sub, axis=1, out=sub)
+        sub += state[:, np.newaxis, :]
+        sub *= np.exp(-L)[:, :, np.newaxis]
+        state = sub[:, -1]
+    return values, state.copy()
+
+class FadingModel:
+    """
+    衰落模型的共同介面
+
+    模型物件保存前一個時間區塊結束時的狀態，依時間順序分塊呼叫 add_dB 即可得到
+    連續的通道；換到另一批UE或重新開始時呼叫 reset()。
+    """
+    # 時間相關的狀態，不屬於模型參數
+    STATE_FIELDS = ('state', 'last_positions')
+
+    def __repr__(self):
+        """模型名稱與參數，也用於階段快取的鍵值"""
+        params = ', '.join(f"{name}={value!r}" for name, value in vars(self).items()
+                           if name not in self.STATE_FIELDS)
+        return f"{type(self).__name__}({params})"
+
+    def reset(self):
+        """清除時間相關的狀態"""
+
+    def add_dB(self, Rxlev, ue_positions, rng=None):
+        """
+        將衰落量(dB)加到信號強度上 (原地修改)
+
+        Args:
+            Rxlev: 信號強度 (NUM_UE, B, NUM_STATIONS)
+            ue_positions: UE位置序列 (NUM_UE, B, 2)
+            rng: np.random.Generator 或種子
+        """
+        raise NotImplementedError
+
+    def sample_dB(self, ue_positions, num_stations, rng=None, dtype=np.float64):
+        """產生衰落量(dB) (NUM_UE, B, num_stations)"""
+        fading = np.zeros(np.shape(ue_positions)[:-1] + (num_stations,), dtype=dtype)
+        self.add_dB(fading, ue_positions, rng)
+        return fading
+
+class UniformFading(FadingModel):
+    """原本的均勻衰落 x_t ~ U(0, 2)，每個樣本獨立"""
+    def add_dB(self, Rxlev, ue_positions, rng=None):
+        Rxlev += draw_uniform_fading_dB(Rxlev.shape, rng, Rxlev.dtype)
+
+class ShadowFading(FadingModel):
+    """對數常態陰影衰落，沿軌跡距離指數相關 (Gudmundson 模型)"""
+    def __init__(self, sigma_dB=8.0, correlation_distance=50.0):
+        """
+        Args:
+            sigma_dB: 陰影衰落標準差(dB)
+            correlation_distance: 去相關距離(m)
+        """
+        self.sigma_dB = sigma_dB
+        self.correlation_distance = correlation_distance
+        self.reset()
+
+    def reset(self):
+        self.last_positions = None
+        self.state = None
+
+    def add_dB(self, Rxlev, ue_positions, rng=None):
+        rng = get_rng(rng)
+        steps = trajectory_steps(ue_positions, self.last_positions)
+        for block in time_blocks(Rxlev.shape[1]):
+            shadow, self.state = correlated_gaussian(steps[:, block], self.correlation_distance,
+                                                     Rxlev.shape[-1], rng, self.state)
+            shadow *= self.sigma_dB
+            Rxlev[:, block] += shadow
+        self.last_positions = np.asarray(ue_positions, dtype=float)[:, -1].copy()
+
+class RicianFading(FadingModel):
+    """
+    Rician 快速衰落，K=0 即為 Rayleigh 衰落
+
+    通道 h = sqrt(K/(K+1)) + sqrt(1/(K+1)) g，g 為單位功率的複數高斯；功率增益 |h|^2 的平均為1。
+    coherence_distance 為 None 時每個樣本獨立 (移動距離遠大於同調距離時的情形)，
+    否則 g 的實部與虛部沿軌跡距離指數相關。
+    """
+    def __init__(self, K=0.0, coherence_distance=None):
+        """
+        Args:
+            K: 直射路徑與散射路徑的功率比 (線性)
+            coherence_distance: 同調距離(m)，例如 0.38 * 波長；None表示每個樣本獨立
+        """
+        self.K = K
+        self.coherence_distance = coherence_distance
+        self.reset()
+
+    def reset(self):
+        self.last_positions = None
+        self.state = None
+
+    def add_dB(self, Rxlev, ue_positions, rng=None):
+        rng = get_rng(rng)
+        num_stations = Rxlev.shape[-1]
+        los = np.sqrt(self.K / (self.K + 1))
+        scatter = np.sqrt(0.5 / (self.K + 1))
+        if self.coherence_distance is not None:
+            steps = trajectory_steps(ue_positions, self.last_positions)
+
+        for block in time_blocks(Rxlev.shape[1]):
+            shape = Rxlev[:, block].shape
+            if self.coherence_distance is None:
+                real = rng.standard_normal(shape, dtype=Rxlev.dtype)
+                imag = rng.standard_normal(shape, dtype=Rxlev.dtype)
+            else:
+                # 實部與虛部視為 2*NUM_STATIONS 個獨立通道
+                g, self.state = correlated_gaussian(steps[:, block], self.coherence_distance,
+                                                    2 * num_stations, rng, self.state)
+                real, imag = g[:, :, :num_stations], g[:, :, num_stations:]
+
+            real *= scatter
+            real += los
+            imag *= scatter
+            power = np.square(real, out=real)
+            power += np.square(imag, out=imag)
+            np.log10(power, out=power)
+            power *= 10
+            Rxlev[:, block] += power
+        if self.coherence_distance is not None:
+            self.last_positions = np.asarray(ue_positions, dtype=float)[:, -1].copy()
+
+class RayleighFading(RicianFading):
+    """Rayleigh 快速衰落 (沒有直射路徑)"""
+    def __init__(self, coherence_distance=None):
+        super().__init__(K=0.0, coherence_distance=coherence_distance)
+
+class CompositeFading(FadingModel):
+    """多個衰落模型相加 (dB)，例如陰影衰落加上快速衰落"""
+    def __init__(self, *models):
+        self.models = models
+
+    def reset(self):
+        for model in self.models:
+            model.reset()
+
+    def add_dB(self, Rxlev, ue_positions, rng=None):
+        rng = get_rng(rng)
+        for model in self.models:
+            model.add_dB(Rxlev, ue_positions, rng)
+
+# make_fading 可用的模型名稱
+FADING_MODELS = ('uniform', 'shadowing', 'rayleigh', 'rician', 'shadowing+rayleigh', 'shadowing+rician')
+
+def make_fading(name, sigma_dB=8.0, correlation_distance=50.0, K=3.0, coherence_distance=None):
+    """
+    依名稱建立衰落模型
+
+    Args:
+        name: FADING_MODELS 之一，'+' 連接的模型相加
+        sigma_dB: 陰影衰落標準差(dB)
+        correlation_distance: 陰影衰落去相關距離(m)
+        K: Rician K 因子 (線性)
+        coherence_distance: 快速衰落同調距離(m)，None表示每個樣本獨立
+
+    Returns:
+        FadingModel
+    """
+    if name not in FADING_MODELS:
+        raise ValueError(f"未知的衰落模型 {name!r}，可用: {', '.join(FADING_MODELS)}")
+    factories = {
+        'uniform': lambda: UniformFading(),
+        'shadowing': lambda: ShadowFading(sigma_dB, correlation_distance),
+        'rayleigh': lambda: RayleighFading(coherence_distance),
+        'rician': lambda: RicianFading(K, coherence_distance)
+    }
+    models = [factories[part]() for part in name.split('+')]
+    return models[0] if len(models) == 1 else CompositeFading(*models)
+
+def is_memoryless(model):
+    """
+    衰落模型是否每個樣本獨立 (沒有跨時間區塊的通道狀態)
+
+    候選基站模式每個時間區塊的基站欄位不同，只能使用這類模型。
+
+    Args:
+        model: FadingModel 或 None
+
+    Returns:
+        bool
+    """
+    if model is None or isinstance(model, UniformFading):
+        return True
+    if isinstance(model, RicianFading):
+        return model.coherence_distance is None
+    if isinstance(model, CompositeFading):
+        return all(is_memoryless(part) for part in model.models)
+    return False
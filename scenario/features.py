@@ -0,0 +1,264 @@
+import json
+import os
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from scenario.dataset import DatasetReader
+from scenario.sampling import seconds_to_steps
+
+FEATURES_META = 'features.json'
+# 每個基站的特徵與整體特徵的名稱
+CELL_FEATURES = ('mean', 'std', 'slope', 'max_gain')
+GLOBAL_FEATURES = ('margin_last', 'margin_mean', 'handover_rate', 'sudden_gain')
+
+def feature_names(station_names):
+    """特徵欄位名稱：每個基站的 CELL_FEATURES，再加上 GLOBAL_FEATURES"""
+    return [f'{name}_{feature}' for feature in CELL_FEATURES for name in station_names] + list(GLOBAL_FEATURES)
+
+class WindowSegments:
+    """
+    將所有視窗切成共同的片段，先把每個片段化為一個值，視窗統計量再由片段組合，
+    計算量與視窗長度無關，主要只剩一次讀過原始陣列
+
+    視窗起點為 0, hop, 2*hop, ...，長度 length = q*hop + r。時間軸以 hop 為單位
+    reshape 成區塊，r > 0 時每個區塊再分成 [0, r) 與 [r, hop) 兩個片段；
+    每個視窗恰好由 count 個連續片段組成，片段內的化簡都是連續記憶體上的 reduce。
+    """
+    def __init__(self, num_windows, length, hop):
+        self.hop = hop
+        self.q, self.r = divmod(length, hop)
+        self.parts = 2 if self.r else 1
+        self.num_blocks = num_windows - 1 + self.q + (1 if self.r else 0)
+        self.first = np.arange(num_windows) * self.parts
+        self.count = self.q * self.parts + (1 if self.r else 0)
+        # 每個時間點在所屬片段內的位置，與每個片段的起點
+        position = np.arange(hop)
+        self.offset_in_segment = np.where(position < self.r, position, position - self.r)
+        block_start = np.arange(self.num_blocks)[:, np.newaxis] * hop
+        self.segment_start = (block_start + (np.array([0, self.r]) if self.r else 0)).ravel()
+
+    def reduce(self, values, ufunc=np.add, weights=None):
+        """
+        每個片段的 reduce 結果 (U, S, ...)；加總以float64累加
+
+        Args:
+            values: (U, B, ...)
+            ufunc: np.add 或 np.maximum
+            weights: 加總前乘上片段內位置的權重 (hop,)，None表示不加權
+        """
+        num_ue, rest = values.shape[0], values.shape[2:]
+        num_full = min(self.num_blocks, values.shape[1] // self.hop)
+        blocks = values[:, :num_full * self.hop].reshape((num_ue, num_full, self.hop) + rest)
+        # 最後一個區塊可能不完整，但只需要它的第一個片段 [0, r)
+        tail = values[:, num_full * self.hop:num_full * self.hop + self.r][:, np.newaxis] \
+            if num_full < self.num_blocks else None
+        if weights is not None:
+            shape = (1, 1, self.hop) + (1,) * len(rest)
+            blocks = blocks * weights.astype(values.dtype).reshape(shape)
+            if tail is not None:
+                tail = tail * weights[:self.r].astype(values.dtype).reshape(shape[:2] + (self.r,) + shape[3:])
+        kwargs = {'dtype': np.float64} if ufunc is np.add else {}
+
+        if self.r:
+            parts = [ufunc.reduce(blocks[:, :, :self.r], axis=2, **kwargs),
+                     ufunc.reduce(blocks[:, :, self.r:], axis=2, **kwargs)]
+            segments = np.stack(parts, axis=2).reshape((num_ue, 2 * num_full) + rest)
+        else:
+            segments = ufunc.reduce(blocks, axis=2, **kwargs)
+        if tail is not None:
+            segments = np.concatenate([segments, ufunc.reduce(tail, axis=2, **kwargs)], axis=1)
+        return segments
+
+    def window_sum(self, segments):
+        """由片段總和求每個視窗的總和 (U, K, ...)"""
+        cumsum = np.zeros((segments.shape[0], segments.shape[1] + 1) + segments.shape[2:])
+        np.cumsum(segments, axis=1, out=cumsum[:, 1:])
+        return cumsum[:, self.first + self.count] - cumsum[:, self.first]
+
+    def window_max(self, segments):
+        """由片段最大值求每個視窗的最大值 (U, K, ...)，片段的滑動視窗是唯讀view"""
+        windows = sliding_window_view(segments, self.count, axis=1)[:, self.first]
+        return windows.max(axis=-1)
+
+    def weighted_sum(self, values):
+        """
+        每個視窗的 Σ (t - 視窗起點) * values
+
+        片段內以小整數位置加權，再加上片段起點乘以片段總和，避免大索引相乘的誤差。
+        """
+        expand = (1, -1) + (1,) * (values.ndim - 2)
+        sums = self.reduce(values)
+        local = self.reduce(values, weights=self.offset_in_segment)
+        local += self.segment_start[:sums.shape[1]].reshape(expand) * sums
+        window_start = (self.first // self.parts * self.hop).reshape(expand)
+        return self.window_sum(local) - window_start * self.window_sum(sums)
+
+def window_features(Rxlev, serving, labels, window, hop=1, timestep=1.0, gain_threshold_dB=6.0):
+    """
+    計算一個 UE/時間區塊內所有滑動視窗的特徵
+
+    視窗結束於 window-1, window-1+hop, ... (區塊內的索引)。總和類的統計量
+    (平均、標準差、斜率、平均差距、切換次數) 由片段總和的累積和求得，單步最大增益
+    由片段最大值的 sliding_window_view 求得，都不會展開 (U, K, window) 的複本。
+
+    Args:
+        Rxlev: 所有基站信號強度 (U, B, NUM_STATIONS)
+        serving: 服務基站索引 (U, B)
+        labels: 是否連上惡意基站 (U, B)
+        window: 視窗長度(時間步數)，至少2
+        hop: 相鄰視窗的間隔(時間步數)
+        timestep: 時間間隔(秒)，斜率與切換率以秒為單位
+        gain_threshold_dB: 單步增益超過此值時 sudden_gain 為1
+
+    Returns:
+        tuple:
+            - features: 特徵 (U, K, 4*NUM_STATIONS + 4) float32，欄位順序同 feature_names
+            - labels: 每個視窗最後一個時間點的標籤 (U, K)
+            - ends: 視窗最後一個時間點的索引 (K,)
+    """
+    if window < 2:
+        raise ValueError("視窗長度至少需要2個時間點")
+    num_ue, num_steps, num_stations = Rxlev.shape
+    ends = np.arange(window - 1, num_steps, hop)
+    segments = WindowSegments(len(ends), window, hop)
+    # 相鄰時間點的差分與切換，每個視窗包含 window-1 個
+    pair_segments = WindowSegments(len(ends), window - 1, hop)
+
+    # 以每個UE、每個基站的第一個值為基準，避免平方和的數值誤差
+    reference = Rxlev[:, :1]
+    x = Rxlev - reference
+    sum_x = segments.window_sum(segments.reduce(x))
+    sum_x2 = segments.window_sum(segments.reduce(np.square(x)))
+    sum_jx = segments.weighted_sum(x)
+
+    mean = sum_x / window
+    std = np.sqrt(np.maximum(sum_x2 / window - np.square(mean), 0.0))
+    # 最小平方法斜率：j 為相對視窗起點的時間索引，Σ(j - j̄)^2 = W(W^2-1)/12
+    slope = (sum_jx - (window - 1) / 2 * sum_x) / (window * (window**2 - 1) / 12) / timestep
+    mean += reference
+
+    # 視窗內的單步最大增益
+    max_gain = pair_segments.window_max(pair_segments.reduce(np.diff(Rxlev, axis=1), np.maximum))
+
+    # 服務基站與最強的其他基站的差距
+    serving_rsrp = np.take_along_axis(Rxlev, serving[:, :, np.newaxis], axis=2)[:, :, 0]
+    top = np.partition(Rxlev, num_stations - 2, axis=2)[:, :, num_stations - 2:]
+    best_other = np.where(serving_rsrp >= top[:, :, 1], top[:, :, 0], top[:, :, 1])
+    margin = serving_rsrp - best_other
+    margin_mean = segments.window_sum(segments.reduce(margin)) / window
+
+    # 視窗內的切換次數 (window-1 個相鄰時間點)
+    changes = serving[:, 1:] != serving[:, :-1]
+    handover_rate = pair_segments.window_sum(pair_segments.reduce(changes)) / ((window - 1) * timestep)
+
+    features = np.concatenate([
+        mean, std, slope, max_gain,
+        margin[:, ends, np.newaxis],
+        margin_mean[:, :, np.newaxis],
+        handover_rate[:, :, np.newaxis],
+        (max_gain.max(axis=2) > gain_threshold_dB)[:, :, np.newaxis]
+    ], axis=2).astype(np.float32)
+    return features, labels[:, ends], ends
+
+def load_features(path):
+    """
+    以memmap讀取 extract_features 的輸出
+
+    Returns:
+        dict: features (N, F)、labels (N,)、ue (N,)、time (N,) 與 meta (features.json 內容)
+    """
+    with open(os.path.join(path, FEATURES_META), encoding='utf-8') as f:
+        meta = json.load(f)
+    arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+              for name in ('features', 'labels', 'ue', 'time')}
+    return dict(arrays, meta=meta)
+
+def extract_features(dataset_path, output_path, window_seconds=5.0, hop_seconds=1.0, gain_threshold_dB=6.0,
+                     block_ue=64, block_windows=4096):
+    """
+    由 rogue_bs_data 的欄位式資料集產生滑動視窗特徵，依 UE/時間區塊串流處理
+
+    每個區塊只把需要的列由memmap讀成 (U, B, NUM_STATIONS) float32，相鄰時間區塊重疊
+    window-1 個時間點；輸出為記憶體映射的 features.npy (N, F) float32、labels.npy、
+    ue.npy、time.npy (視窗結束時間) 與 features.json，依UE再依視窗排列。
+    只支援依UE排列且每個UE時間點相同的資料集 (例如 rogue_bs_data 的輸出；不支援量測報告模式
+    與依時間區塊附加的資料集)。
+
+    Args:
+        dataset_path: 資料集目錄
+        output_path: 輸出目錄
+        window_seconds: 視窗長度(秒)
+        hop_seconds: 相鄰視窗的間隔(秒)
+        gain_threshold_dB: sudden_gain 的單步增益閾值(dB)
+        block_ue: 每個區塊的UE數量
+        block_windows: 每個區塊的視窗數量
+
+    Returns:
+        dict: load_features 的結果
+    """
+    reader = DatasetReader(dataset_path)
+    if not reader.is_ue_major():
+        raise ValueError("只支援依UE排列的資料集 (依時間區塊附加的資料集為區塊優先)")
+    ue_column = reader.column('ue')
+    num_ue = int(ue_column[-1]) + 1 if reader.num_rows else 0
+    num_steps = int(np.searchsorted(ue_column, 1)) if num_ue else 0
+    if num_ue * num_steps != reader.num_rows:
+        raise ValueError("只支援每個UE時間點相同的資料集")
+
+    T = np.asarray(reader.column('time')[:num_steps], dtype=float)
+    time_grid = reader.column('time').reshape(num_ue, num_steps)
+    for u0 in range(0, num_ue, block_ue):
+        if np.any(time_grid[u0:u0 + block_ue] != T):
+            raise ValueError("只支援每個UE時間點相同的資料集")
+    window = seconds_to_steps(window_seconds, T)
+    hop = seconds_to_steps(hop_seconds, T)
+    timestep = (T[-1] - T[0]) / (num_steps - 1)
+    station_names = [name for name in reader.columns if name.startswith(('BS', 'RBS'))]
+    names = feature_names(station_names)
+    ends = np.arange(window - 1, num_steps, hop)
+    num_windows = len(ends)
+
+    # 各欄位以 (NUM_UE, T) 的memmap view 讀取，不載入整個欄位
+    grid = {name: reader.column(name).reshape(num_ue, num_steps) for name in station_names + ['connected_bs', 'label']}
+    os.makedirs(output_path, exist_ok=True)
+    outputs = {
+        'features': ((num_ue * num_windows, len(names)), np.float32),
+        'labels': ((num_ue * num_windows,), bool),
+        'ue': ((num_ue * num_windows,), np.min_scalar_type(max(num_ue - 1, 0))),
+        'time': ((num_ue * num_windows,), np.float64)
+    }
+    arrays = {name: np.lib.format.open_memmap(os.path.join(output_path, f'{name}.npy'), mode='w+',
+                                              dtype=dtype, shape=shape)
+              for name, (shape, dtype) in outputs.items()}
+    arrays['ue'][:] = np.repeat(np.arange(num_ue), num_windows)
+    arrays['time'][:] = np.tile(T[ends], num_ue)
+    features = arrays['features'].reshape(num_ue, num_windows, len(names))
+    labels = arrays['labels'].reshape(num_ue, num_windows)
+
+    for u0 in range(0, num_ue, block_ue):
+        ue_block = slice(u0, min(u0 + block_ue, num_ue))
+        for k0 in range(0, num_windows, block_windows):
+            k1 = min(k0 + block_windows, num_windows)
+            time_block = slice(ends[k0] - window + 1, ends[k1 - 1] + 1)
+            Rxlev = np.stack([grid[name][ue_block, time_block] for name in station_names], axis=2)
+            serving = grid['connected_bs'][ue_block, time_block].astype(np.int64) - 1
+            features[ue_block, k0:k1], labels[ue_block, k0:k1], _ = window_features(
+                Rxlev, serving, grid['label'][ue_block, time_block], window, hop, timestep, gain_threshold_dB)
+
+    for array in arrays.values():
+        array.flush()
+    meta = {
+        'names': names,
+        'window': window,
+        'hop': hop,
+        'window_seconds': window * timestep,
+        'hop_seconds': hop * timestep,
+        'gain_threshold_dB': gain_threshold_dB,
+        'num_ue': num_ue,
+        'num_windows': num_windows,
+        'source': os.path.abspath(dataset_path)
+    }
+    with open(os.path.join(output_path, FEATURES_META), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    return load_features(output_path)
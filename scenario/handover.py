@@ -0,0 +1,546 @@
+import numpy as np
+
+from scenario.sampling import seconds_to_steps
+from scenario.signal_calculation import PAD_RXLEV
+
+# 事件跳躍搜尋時每次向前檢查的時間步數
+SCAN_CHUNK = 64
+# 量測報告模式下每次向前檢查的報告數範圍
+MIN_SCAN_CHUNK = 4
+MAX_SCAN_CHUNK = 1024
+
+def init_handover_state(first_signals, time_window=10):
+    """
+    由第一個時間點的信號建立切換狀態：選擇信號最強的基站作為服務基站
+
+    Args:
+        first_signals: 第一個時間點所有基站的信號強度 (NUM_UE, NUM_STATIONS)
+        time_window: 平均信號的時間窗口(時間步數)
+
+    Returns:
+        dict: 切換狀態
+            - serving: 目前服務基站索引 (NUM_UE,)
+            - last_handover: 上一次切換的時間索引 (NUM_UE,)
+            - history: 最近 time_window-1 個時間點的信號 (NUM_UE, time_window-1, NUM_STATIONS)
+            - t: 下一個要處理的時間索引
+    """
+    num_ue, num_stations = first_signals.shape
+    return {
+        'serving': np.argmax(first_signals, axis=1),
+        'last_handover': np.zeros(num_ue, dtype=np.int64),
+        'history': np.zeros((num_ue, time_window - 1, num_stations)),
+        't': 0
+    }
+
+def sliding_window_mean(Rxlev, history, t_start, time_window=10):
+    """
+    以累積和計算每個時間點最近 time_window 個時間點的平均信號，複雜度O(T)
+
+    第0個時間點不列入歷史，與逐步模擬的信號歷史一致。
+
+    Args:
+        Rxlev: 信號強度 (NUM_UE, B, NUM_STATIONS)
+        history: 前一區塊最後 time_window-1 個時間點的信號
+        t_start: 此區塊第一個時間點的索引
+        time_window: 時間窗口
+
+    Returns:
+        tuple:
+            - np.ndarray: 平均信號 (NUM_UE, B, NUM_STATIONS)
+            - np.ndarray: 新的歷史信號，供下一區塊使用
+    """
+    samples = np.asarray(Rxlev, dtype=float)
+    if t_start == 0:
+        samples = samples.copy()
+        samples[:, 0] = 0
+
+    extended = np.concatenate([history, samples], axis=1)
+    cumsum = np.zeros((extended.shape[0], extended.shape[1] + 1, extended.shape[2]))
+    np.cumsum(extended, axis=1, out=cumsum[:, 1:])
+    window_sum = cumsum[:, time_window:] - cumsum[:, :-time_window]
+
+    t_abs = t_start + np.arange(samples.shape[1])
+    counts = np.clip(t_abs, 1, time_window)
+    window_mean = window_sum / counts[np.newaxis, :, np.newaxis]
+
+    new_history = extended[:, extended.shape[1] - (time_window - 1):]
+    return window_mean, new_history
+
+def simulate_handover(Rxlev, NUM_BS, handover_threshold=3, time_window=10,
+                      min_time_between_handovers=20, state=None, return_state=False):
+    """
+    向量化的基站切換狀態機，一次處理所有UE
+
+    每個時間點的規則與逐步模擬相同：距離上次切換至少 min_time_between_handovers
+    個時間點後，若候選基站的平均信號比服務基站平均信號高出 handover_threshold，
+    且高於服務基站當下的信號，則切換到平均信號最強的候選基站。
+    服務基站在兩次切換之間不變，因此以區塊向前搜尋下一個切換點，不逐步執行。
+
+    Args:
+        Rxlev: 所有基站的信號強度 (NUM_UE, T, NUM_STATIONS)，前 NUM_BS 個為合法基站
+        NUM_BS: 合法基站數量
+        handover_threshold: 切換閾值(dB)
+        time_window: 平均信號的時間窗口(時間步數)
+        min_time_between_handovers: 兩次切換的最小間隔(時間步數)
+        state: 前一個時間區塊的切換狀態，None表示從第0個時間點開始
+        return_state: 是否同時回傳切換狀態，供下一個時間區塊接續
+
+    Returns:
+        tuple:
+            - serving: 每個時間點的服務基站索引 (NUM_UE, T)
+            - handover: 是否在該時間點切換 (NUM_UE, T)
+            - labels: 服務基站是否為惡意基站 (NUM_UE, T)
+            - state: 切換狀態 (僅在 return_state=True 時回傳)
+    """
+    num_ue, num_steps, num_stations = Rxlev.shape
+    if state is None:
+        state = init_handover_state(Rxlev[:, 0, :], time_window)
+    t_start = state['t']
+
+    window_mean, history = sliding_window_mean(Rxlev, state['history'], t_start, time_window)
+
+    serving_now = state['serving'].copy()
+    last_handover = state['last_handover'].copy()
+    new_cell = np.full((num_ue, num_steps), -1, dtype=np.int64)
+
+    # 下一個允許切換的時間點 (區塊內相對索引)
+    next_check = np.maximum(last_handover + min_time_between_handovers, max(t_start, 1)) - t_start
+    offsets = np.arange(SCAN_CHUNK)
+    active = np.nonzero(next_check < num_steps)[0]
+
+    while active.size:
+        start = next_check[active]
+        idx = start[:, np.newaxis] + offsets
+        valid = idx < num_steps
+        idx = np.minimum(idx, num_steps - 1)
+        rows = active[:, np.newaxis]
+        current = serving_now[active]
+
+        avg = window_mean[rows, idx]
+        avg_current = window_mean[rows, idx, current[:, np.newaxis]]
+        signal_current = Rxlev[rows, idx, current[:, np.newaxis]]
+
+        qualified = avg >= avg_current[:, :, np.newaxis] + handover_threshold
+        qualified[np.arange(active.size), :, current] = False
+        candidate = np.where(qualified, avg, -np.inf)
+        best = np.argmax(candidate, axis=2)
+        best_signal = np.take_along_axis(candidate, best[:, :, np.newaxis], axis=2)[:, :, 0]
+
+        switch = (best_signal > signal_current) & valid
+        hit = switch.any(axis=1)
+        first = np.argmax(switch, axis=1)
+
+        ue_hit = active[hit]
+        t_hit = start[hit] + first[hit]
+        target = best[hit, first[hit]]
+        new_cell[ue_hit, t_hit] = target
+        serving_now[ue_hit] = target
+        last_handover[ue_hit] = t_start + t_hit
+        next_check[ue_hit] = t_hit + min_time_between_handovers
+        next_check[active[~hit]] = start[~hit] + SCAN_CHUNK
+
+        active = active[next_check[active] < num_steps]
+
+    # 由切換點向後填補服務基站
+    handover = new_cell >= 0
+    filled = new_cell.copy()
+    filled[:, 0] = np.where(handover[:, 0], new_cell[:, 0], state['serving'])
+    source = np.where(handover, np.arange(num_steps), 0)
+    np.maximum.accumulate(source, axis=1, out=source)
+    serving = np.take_along_axis(filled, source, axis=1)
+    labels = serving >= NUM_BS
+
+    if not return_state:
+        return serving, handover, labels
+    new_state = {
+        'serving': serving_now,
+        'last_handover': last_handover,
+        'history': history,
+        't': t_start + num_steps
+    }
+    return serving, handover, labels, new_state
+
+def iter_handover(Rxlev_blocks, NUM_BS, handover_threshold=3, time_window=10,
+                  min_time_between_handovers=20):
+    """
+    逐個時間區塊執行切換狀態機，區塊之間延續切換狀態，不需要完整的信號矩陣
+
+    Args:
+        Rxlev_blocks: 依時間順序產生 (NUM_UE, B, NUM_STATIONS) 信號區塊的可迭代物件
+        NUM_BS: 合法基站數量
+        handover_threshold: 切換閾值(dB)
+        time_window: 平均信號的時間窗口(時間步數)
+        min_time_between_handovers: 兩次切換的最小間隔(時間步數)
+
+    Yields:
+        tuple: 每個區塊的 (serving, handover, labels)
+    """
+    state = None
+    for Rxlev in Rxlev_blocks:
+        serving, handover, labels, state = simulate_handover(
+            Rxlev, NUM_BS, handover_threshold, time_window,
+            min_time_between_handovers, state=state, return_state=True)
+        yield serving, handover, labels
+
+def remap_handover_state(state, station_ids, recent, time_window=10, pad_value=PAD_RXLEV):
+    """
+    將前一個區塊的切換狀態對應到新的候選基站集合
+
+    前後區塊都有的基站沿用原本的信號歷史；新加入的基站以 recent (重新計算的
+    區塊前 H 個時間點) 補上歷史，更早的部分與從頭開始時相同為0。目前的服務基站
+    必須在新的候選集合中。
+
+    Args:
+        state: 前一個區塊的切換狀態，含該區塊的 station_ids
+        station_ids: 新區塊的候選基站索引 (NUM_UE, M)，-1為補位
+        recent: 新候選基站在區塊開始前 H 個時間點的信號 (NUM_UE, H, M)，H <= time_window-1
+        time_window: 平均信號的時間窗口(時間步數)
+        pad_value: 補位欄位的信號強度
+
+    Returns:
+        dict: simulate_handover 可接續的切換狀態，欄位對應 station_ids
+    """
+    num_ue, num_candidates = station_ids.shape
+    history_length = time_window - 1
+    num_recent = recent.shape[1]
+    history = np.zeros((num_ue, history_length, num_candidates))
+    if num_recent:
+        history[:, history_length - num_recent:] = recent
+        if state['t'] == num_recent:
+            # 第0個時間點不列入歷史
+            history[:, history_length - num_recent] = 0
+    history[np.broadcast_to((station_ids < 0)[:, np.newaxis, :], history.shape)] = pad_value
+
+    # 以 (UE, 基站) 鍵值在前一個區塊的候選欄位中搜尋相同的基站
+    previous_ids = state['station_ids']
+    base = max(int(previous_ids.max(initial=0)), int(station_ids.max(initial=0))) + 1
+    rows = np.arange(num_ue)[:, np.newaxis]
+    previous_key = np.where(previous_ids >= 0, rows * base + previous_ids, -1).ravel()
+    order = np.argsort(previous_key, kind='stable')
+    sorted_key = previous_key[order]
+    key = rows * base + station_ids
+    position = np.minimum(np.searchsorted(sorted_key, key), len(sorted_key) - 1)
+    found = (sorted_key[position] == key) & (station_ids >= 0)
+    ue_idx, column = np.nonzero(found)
+    previous_column = order[position[ue_idx, column]] % previous_ids.shape[1]
+    history[ue_idx, :, column] = state['history'][ue_idx, :, previous_column]
+
+    serving_id = np.take_along_axis(previous_ids, state['serving'][:, np.newaxis], axis=1)
+    is_serving = station_ids == serving_id
+    if not is_serving.any(axis=1).all():
+        raise ValueError("新的候選基站集合必須包含目前的服務基站")
+    return {
+        'serving': np.argmax(is_serving, axis=1),
+        'last_handover': state['last_handover'],
+        'history': history,
+        't': state['t']
+    }
+
+def simulate_handover_candidates(Rxlev, station_ids, is_rogue, handover_threshold=3, time_window=10,
+                                 min_time_between_handovers=20, rogue_active=None, state=None,
+                                 return_state=False, history_steps=0):
+    """
+    在每個UE的候選基站集合上執行切換狀態機，適用於大量基站的部署
+
+    可逐個時間區塊呼叫，每個區塊的候選集合可以不同 (例如依區塊內的位置重新選擇)；
+    切換狀態以基站索引記錄，由 remap_handover_state 對應到下一個區塊的欄位。
+
+    Args:
+        Rxlev: 候選基站信號強度 (NUM_UE, history_steps + T, M)，欄位順序對應 station_ids
+        station_ids: 每個UE的候選基站索引 (NUM_UE, M)，-1為補位
+        is_rogue: 每個基站是否為惡意基站 (NUM_STATIONS,)
+        handover_threshold: 切換閾值(dB)
+        time_window: 平均信號的時間窗口(時間步數)
+        min_time_between_handovers: 兩次切換的最小間隔(時間步數)
+        rogue_active: 惡意基站是否正在攻擊 (history_steps + T,)，未攻擊時信號視為-100dBm；None表示一直攻擊
+        state: 前一個區塊回傳的切換狀態，None表示從第0個時間點開始
+        return_state: 是否同時回傳切換狀態，供下一個時間區塊接續
+        history_steps: Rxlev 開頭屬於區塊開始前的時間點數 (最多 time_window-1)，
+            用於補上新加入候選基站的平均信號歷史，不輸出結果
+
+    Returns:
+        tuple:
+            - serving: 每個時間點的服務基站索引(基站資料表中的索引) (NUM_UE, T)
+            - handover: 是否在該時間點切換 (NUM_UE, T)
+            - labels: 服務基站是否為惡意基站 (NUM_UE, T)
+            - state: 切換狀態 (僅在 return_state=True 時回傳)
+    """
+    candidate_rogue = (station_ids >= 0) & is_rogue[np.maximum(station_ids, 0)]
+    if rogue_active is not None:
+        inactive = candidate_rogue[:, np.newaxis, :] & ~np.asarray(rogue_active)[np.newaxis, :, np.newaxis]
+        Rxlev = np.where(inactive, -100.0, Rxlev)
+
+    if state is not None:
+        state = remap_handover_state(state, station_ids, Rxlev[:, :history_steps], time_window)
+    column, handover, _, new_state = simulate_handover(
+        Rxlev[:, history_steps:], station_ids.shape[1], handover_threshold, time_window,
+        min_time_between_handovers, state=state, return_state=True)
+    serving = np.take_along_axis(station_ids, column, axis=1)
+    labels = is_rogue[serving]
+    if not return_state:
+        return serving, handover, labels
+    new_state['station_ids'] = station_ids
+    return serving, handover, labels, new_state
+
+def simulate_handover_reports(Rxlev, reports, NUM_BS, handover_threshold=3, window_seconds=1.0,
+                              min_handover_interval=2.0):
+    """
+    在不等間隔的量測報告上執行切換狀態機，時間窗口與切換間隔以秒表示
+
+    規則與 simulate_handover 相同，只是平均信號取最近 window_seconds 秒內
+    (t - window_seconds, t] 的報告，且距離上次切換至少 min_handover_interval 秒
+    才檢查切換；每個UE的第一筆報告不列入平均。報告間隔固定時，結果與在相同時間點
+    上以對應步數執行 simulate_handover 相同。
+
+    Args:
+        Rxlev: 每筆報告所有基站的信號強度 (N, NUM_STATIONS)，順序與 reports 相同
+        reports: ReportSamples
+        NUM_BS: 合法基站數量
+        handover_threshold: 切換閾值(dB)
+        window_seconds: 平均信號的時間窗口(秒)
+        min_handover_interval: 兩次切換的最小間隔(秒)
+
+    Returns:
+        tuple: serving、handover、labels，形狀皆為 (N,)
+    """
+    num_reports = len(reports)
+    ue, tick, offsets = reports.ue, reports.tick, reports.offsets
+    first = offsets[:-1][ue]
+    end = offsets[1:]
+    window_ticks = seconds_to_steps(window_seconds, reports.T)
+    min_ticks = seconds_to_steps(min_handover_interval, reports.T)
+
+    # 以 UE*M+時間點索引 的整數鍵值在各UE的報告內搜尋，M 大於任何位移後的時間點索引
+    stride = len(reports.T) + max(window_ticks, min_ticks) + 1
+    keys = ue * stride + tick + window_ticks
+
+    # 時間窗口 [lo, i] 的總和由累積和相減求得，lo 不早於該UE的第二筆報告，
+    # 因此第一筆報告不列入平均；平均只在掃描到的報告上計算
+    cumsum = np.zeros((num_reports + 1, Rxlev.shape[1]))
+    np.cumsum(Rxlev, axis=0, out=cumsum[1:])
+    lo = np.maximum(np.searchsorted(keys, keys - window_ticks, side='right'), first + 1)
+    counts = np.maximum(np.arange(num_reports) + 1 - lo, 1)
+
+    num_ue = reports.num_ue
+    has_reports = reports.counts() > 0
+    serving_now = np.zeros(num_ue, dtype=np.int64)
+    serving_now[has_reports] = np.argmax(Rxlev[offsets[:-1][has_reports]], axis=1)
+    new_cell = np.full(num_reports, -1, dtype=np.int64)
+
+    # 每個UE下一筆允許切換的報告索引
+    ue_ids = np.arange(num_ue)
+    next_check = np.searchsorted(keys, ue_ids * stride + tick[np.minimum(offsets[:-1], num_reports - 1)]
+                                 + window_ticks + min_ticks, side='left')
+    next_check = np.maximum(next_check, offsets[:-1] + 1)
+    chunk = SCAN_CHUNK
+    active = ue_ids[has_reports & (next_check < end)]
+
+    while active.size:
+        start = next_check[active]
+        idx = start[:, np.newaxis] + np.arange(chunk)
+        valid = idx < end[active][:, np.newaxis]
+        idx = np.minimum(idx, end[active][:, np.newaxis] - 1)
+        current = serving_now[active]
+
+        avg = (cumsum[idx + 1] - cumsum[lo[idx]]) / counts[idx][:, :, np.newaxis]
+        avg_current = avg[np.arange(active.size), :, current]
+        signal_current = Rxlev[idx, current[:, np.newaxis]]
+
+        qualified = avg >= avg_current[:, :, np.newaxis] + handover_threshold
+        qualified[np.arange(active.size), :, current] = False
+        candidate = np.where(qualified, avg, -np.inf)
+        best = np.argmax(candidate, axis=2)
+        best_signal = np.take_along_axis(candidate, best[:, :, np.newaxis], axis=2)[:, :, 0]
+
+        switch = (best_signal > signal_current) & valid
+        hit = switch.any(axis=1)
+        first_hit = np.argmax(switch, axis=1)
+
+        ue_hit = active[hit]
+        report_hit = start[hit] + first_hit[hit]
+        target = best[hit, first_hit[hit]]
+        new_cell[report_hit] = target
+        serving_now[ue_hit] = target
+        next_check[ue_hit] = np.searchsorted(keys, keys[report_hit] + min_ticks, side='left')
+        next_check[active[~hit]] = start[~hit] + chunk
+
+        # 報告稀疏時切換相隔的報告數少，依命中比例調整每次向前檢查的報告數
+        hit_rate = hit.mean()
+        if hit_rate > 0.5:
+            chunk = max(chunk // 2, MIN_SCAN_CHUNK)
+        elif hit_rate < 0.1:
+            chunk = min(chunk * 2, MAX_SCAN_CHUNK)
+        active = active[next_check[active] < end[active]]
+
+    # 由切換點向後填補服務基站；各UE的起點不早於前一個UE的任何切換點
+    handover = new_cell >= 0
+    filled = np.where(handover, new_cell, 0)
+    starts = offsets[:-1][has_reports]
+    filled[starts] = np.where(handover[starts], new_cell[starts],
+                              np.argmax(Rxlev[starts], axis=1))
+    source = np.where(handover, np.arange(num_reports), first)
+    np.maximum.accumulate(source, out=source)
+    serving = filled[source]
+    return serving, handover, serving >= NUM_BS
+
+def handover_settings(handover_thresholds=(3,), time_windows=(10,), min_times_between_handovers=(20,)):
+    """
+    展開切換參數網格
+
+    Args:
+        handover_thresholds: 切換閾值(dB)列表
+        time_windows: 平均信號的時間窗口(時間步數)列表
+        min_times_between_handovers: 兩次切換的最小間隔(時間步數)列表
+
+    Returns:
+        dict: 每組參數一個元素的 handover_threshold、time_window、min_time_between_handovers 陣列 (P,)
+    """
+    grid = np.meshgrid(np.asarray(handover_thresholds, dtype=float),
+                       np.asarray(time_windows, dtype=np.int64),
+                       np.asarray(min_times_between_handovers, dtype=np.int64), indexing='ij')
+    return {
+        'handover_threshold': grid[0].ravel(),
+        'time_window': grid[1].ravel(),
+        'min_time_between_handovers': grid[2].ravel()
+    }
+
+def handover_margin(Rxlev, window_mean):
+    """
+    每個時間點以各基站為服務基站時，最強的其他基站平均信號高出服務基站平均信號的量
+
+    simulate_handover 的切換條件只與最強的其他基站有關：它的平均信號需高出服務基站
+    平均信號 handover_threshold 以上，且高於服務基站當下的信號。後者與閾值無關，
+    不成立時餘量記為 -inf，因此任何閾值下的切換條件都只需比較一個數值。
+
+    Args:
+        Rxlev: 信號強度 (NUM_UE, T, NUM_STATIONS)
+        window_mean: 平均信號 (NUM_UE, T, NUM_STATIONS)，會被覆寫
+
+    Returns:
+        tuple:
+            - margin: 切換餘量(dB) (NUM_UE, T, NUM_STATIONS)，使用 window_mean 的記憶體
+            - best: 以各基站為服務基站時的切換目標 (NUM_UE, T, NUM_STATIONS)
+    """
+    # 平均信號最強與次強的基站
+    top1 = np.argmax(window_mean, axis=2)[:, :, np.newaxis]
+    top1_value = np.take_along_axis(window_mean, top1, axis=2)
+    np.put_along_axis(window_mean, top1, -np.inf, axis=2)
+    top2 = np.argmax(window_mean, axis=2)[:, :, np.newaxis]
+    top2_value = np.take_along_axis(window_mean, top2, axis=2)
+    np.put_along_axis(window_mean, top1, top1_value, axis=2)
+
+    is_top1 = np.arange(window_mean.shape[2]) == top1
+    best = np.where(is_top1, top2, top1).astype(np.min_scalar_type(window_mean.shape[2] - 1))
+    best_value = np.where(is_top1, top2_value, top1_value)
+    eligible = best_value > Rxlev
+    np.subtract(best_value, window_mean, out=window_mean)
+    window_mean[~eligible] = -np.inf
+    return window_mean, best
+
+def sweep_handover(Rxlev, NUM_BS, handover_thresholds=(3,), time_windows=(10,),
+                   min_times_between_handovers=(20,), return_serving=False):
+    """
+    在同一個信號矩陣上一次評估整個切換參數網格
+
+    平均信號只依時間窗口計算一次，由所有閾值與切換間隔共用；每組參數的每個UE
+    視為一條獨立的搜尋路徑，所有路徑一起以區塊向前搜尋下一個切換點，每個時間點
+    只需比較一個預先計算的切換餘量，不需在各基站間比較。結果與對每組參數分別執行
+    simulate_handover 相同 (除了浮點誤差範圍內恰好等於閾值的情形)。
+
+    Args:
+        Rxlev: 所有基站的信號強度 (NUM_UE, T, NUM_STATIONS)，前 NUM_BS 個為合法基站
+        NUM_BS: 合法基站數量
+        handover_thresholds: 切換閾值(dB)列表
+        time_windows: 平均信號的時間窗口(時間步數)列表
+        min_times_between_handovers: 兩次切換的最小間隔(時間步數)列表
+        return_serving: 是否回傳每組參數的服務基站序列
+
+    Returns:
+        dict: handover_settings 的參數陣列 (P,)，以及
+            - num_handovers: 切換次數 (P,)
+            - rogue_fraction: 連上惡意基站的時間比例 (P,)
+            - rogue_steps: 每個UE連上惡意基站的時間步數 (P, NUM_UE)
+            - first_rogue_step: 每個UE第一次連上惡意基站的時間索引，未連上為-1 (P, NUM_UE)
+            - serving: 服務基站索引 (P, NUM_UE, T) (僅在 return_serving=True 時回傳)
+    """
+    num_ue, num_steps, num_stations = Rxlev.shape
+    settings = handover_settings(handover_thresholds, time_windows, min_times_between_handovers)
+    num_settings = len(settings['time_window'])
+    initial = np.argmax(Rxlev[:, 0, :], axis=1)
+    results = dict(settings,
+                   num_handovers=np.zeros(num_settings, dtype=np.int64),
+                   rogue_steps=np.zeros((num_settings, num_ue), dtype=np.int64),
+                   first_rogue_step=np.full((num_settings, num_ue), -1, dtype=np.int64))
+    if return_serving:
+        results['serving'] = np.empty((num_settings, num_ue, num_steps), dtype=np.min_scalar_type(num_stations - 1))
+
+    for time_window in np.unique(settings['time_window']):
+        members = np.nonzero(settings['time_window'] == time_window)[0]
+        history = np.zeros((num_ue, time_window - 1, num_stations))
+        window_mean, _ = sliding_window_mean(Rxlev, history, 0, time_window)
+        margin, best = handover_margin(Rxlev, window_mean)
+        del window_mean
+        margin, best = margin.ravel(), best.ravel()
+
+        # 每條搜尋路徑對應一組參數與一個UE
+        lane_ue = np.tile(np.arange(num_ue), len(members))
+        threshold = np.repeat(settings['handover_threshold'][members], num_ue)
+        min_time = np.repeat(settings['min_time_between_handovers'][members], num_ue)
+        serving_now = initial[lane_ue]
+        next_check = np.maximum(min_time, 1)
+        offsets = np.arange(SCAN_CHUNK)
+        active = np.nonzero(next_check < num_steps)[0]
+        # 沒有任何路徑進入搜尋時 (時間步數不超過所有切換間隔) 仍需可串接的空陣列
+        event_lane = [np.zeros(0, dtype=np.int64)]
+        event_t = [np.zeros(0, dtype=np.int64)]
+        event_cell = [np.zeros(0, dtype=initial.dtype)]
+
+        while active.size:
+            start = next_check[active]
+            idx = start[:, np.newaxis] + offsets
+            valid = idx < num_steps
+            idx = np.minimum(idx, num_steps - 1)
+            flat = (lane_ue[active][:, np.newaxis] * num_steps + idx) * num_stations \
+                + serving_now[active][:, np.newaxis]
+
+            switch = (margin[flat] >= threshold[active][:, np.newaxis]) & valid
+            hit = switch.any(axis=1)
+            first = np.argmax(switch, axis=1)
+
+            lane_hit = active[hit]
+            t_hit = start[hit] + first[hit]
+            target = best[flat[hit, first[hit]]]
+            event_lane.append(lane_hit)
+            event_t.append(t_hit)
+            event_cell.append(target)
+            serving_now[lane_hit] = target
+            next_check[lane_hit] = t_hit + min_time[lane_hit]
+            next_check[active[~hit]] = start[~hit] + SCAN_CHUNK
+
+            active = active[next_check[active] < num_steps]
+
+        # 每條路徑的服務基站是分段常數：第0個時間點的初始基站加上每次切換
+        num_lanes = len(lane_ue)
+        event_lane = np.concatenate(event_lane)
+        lane = np.concatenate([np.arange(num_lanes), event_lane])
+        t = np.concatenate([np.zeros(num_lanes, dtype=np.int64)] + event_t)
+        cell = np.concatenate([initial[lane_ue]] + event_cell)
+        order = np.argsort(lane * num_steps + t)
+        lane, t, cell = lane[order], t[order], cell[order]
+        last = np.append(lane[1:] != lane[:-1], True)
+        length = np.where(last, num_steps, np.append(t[1:], num_steps)) - t
+
+        rogue = cell >= NUM_BS
+        rogue_steps = np.bincount(lane, weights=length * rogue, minlength=num_lanes).astype(np.int64)
+        first_rogue = np.full(num_lanes, -1, dtype=np.int64)
+        rogue_lane, first_index = np.unique(lane[rogue], return_index=True)
+        first_rogue[rogue_lane] = t[rogue][first_index]
+
+        results['num_handovers'][members] = np.bincount(event_lane // num_ue, minlength=len(members))
+        results['rogue_steps'][members] = rogue_steps.reshape(-1, num_ue)
+        results['first_rogue_step'][members] = first_rogue.reshape(-1, num_ue)
+        if return_serving:
+            results['serving'][members] = np.repeat(cell, length).reshape(len(members), num_ue, num_steps)
+
+    results['rogue_fraction'] = results['rogue_steps'].sum(axis=1) / (num_ue * num_steps)
+    return results
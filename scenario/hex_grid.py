@@ -1,23 +1,101 @@
 import numpy as np
 
+# 六角格軸向座標(axial)中，距離為1的六個鄰居方向，依序為0、60、...、300度
+AXIAL_DIRECTIONS = np.array([(1, 0), (0, 1), (-1, 1), (-1, 0), (0, -1), (1, -1)])
+
 def generate_hex_vertices(center_x, center_y, radius):
     """
-    生成單個六邊形的六個頂點座標。
-    
+    生成六邊形的六個頂點座標，可一次處理多個中心。
+
     Args:
-        center_x (float): 六邊形中心的 X 座標。
-        center_y (float): 六邊形中心的 Y 座標。
+        center_x (float | np.ndarray): 六邊形中心的 X 座標，純量或 (N,)。
+        center_y (float | np.ndarray): 六邊形中心的 Y 座標，純量或 (N,)。
         radius (float): 六邊形外接圓半徑。
-        
+
     Returns:
-        np.ndarray: 六邊形的頂點座標 (6, 2)。
+        np.ndarray: 六邊形的頂點座標，純量中心為 (6, 2)，多個中心為 (N, 6, 2)。
     """
     angles_rad = np.linspace(0, 2 * np.pi, 7)[:-1]
-    vertices = np.array([
-        (center_x + radius * np.cos(angle), center_y + radius * np.sin(angle))
-        for angle in angles_rad
-    ])
-    return vertices
+    x = np.asarray(center_x, dtype=float)[..., np.newaxis] + radius * np.cos(angles_rad)
+    y = np.asarray(center_y, dtype=float)[..., np.newaxis] + radius * np.sin(angles_rad)
+    return np.stack([x, y], axis=-1)
+
+def hex_axial_coords(layers):
+    """
+    生成多層六角格所有格子的軸向座標，順序與 generate_hexagonal_grid 相同：
+    中心格，接著由內而外每一層從0度方向開始逆時針排列。
+
+    Args:
+        layers (int): 層數。
+
+    Returns:
+        np.ndarray: 軸向座標 (1 + 3*layers*(layers+1), 2)。
+    """
+    layer = np.repeat(np.arange(1, layers + 1), 6 * np.arange(1, layers + 1))
+    # 每個格子在所屬層中的序號，拆成邊 (side) 與邊上的位置 (pos)
+    index = np.arange(len(layer)) - 3 * (layer - 1) * layer
+    side, pos = index // layer, index % layer
+
+    ring = layer[:, np.newaxis] * AXIAL_DIRECTIONS[side] - pos[:, np.newaxis] * AXIAL_DIRECTIONS[(side + 1) % 6]
+    return np.concatenate([np.zeros((1, 2), dtype=np.int64), ring])
+
+def axial_to_xy(q, r, center, spacing):
+    """軸向座標轉為平面座標，基底為0度與60度、長度 spacing 的向量"""
+    x = center[0] + spacing * (q + 0.5 * r)
+    y = center[1] + spacing * (np.sqrt(3) / 2) * r
+    return np.stack([x, y], axis=-1)
+
+def axial_round(points, center, spacing):
+    """
+    將平面座標轉為最近的六角格點軸向座標 (cube rounding)
+
+    格點與 generate_hexagonal_grid 相同：相鄰基站距離 spacing，方向為0度與60度。
+
+    Args:
+        points: 座標 (..., 2)
+        center: 格點原點 (2,)
+        spacing: 相鄰格點距離
+
+    Returns:
+        tuple: 整數軸向座標 q, r，形狀皆為 points.shape[:-1]
+    """
+    rel = (np.asarray(points, dtype=float) - center) / spacing
+    # 基底 a1=(1, 0)、a2=(1/2, √3/2) 的反矩陣
+    r = rel[..., 1] * (2 / np.sqrt(3))
+    q = rel[..., 0] - 0.5 * r
+    s = -q - r
+
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return rq.astype(np.int64), rr.astype(np.int64)
+
+class AxialTable:
+    """
+    軸向座標到索引的二維查表，HexGrid 的格子與 HexStationIndex 的基站共用
+
+    表格涵蓋登錄座標的範圍，查詢時範圍外或沒有登錄的座標皆為 -1。
+    """
+    def __init__(self, q, r):
+        """
+        Args:
+            q: 登錄的軸向座標 q (N,)
+            r: 登錄的軸向座標 r (N,)，第i個座標對應索引 i
+        """
+        q, r = np.asarray(q, dtype=np.int64), np.asarray(r, dtype=np.int64)
+        self.q_min, self.r_min = q.min(), r.min()
+        self.table = np.full((q.max() - self.q_min + 1, r.max() - self.r_min + 1), -1, dtype=np.int64)
+        self.table[q - self.q_min, r - self.r_min] = np.arange(len(q))
+
+    def lookup(self, q, r):
+        """查表取得軸向座標上的索引，沒有登錄為 -1"""
+        qi, ri = q - self.q_min, r - self.r_min
+        inside = (qi >= 0) & (qi < self.table.shape[0]) & (ri >= 0) & (ri < self.table.shape[1])
+        found = self.table[np.clip(qi, 0, self.table.shape[0] - 1), np.clip(ri, 0, self.table.shape[1] - 1)]
+        return np.where(inside, found, -1)
 
 def generate_hexagonal_grid(center_x, center_y, radius, layers):
     """
@@ -28,31 +106,75 @@ def generate_hexagonal_grid(center_x, center_y, radius, layers):
         center_y (float): 網格中心基站的 Y 座標。
         radius (float): 每個六邊形的半徑。
         layers (int): 包含的六邊形層數。
-        
+
     Returns:
         tuple:
             - np.ndarray: 所有基站中心座標 (N, 2)。
-            - list[np.ndarray]: 每個基站對應的六邊形頂點座標。
+            - np.ndarray: 每個基站對應的六邊形頂點座標 (N, 6, 2)。
     """
-    positions = [(center_x, center_y)] 
-    cell_vertices = [generate_hex_vertices(center_x, center_y, radius)] 
+    grid = HexGrid(center_x, center_y, radius, layers)
+    return grid.centers, grid.vertices
+
+class HexGrid:
+    """
+    以軸向座標表示的多層六角格
+
+    格子中心與頂點皆為連續的 NumPy 陣列；locate() 以 cube rounding 加上查表，
+    每個位置 O(1) 找出所在格子(最近的格子中心)，可一次處理數百萬個位置。
+    """
+    def __init__(self, center_x, center_y, radius, layers):
+        """
+        Args:
+            center_x (float): 網格中心的 X 座標。
+            center_y (float): 網格中心的 Y 座標。
+            radius (float): 每個六邊形的半徑，相鄰格子中心距離為 radius*√3。
+            layers (int): 層數。
+        """
+        self.center = np.array([center_x, center_y], dtype=float)
+        self.radius = radius
+        self.spacing = radius * np.sqrt(3)
+        self.layers = layers
+
+        self.axial = hex_axial_coords(layers)
+        self.centers = axial_to_xy(self.axial[:, 0], self.axial[:, 1], self.center, self.spacing)
+        self.vertices = generate_hex_vertices(self.centers[:, 0], self.centers[:, 1], radius)
+
+        # 以二維表直接查格子索引
+        self.table = AxialTable(self.axial[:, 0], self.axial[:, 1])
+
+    def __len__(self):
+        return len(self.axial)
+
+    def locate(self, points):
+        """
+        找出每個位置所在的格子
 
-    for layer in range(1, layers + 1):
-        for side in range(6): 
-            angle_deg = 60 * side
-            angle_rad = np.deg2rad(angle_deg)
+        Args:
+            points: 位置 (..., 2)
 
-            start_x = center_x + layer * radius * np.sqrt(3) * np.cos(angle_rad)
-            start_y = center_y + layer * radius * np.sqrt(3) * np.sin(angle_rad)
-            
-            for pos in range(layer):
-                dx = radius * np.sqrt(3) * np.cos(angle_rad + np.pi / 3)
-                dy = radius * np.sqrt(3) * np.sin(angle_rad + np.pi / 3)
+        Returns:
+            np.ndarray: 格子索引 (...)，在所有層之外的位置為 -1
+        """
+        q, r = axial_round(points, self.center, self.spacing)
+        return self.table.lookup(q, r)
 
-                bs_x = start_x - pos * dx
-                bs_y = start_y - pos * dy
+    def edge_distance(self, points):
+        """
+        找出每個位置所在的格子及其到格子邊界的距離，用於細胞邊緣分析
 
-                positions.append((bs_x, bs_y))
-                cell_vertices.append(generate_hex_vertices(bs_x, bs_y, radius))
+        Args:
+            points: 位置 (..., 2)
 
-    return np.array(positions), cell_vertices
\ No newline at end of file
+        Returns:
+            tuple:
+                - np.ndarray: 格子索引 (...)，所有層之外為 -1
+                - np.ndarray: 到邊界的距離(m) (...)，0 表示位於兩格交界
+        """
+        points = np.asarray(points, dtype=float)
+        cells = self.locate(points)
+        q, r = axial_round(points, self.center, self.spacing)
+        rel = points - axial_to_xy(q, r, self.center, self.spacing)
+        # 邊界與0、60、120度方向垂直，邊心距為 spacing/2
+        angles = np.deg2rad([0, 60, 120])
+        projection = np.abs(rel[..., 0, np.newaxis] * np.cos(angles) + rel[..., 1, np.newaxis] * np.sin(angles))
+        return cells, self.spacing / 2 - projection.max(axis=-1)
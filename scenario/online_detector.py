@@ -0,0 +1,124 @@
+import numpy as np
+
+class OnlineHandoverDetector:
+    """
+    逐筆量測報告更新的切換與惡意基站偵測器
+
+    每個UE只保存固定大小的狀態：time_window 個時間點的環形緩衝區與其總和、
+    服務基站、上次切換時間與已收到的樣本數，每筆樣本的更新成本與序列長度無關。
+    切換規則與 simulate_handover 相同(第0個時間點不列入平均)，在樣本到達的
+    同一個時間點就做出決策，因此與離線結果一致且沒有額外延遲。
+    """
+    def __init__(self, num_ue, NUM_BS, num_stations, handover_threshold=3, time_window=10,
+                 min_time_between_handovers=20, on_event=None):
+        """
+        Args:
+            num_ue: UE數量
+            NUM_BS: 合法基站數量，索引大於等於 NUM_BS 的基站視為惡意基站
+            num_stations: 所有基站數量
+            handover_threshold: 切換閾值(dB)
+            time_window: 平均信號的時間窗口(時間步數)
+            min_time_between_handovers: 兩次切換的最小間隔(時間步數)
+            on_event: 事件回呼函數，參數為事件字典
+                {'type': 'handover' 或 'rogue', 'ue', 't', 'from', 'to'}
+        """
+        self.num_bs = NUM_BS
+        self.handover_threshold = handover_threshold
+        self.time_window = time_window
+        self.min_time_between_handovers = min_time_between_handovers
+        self.on_event = on_event
+
+        self.buffer = np.zeros((num_ue, time_window, num_stations))
+        self.window_sum = np.zeros((num_ue, num_stations))
+        self.serving = np.zeros(num_ue, dtype=np.int64)
+        self.last_handover = np.zeros(num_ue, dtype=np.int64)
+        self.t = np.zeros(num_ue, dtype=np.int64)
+
+    def update(self, ue_ids, signals):
+        """
+        處理一批UE各自的下一筆樣本
+
+        Args:
+            ue_ids: UE編號 (U,)，同一批內不可重複
+            signals: 這些UE所有基站的信號強度 (U, NUM_STATIONS)
+
+        Returns:
+            tuple:
+                - serving: 服務基站索引 (U,)
+                - handover: 是否在此樣本切換 (U,)
+                - labels: 服務基站是否為惡意基站 (U,)
+        """
+        ue_ids = np.asarray(ue_ids)
+        if len(np.unique(ue_ids)) != len(ue_ids):
+            # 重複的UE會讓緩衝區與計數器的索引寫入互相覆蓋
+            raise ValueError("同一批次內 ue_ids 不可重複，同一UE的多筆樣本需分批依序處理")
+        signals = np.asarray(signals, dtype=float)
+        t = self.t[ue_ids]
+        handover = np.zeros(len(ue_ids), dtype=bool)
+
+        # 第一筆樣本：選擇信號最強的基站，不列入平均
+        first = t == 0
+        if first.any():
+            self.serving[ue_ids[first]] = np.argmax(signals[first], axis=1)
+
+        # 更新環形緩衝區與視窗總和
+        slot = t % self.time_window
+        stored = np.where(first[:, np.newaxis], 0.0, signals)
+        self.window_sum[ue_ids] += stored - self.buffer[ue_ids, slot]
+        self.buffer[ue_ids, slot] = stored
+
+        check = ~first & (t >= self.last_handover[ue_ids] + self.min_time_between_handovers)
+        if check.any():
+            ues = ue_ids[check]
+            rows = np.arange(len(ues))
+            current = self.serving[ues]
+            mean = self.window_sum[ues] / np.minimum(t[check], self.time_window)[:, np.newaxis]
+
+            qualified = mean >= mean[rows, current][:, np.newaxis] + self.handover_threshold
+            qualified[rows, current] = False
+            candidate = np.where(qualified, mean, -np.inf)
+            best = np.argmax(candidate, axis=1)
+            switch = candidate[rows, best] > signals[check][rows, current]
+
+            if switch.any():
+                switched = ues[switch]
+                self.serving[switched] = best[switch]
+                self.last_handover[switched] = t[check][switch]
+                handover[np.nonzero(check)[0][switch]] = True
+                if self.on_event is not None:
+                    self._emit(switched, t[check][switch], current[switch], best[switch])
+
+        if self.on_event is not None and first.any():
+            initial = ue_ids[first]
+            rogue = self.serving[initial] >= self.num_bs
+            for ue in initial[rogue]:
+                self.on_event({'type': 'rogue', 'ue': int(ue), 't': 0, 'from': None, 'to': int(self.serving[ue])})
+
+        self.t[ue_ids] = t + 1
+        serving = self.serving[ue_ids]
+        return serving, handover, serving >= self.num_bs
+
+    def _emit(self, ues, times, sources, targets):
+        for ue, t, source, target in zip(ues, times, sources, targets):
+            event = {'type': 'handover', 'ue': int(ue), 't': int(t), 'from': int(source), 'to': int(target)}
+            self.on_event(event)
+            if target >= self.num_bs:
+                self.on_event(dict(event, type='rogue'))
+
+    def update_block(self, ue_ids, Rxlev):
+        """
+        依時間順序處理一批UE的多筆樣本
+
+        Args:
+            ue_ids: UE編號 (U,)
+            Rxlev: 信號強度 (U, B, NUM_STATIONS)
+
+        Returns:
+            tuple: serving、handover、labels，形狀皆為 (U, B)
+        """
+        num_steps = Rxlev.shape[1]
+        serving = np.empty((len(ue_ids), num_steps), dtype=np.int64)
+        handover = np.empty((len(ue_ids), num_steps), dtype=bool)
+        for step in range(num_steps):
+            serving[:, step], handover[:, step], _ = self.update(ue_ids, Rxlev[:, step])
+        return serving, handover, serving >= self.num_bs
@@ -0,0 +1,149 @@
+import hashlib
+import os
+
+import numpy as np
+
+from scenario.signal_calculation import draw_uniform_fading_dB
+
+def radio_map_key(stations, map_size, resolution, ue_height=1, dtype=np.float32):
+    """
+    以基站位置、高度、鏈路預算(發射功率、增益、頻率)與柵格參數計算快取鍵值
+
+    Returns:
+        str: 十六進位雜湊字串
+    """
+    digest = hashlib.sha1()
+    for array in (stations.x, stations.y, stations.height, stations.link_budget_dB):
+        digest.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+    digest.update(repr((float(map_size), float(resolution), float(ue_height),
+                        np.dtype(dtype).str)).encode('utf-8'))
+    return digest.hexdigest()[:20]
+
+def grid_axis(map_size, resolution):
+    """柵格節點座標，從0到map_size(包含)"""
+    num_nodes = int(np.ceil(map_size / resolution)) + 1
+    return np.arange(num_nodes) * resolution
+
+def build_radio_map(stations, map_size, resolution, ue_height=1, cache_dir='result/radio_map_cache',
+                    dtype=np.float32, rows_per_block=64):
+    """
+    建立或讀取無衰落的接收信號強度柵格圖 (radio map)
+
+    每個柵格節點存放所有基站的確定性接收功率 (Friis，不含衰落)，以記憶體映射的
+    .npy 檔快取；拓撲與參數不變時重複執行直接讀取快取，不需重新計算距離。
+
+    Args:
+        stations: StationTable 基站資料表
+        map_size: 地圖大小
+        resolution: 柵格解析度(m)
+        ue_height: UE高度(m)
+        cache_dir: 快取目錄，None表示不寫入快取，只在記憶體中計算
+        dtype: 儲存型別
+        rows_per_block: 每次計算的柵格列數
+
+    Returns:
+        np.ndarray: 接收信號強度柵格 (ny, nx, NUM_STATIONS)，有快取時為唯讀memmap
+    """
+    axis = grid_axis(map_size, resolution)
+    shape = (len(axis), len(axis), len(stations))
+
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, f'radio_map_{radio_map_key(stations, map_size, resolution, ue_height, dtype)}.npy')
+        if os.path.exists(path):
+            return np.load(path, mmap_mode='r')
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = path + '.tmp.npy'
+        radio_map = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype, shape=shape)
+    else:
+        radio_map = np.empty(shape, dtype=dtype)
+
+    height_diff2 = (stations.height - ue_height)**2
+    for start in range(0, len(axis), rows_per_block):
+        y = axis[start:start + rows_per_block, np.newaxis, np.newaxis]
+        x = axis[np.newaxis, :, np.newaxis]
+        d2 = (x - stations.x)**2 + (y - stations.y)**2 + height_diff2
+        radio_map[start:start + rows_per_block] = stations.link_budget_dB - 10 * np.log10(d2)
+
+    if cache_dir is None:
+        return radio_map
+    radio_map.flush()
+    del radio_map
+    os.replace(tmp_path, path)
+    return np.load(path, mmap_mode='r')
+
+def lookup_radio_map(radio_map, ue_positions, resolution, station_index=None, dtype=np.float32,
+                     interpolation='bilinear'):
+    """
+    從柵格圖查詢每個UE位置的確定性接收信號強度
+
+    'bilinear' 取周圍四個節點內插；'nearest' 只取最近節點，每個位置只需一次取值，
+    誤差由柵格解析度決定。
+
+    Args:
+        radio_map: 接收信號強度柵格 (ny, nx, NUM_STATIONS)
+        ue_positions: UE位置序列 (NUM_UE, T, 2)
+        resolution: 柵格解析度(m)
+        station_index: 只查詢部分基站時的索引，None表示全部
+        dtype: 輸出型別
+        interpolation: 'bilinear' 或 'nearest'
+
+    Returns:
+        信號強度矩陣 (NUM_UE, T, NUM_STATIONS)
+    """
+    if interpolation not in ('bilinear', 'nearest'):
+        raise ValueError(f"interpolation 必須是 'bilinear' 或 'nearest'，收到 {interpolation!r}")
+    num_nodes = radio_map.shape[0]
+    gx = np.clip(ue_positions[..., 0] / resolution, 0, num_nodes - 1)
+    gy = np.clip(ue_positions[..., 1] / resolution, 0, num_nodes - 1)
+    ix = np.minimum(gx.astype(np.int64), num_nodes - 2)
+    iy = np.minimum(gy.astype(np.int64), num_nodes - 2)
+    fx = (gx - ix).astype(dtype).reshape(-1, 1)
+    fy = (gy - iy).astype(dtype).reshape(-1, 1)
+
+    # 攤平成 (節點數, 基站數)，每個角點只需一次整列取值
+    flat_map = radio_map.reshape(num_nodes * num_nodes, -1)
+    node = (iy * num_nodes + ix).ravel()
+
+    def corner(offset):
+        values = flat_map[node + offset]
+        if station_index is not None:
+            values = values[:, station_index]
+        return values.astype(dtype, copy=False)
+
+    if interpolation == 'nearest':
+        offset = (fx[:, 0] >= 0.5) + (fy[:, 0] >= 0.5) * num_nodes
+        values = flat_map[node + offset]
+        if station_index is not None:
+            values = values[:, station_index]
+        return values.astype(dtype).reshape(ue_positions.shape[:-1] + (values.shape[-1],))
+
+    Rxlev = corner(0) * ((1 - fx) * (1 - fy))
+    Rxlev += corner(1) * (fx * (1 - fy))
+    Rxlev += corner(num_nodes) * ((1 - fx) * fy)
+    Rxlev += corner(num_nodes + 1) * (fx * fy)
+    return Rxlev.reshape(ue_positions.shape[:-1] + (Rxlev.shape[-1],))
+
+def calculate_Rxlev_radio_map(radio_map, ue_positions, resolution, rng=None, dtype=np.float32, station_index=None,
+                              interpolation='bilinear', fading=None):
+    """
+    使用柵格圖計算接收信號強度：確定性部分查表，再疊加衰落量
+
+    Args:
+        radio_map: build_radio_map 建立的柵格圖
+        ue_positions: UE位置序列 (NUM_UE, T, 2)
+        resolution: 柵格解析度(m)
+        rng: 隨機數產生器，None時使用全域np.random狀態
+        dtype: 輸出型別
+        station_index: 只計算部分基站時的索引，None表示全部
+        interpolation: 'bilinear' 或 'nearest'
+        fading: scenario.fading 的衰落模型，None表示均勻衰落 10log10(x_t)
+
+    Returns:
+        信號強度矩陣 (NUM_UE, T, NUM_STATIONS)
+    """
+    Rxlev = lookup_radio_map(radio_map, ue_positions, resolution, station_index, dtype, interpolation)
+    if fading is None:
+        Rxlev += draw_uniform_fading_dB(Rxlev.shape, rng, dtype)
+    else:
+        fading.add_dB(Rxlev, ue_positions, rng)
+    return Rxlev
@@ -0,0 +1,226 @@
+import numpy as np
+
+from scenario.hex_grid import AXIAL_DIRECTIONS, axial_round, axial_to_xy
+
+def seconds_to_steps(seconds, T):
+    """
+    將秒數換算為時間序列 T 的時間步數 (至少1步)
+
+    Args:
+        seconds: 秒數
+        T: 等間隔時間序列
+
+    Returns:
+        int: 時間步數
+    """
+    timestep = (T[-1] - T[0]) / (len(T) - 1)
+    return max(int(round(seconds / timestep)), 1)
+
+def periodic_report_ticks(T, interval):
+    """
+    週期性量測報告對應的時間點索引：由 T[0] 起每 interval 秒一次，對齊到 T 上
+
+    Args:
+        T: 等間隔時間序列 (移動模型使用的時間格點)
+        interval: 量測報告週期(秒)
+
+    Returns:
+        np.ndarray: 時間點索引 (B,)
+    """
+    return np.arange(0, len(T), seconds_to_steps(interval, T))
+
+class ReportSamples:
+    """
+    每個UE各自的量測報告時間點，以扁平陣列儲存 (依UE、再依時間排序)
+
+    所有UE的報告時間相同時 (只有週期性報告)，可以 as_grid() 轉為 (NUM_UE, B)
+    的矩形陣列，直接使用既有的矩形流程。
+    """
+    def __init__(self, T, ue, tick, num_ue):
+        """
+        Args:
+            T: 移動模型使用的時間格點
+            ue: 每筆報告的UE編號 (N,)
+            tick: 每筆報告在 T 上的時間點索引 (N,)
+            num_ue: UE數量
+        """
+        self.T = np.asarray(T)
+        self.ue = np.asarray(ue, dtype=np.int64)
+        self.tick = np.asarray(tick, dtype=np.int64)
+        self.t = self.T[self.tick]
+        self.num_ue = num_ue
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(self.ue, minlength=num_ue))])
+
+    def __len__(self):
+        return len(self.ue)
+
+    def counts(self):
+        """每個UE的報告數量 (NUM_UE,)"""
+        return np.diff(self.offsets)
+
+    def is_grid(self):
+        """所有UE的報告時間點是否相同"""
+        counts = self.counts()
+        if not len(self) or np.any(counts != counts[0]):
+            return False
+        ticks = self.tick.reshape(self.num_ue, -1)
+        return bool(np.all(ticks == ticks[0]))
+
+    def as_grid(self):
+        """所有UE共用的報告時間點索引 (B,)；時間點不同時引發 ValueError"""
+        if not self.is_grid():
+            raise ValueError("各UE的報告時間點不同，無法轉為矩形陣列")
+        return self.tick[:self.offsets[1]]
+
+    def padded_index(self):
+        """
+        將扁平報告排成 (NUM_UE, W) 的矩形索引，W 為最多的報告數量
+
+        不足的位置重複該UE最後一筆報告，沿軌跡的移動距離為0，
+        讓需要逐UE時間序列的計算 (例如相關衰落) 可以直接使用矩形陣列。
+
+        Returns:
+            tuple: (扁平索引 (NUM_UE, W)，每筆報告在所屬列中的位置 (N,))
+        """
+        counts = self.counts()
+        width = counts.max() if len(self) else 0
+        columns = np.minimum(np.arange(width), np.maximum(counts, 1)[:, np.newaxis] - 1)
+        index = np.minimum(self.offsets[:-1, np.newaxis] + columns, max(len(self) - 1, 0))
+        return index, np.arange(len(self)) - self.offsets[self.ue]
+
+def cell_crossing_times(legs, speed, index):
+    """
+    每段路徑跨越合法基站六角格邊界的時間，即依路徑損耗最強的合法基站改變之處
+
+    由起點所在的格子沿直線前進，每次求出離開目前六邊形的邊與距離，再移到該邊相鄰的
+    格子；迴圈次數為單一路段最多跨越的格子數，與時間格點數無關。只回報兩側都有基站的邊界。
+
+    Args:
+        legs: generate_waypoint_legs 的回傳值
+        speed: 移動速度
+        index: HexStationIndex，合法基站位於六角格點上
+
+    Returns:
+        tuple: 每次跨越的UE編號 (E,) 與時間 (E,)
+    """
+    origins, waypoints, move_starts, _ = legs
+    num_legs = move_starts.shape[1]
+    origin = origins.reshape(-1, 2)
+    direction = waypoints.reshape(-1, 2) - origin
+    length = np.linalg.norm(direction, axis=1)
+    unit = np.divide(direction, length[:, np.newaxis], out=np.zeros_like(direction),
+                     where=length[:, np.newaxis] > 0)
+    # 六個邊的法向量與相鄰格子方向相同 (0、60、...、300度)，邊心距為 spacing/2
+    angles = np.deg2rad(np.arange(0, 360, 60))
+    normals = np.column_stack([np.cos(angles), np.sin(angles)])
+    approach = unit @ normals.T
+
+    leg = np.flatnonzero(np.isfinite(move_starts.ravel()) & (length > 0))
+    q, r = axial_round(origin[leg], index.center, index.spacing)
+    travelled = np.zeros(len(leg))
+    crossing_leg, crossing_distance = [], []
+    while len(leg):
+        offset = origin[leg] + unit[leg] * travelled[:, np.newaxis] - axial_to_xy(q, r, index.center, index.spacing)
+        toward = approach[leg] > 0
+        exit_distance = np.full(toward.shape, np.inf)
+        exit_distance[toward] = (index.spacing / 2 - (offset @ normals.T)[toward]) / approach[leg][toward]
+        side = np.argmin(exit_distance, axis=1)
+        travelled = travelled + np.maximum(exit_distance[np.arange(len(leg)), side], 0)
+        next_q, next_r = q + AXIAL_DIRECTIONS[side, 0], r + AXIAL_DIRECTIONS[side, 1]
+
+        moving = travelled < length[leg]
+        crossed = moving & (index.table.lookup(q, r) >= 0) & (index.table.lookup(next_q, next_r) >= 0)
+        crossing_leg.append(leg[crossed])
+        crossing_distance.append(travelled[crossed])
+        leg, q, r, travelled = leg[moving], next_q[moving], next_r[moving], travelled[moving]
+
+    crossing_leg = np.concatenate(crossing_leg) if crossing_leg else np.zeros(0, dtype=np.int64)
+    crossing_distance = np.concatenate(crossing_distance) if crossing_distance else np.zeros(0)
+    return crossing_leg // num_legs, move_starts.ravel()[crossing_leg] + crossing_distance / speed
+
+def build_report_samples(legs, T, interval, on_waypoint=False, report_distance=None, speed=None,
+                         cell_index=None):
+    """
+    建立量測報告時間點：週期性報告，加上選擇性的事件觸發報告
+
+    事件觸發的報告時間與移動模型相同，對齊到 T 上第一個不早於事件的時間點。
+
+    Args:
+        legs: generate_waypoint_legs 的回傳值 (origins, waypoints, move_starts, arrivals)
+        T: 移動模型使用的時間格點
+        interval: 週期性報告間隔(秒)，None表示不產生週期性報告(只保留第一個時間點)
+        on_waypoint: 是否在抵達路徑點與暫停結束出發時各回報一次
+        report_distance: 移動中每前進此距離(m)回報一次，None表示不使用
+        speed: 移動速度，report_distance 與 cell_index 需要
+        cell_index: HexStationIndex，指定時在跨越合法基站六角格邊界 (兩個基站路徑損耗
+            相等的門檻) 時回報一次，見 cell_crossing_times；None表示不使用
+
+    Returns:
+        ReportSamples
+    """
+    origins, waypoints, move_starts, arrivals = legs
+    num_ue, num_legs = move_starts.shape
+    periodic = periodic_report_ticks(T, interval) if interval is not None else np.zeros(1, dtype=np.int64)
+    ue = [np.repeat(np.arange(num_ue), len(periodic))]
+    ticks = [np.tile(periodic, num_ue)]
+
+    event_ue, event_times = [], []
+    if on_waypoint:
+        event_ue += [np.repeat(np.arange(num_ue), num_legs)] * 2
+        event_times += [arrivals.ravel(), move_starts.ravel()]
+    if report_distance is not None:
+        # 每段路徑上等距的回報點：第 k 個點位於出發後 k*report_distance/speed 秒
+        distance = np.linalg.norm(waypoints - origins, axis=2).ravel()
+        num_points = np.floor(distance / report_distance).astype(np.int64)
+        leg = np.repeat(np.arange(num_ue * num_legs), num_points)
+        k = np.arange(num_points.sum()) - np.repeat(np.cumsum(num_points) - num_points, num_points) + 1
+        event_ue.append(leg // num_legs)
+        event_times.append(move_starts.ravel()[leg] + k * report_distance / speed)
+    if cell_index is not None:
+        crossing_ue, crossing_times = cell_crossing_times(legs, speed, cell_index)
+        event_ue.append(crossing_ue)
+        event_times.append(crossing_times)
+
+    for event_u, times in zip(event_ue, event_times):
+        inside = np.isfinite(times) & (times <= T[-1])
+        ue.append(event_u[inside])
+        ticks.append(np.searchsorted(T, times[inside], side='left'))
+
+    # 以整數鍵值排序並去除重複的報告時間點
+    keys = np.concatenate(ue) * len(T) + np.concatenate(ticks)
+    if len(ue) > 1:
+        keys.sort()
+        keys = keys[np.concatenate([[True], keys[1:] != keys[:-1]])]
+    return ReportSamples(T, keys // len(T), keys % len(T), num_ue)
+
+def positions_at(legs, speed, T, ue, tick):
+    """
+    計算指定UE在指定時間點的位置，與 interpolate_legs 在相同時間點的結果相同
+
+    Args:
+        legs: generate_waypoint_legs 的回傳值
+        speed: 移動速度
+        T: 時間格點
+        ue: UE編號 (N,)
+        tick: 在 T 上的時間點索引 (N,)
+
+    Returns:
+        np.ndarray: 位置 (N, 2)
+    """
+    origins, waypoints, move_starts, _ = legs
+    num_ue, num_legs = move_starts.shape
+    # 與 interpolate_legs 相同，每段路徑從第一個不早於出發時間的時間點開始生效
+    first_tick = np.searchsorted(T, move_starts, side='left')
+    first_tick[:, 0] = 0
+    stride = len(T) + 1
+    leg_keys = (np.arange(num_ue)[:, np.newaxis] * stride + first_tick).ravel()
+    leg = np.searchsorted(leg_keys, ue * stride + tick, side='right') - 1
+
+    t = T[tick]
+    origin = origins.reshape(-1, 2)[leg]
+    direction = waypoints.reshape(-1, 2)[leg] - origin
+    distance = np.linalg.norm(direction, axis=1)
+    unit = np.divide(direction, distance[:, np.newaxis], out=np.zeros_like(direction),
+                     where=distance[:, np.newaxis] > 0)
+    travelled = np.clip(speed * (t - move_starts.ravel()[leg]), 0, distance)
+    return origin + unit * travelled[:, np.newaxis]
@@ -1,6 +1,103 @@
 import numpy as np
+from scenario.stations import StationTable
 
-def calculate_Rxlev_bs(Pt_dBm, Gt_dBi, Gr_dBi, station_coords, ue_positions, wavelength):
+def draw_uniform_fading(shape, rng=None, dtype=np.float64):
+    """
+    產生均勻分布 U(0, 2) 的衰落係數
+
+    Args:
+        shape: 輸出形狀
+        rng: 隨機數產生器，None時使用全域np.random狀態
+        dtype: 輸出型別
+
+    Returns:
+        衰落係數矩陣
+    """
+    if rng is None:
+        return np.random.uniform(0, 2, size=shape).astype(dtype, copy=False)
+    # 使用 (0, 1] 避免 float32 抽到0造成 log10(0)
+    fading = rng.random(size=shape, dtype=dtype)
+    np.subtract(1, fading, out=fading)
+    fading *= 2
+    return fading
+
+# 候選集合中補位欄位的信號強度 (dBm)，遠低於任何實際信號
+PAD_RXLEV = -300.0
+
+def draw_uniform_fading_dB(shape, rng=None, dtype=np.float64):
+    """
+    產生均勻衰落的dB值 10log10(x_t)，x_t ~ U(0, 2)
+
+    Args:
+        shape: 輸出形狀
+        rng: 隨機數產生器，None時使用全域np.random狀態
+        dtype: 輸出型別
+
+    Returns:
+        衰落量矩陣 (dB)
+    """
+    fading = draw_uniform_fading(shape, rng, dtype)
+    np.log10(fading, out=fading)
+    fading *= 10
+    return fading
+
+def calculate_Rxlev(stations, ue_positions, ue_height=1, rng=None, dtype=np.float64, station_ids=None, fading=None):
+    """
+    單一批次計算所有基站(合法與惡意)的接收信號強度，使用Friis方程，考慮3D距離
+
+    Rxlev = 鏈路預算常數 - 10log10(d^2) + 10log10(x_t)，
+    鏈路預算常數已在基站資料表中以dB預先算好，不需開根號。
+
+    Args:
+        stations: StationTable 基站資料表
+        ue_positions: UE位置序列 (NUM_UE, T, 2)
+        ue_height: UE高度(m)
+        rng: 隨機數產生器，None時使用全域np.random狀態
+        dtype: 輸出型別，例如 np.float32
+        station_ids: 每個UE的候選基站索引 (NUM_UE, M)，-1為補位；
+            指定時只計算候選基站，輸出為 (NUM_UE, T, M)
+        fading: scenario.fading 的衰落模型，None表示原本的均勻衰落 x_t ~ U(0, 2)
+
+    Returns:
+        信號強度矩陣 (NUM_UE, T, NUM_STATIONS)
+    """
+    ue_x = np.asarray(ue_positions[..., 0], dtype=dtype)[..., np.newaxis]
+    ue_y = np.asarray(ue_positions[..., 1], dtype=dtype)[..., np.newaxis]
+
+    if station_ids is None:
+        station_x, station_y = stations.x, stations.y
+        height_diff, link_budget = stations.height - ue_height, stations.link_budget_dB
+    else:
+        # 每個UE各自的候選基站參數 (NUM_UE, 1, M)，沿時間軸廣播
+        ids = np.maximum(station_ids, 0)[:, np.newaxis, :]
+        station_x, station_y = stations.x[ids], stations.y[ids]
+        height_diff, link_budget = stations.height[ids] - ue_height, stations.link_budget_dB[ids]
+
+    # 距離平方 (3D)
+    Rxlev = np.square(ue_x - station_x.astype(dtype))
+    Rxlev += np.square(ue_y - station_y.astype(dtype))
+    Rxlev += np.square(height_diff).astype(dtype)
+
+    if fading is None:
+        # 10log10(x_t / d^2) + 常數
+        x_t = draw_uniform_fading(Rxlev.shape, rng, dtype)
+        np.divide(x_t, Rxlev, out=Rxlev)
+        del x_t
+        np.log10(Rxlev, out=Rxlev)
+        Rxlev *= 10
+        Rxlev += link_budget.astype(dtype)
+    else:
+        # 常數 - 10log10(d^2)，再由衰落模型加上衰落量(dB)
+        np.log10(Rxlev, out=Rxlev)
+        Rxlev *= -10
+        Rxlev += link_budget.astype(dtype)
+        fading.add_dB(Rxlev, ue_positions, rng)
+
+    if station_ids is not None:
+        np.copyto(Rxlev, PAD_RXLEV, where=(station_ids < 0)[:, np.newaxis, :])
+    return Rxlev
+
+def calculate_Rxlev_bs(Pt_dBm, Gt_dBi, Gr_dBi, station_coords, ue_positions, wavelength, rng=None, dtype=np.float64):
     """
     計算接收信號強度，使用Friis方程，考慮3D距離
     
@@ -11,32 +108,18 @@ def calculate_Rxlev_bs(Pt_dBm, Gt_dBi, Gr_dBi, station_coords, ue_positions, wav
         station_coords: 基站座標 
         ue_positions: UE位置序列
         wavelength: 波長
+        rng: 隨機數產生器，None時使用全域np.random狀態
+        dtype: 輸出型別
         
     Returns:
         信號強度矩陣
     """
     BS_HEIGHT = 6  # 基站高度6m
-    UE_HEIGHT = 1  # UE高度1m
-
-    ue_positions_reshaped = ue_positions[:, :, np.newaxis, :]
-    station_coords_reshaped = station_coords[np.newaxis, np.newaxis, :, :]
-    
-    distances_2d = np.sqrt(((ue_positions_reshaped - station_coords_reshaped)**2).sum(axis=3))
-    height_diff = BS_HEIGHT - UE_HEIGHT
-    distances_3d = np.sqrt(distances_2d**2 + height_diff**2)
-    
-    Pt = 10**(Pt_dBm/10) / 1000
-    Gt = 10**(Gt_dBi/10)
-    Gr = 10**(Gr_dBi/10)
-    
-    # 計算接收功率
-    Pr = (Pt * Gt * Gr * wavelength**2) / ((4 * np.pi * distances_3d)**2)
-    x_t = np.random.uniform(0, 2, size=distances_3d.shape)
-    Rxlev = 10 * np.log10(Pr * x_t) + 30
-    
-    return Rxlev
+    stations = StationTable(station_coords[:, 0], station_coords[:, 1], BS_HEIGHT,
+                            Pt_dBm, Gt_dBi, Gr_dBi, False, wavelength)
+    return calculate_Rxlev(stations, ue_positions, rng=rng, dtype=dtype)
 
-def calculate_Rxlev_rbs(Pt_dBm, Gt_dBi, Gr_dBi, station_coords, ue_positions, wavelength):
+def calculate_Rxlev_rbs(Pt_dBm, Gt_dBi, Gr_dBi, station_coords, ue_positions, wavelength, rng=None, dtype=np.float64):
     """
     計算接收信號強度，使用Friis方程，考慮3D距離
     
@@ -47,27 +130,41 @@ def calculate_Rxlev_rbs(Pt_dBm, Gt_dBi, Gr_dBi, station_coords, ue_positions, wa
         station_coords: 基站座標 
         ue_positions: UE位置序列
         wavelength: 波長
+        rng: 隨機數產生器，None時使用全域np.random狀態
+        dtype: 輸出型別
         
     Returns:
         信號強度矩陣
     """
-    BS_HEIGHT = 1.5  # 基站高度6m
-    UE_HEIGHT = 1  # UE高度1m
+    BS_HEIGHT = 1.5  # 惡意基站高度1.5m
+    stations = StationTable(station_coords[:, 0], station_coords[:, 1], BS_HEIGHT,
+                            Pt_dBm, Gt_dBi, Gr_dBi, True, wavelength)
+    return calculate_Rxlev(stations, ue_positions, rng=rng, dtype=dtype)
 
-    ue_positions_reshaped = ue_positions[:, :, np.newaxis, :]
-    station_coords_reshaped = station_coords[np.newaxis, np.newaxis, :, :]
-    
-    distances_2d = np.sqrt(((ue_positions_reshaped - station_coords_reshaped)**2).sum(axis=3))
-    height_diff = BS_HEIGHT - UE_HEIGHT
-    distances_3d = np.sqrt(distances_2d**2 + height_diff**2)
-    
-    Pt = 10**(Pt_dBm/10) / 1000
-    Gt = 10**(Gt_dBi/10)
-    Gr = 10**(Gr_dBi/10)
-    
-    # 計算接收功率
-    Pr = (Pt * Gt * Gr * wavelength**2) / ((4 * np.pi * distances_3d)**2)
-    x_t = np.random.uniform(0, 2, size=distances_3d.shape)
-    Rxlev = 10 * np.log10(Pr * x_t) + 30
-    
-    return Rxlev
\ No newline at end of file
+def iter_Rxlev_blocks(calculate, ue_positions, block_size=3600, axis='time', **kwargs):
+    """
+    分塊計算信號強度，每次只產生一個時間區塊或UE區塊，峰值記憶體與區塊大小成正比
+
+    Args:
+        calculate: 信號計算函數，例如 calculate_Rxlev_bs 或 calculate_Rxlev_rbs
+        ue_positions: UE位置序列 (NUM_UE, T, 2)
+        block_size: 每個區塊的時間步數('time')或UE數量('ue')
+        axis: 分塊方向，'time' 或 'ue'
+        **kwargs: 傳給 calculate 的其他參數(Pt_dBm、station_coords等)
+
+    Yields:
+        tuple:
+            - slice: 區塊在時間軸或UE軸上的範圍
+            - np.ndarray: 區塊信號強度矩陣
+    """
+    if axis not in ('time', 'ue'):
+        raise ValueError(f"axis 必須是 'time' 或 'ue'，收到 {axis!r}")
+
+    length = ue_positions.shape[1] if axis == 'time' else ue_positions.shape[0]
+    for start in range(0, length, block_size):
+        block_slice = slice(start, min(start + block_size, length))
+        block = ue_positions[:, block_slice] if axis == 'time' else ue_positions[block_slice]
+        if axis == 'ue' and kwargs.get('fading') is not None:
+            # 衰落狀態只沿時間延續，換一批UE時重新開始
+            kwargs['fading'].reset()
+        yield block_slice, calculate(ue_positions=block, **kwargs)
@@ -0,0 +1,146 @@
+import numpy as np
+
+from scenario.hex_grid import AxialTable, axial_round
+
+def axial_offsets(rings):
+    """
+    回傳六角距離不超過 rings 的所有軸向座標位移
+
+    Args:
+        rings: 環數
+
+    Returns:
+        np.ndarray: 位移 (1 + 3*rings*(rings+1), 2)，第一個為 (0, 0)
+    """
+    dq, dr = np.meshgrid(np.arange(-rings, rings + 1), np.arange(-rings, rings + 1), indexing='ij')
+    dq, dr = dq.ravel(), dr.ravel()
+    keep = np.maximum(np.maximum(np.abs(dq), np.abs(dr)), np.abs(dq + dr)) <= rings
+    offsets = np.column_stack([dq[keep], dr[keep]])
+    order = np.argsort(np.maximum(np.maximum(np.abs(offsets[:, 0]), np.abs(offsets[:, 1])),
+                                  np.abs(offsets.sum(axis=1))), kind='stable')
+    return offsets[order]
+
+def nearest_stations(coords, points, k):
+    """
+    暴力法找出每個位置最近的k個基站，用於基站不在六角格點上或查詢超出範圍時
+
+    Args:
+        coords: 基站座標 (N, 2)
+        points: 位置 (P, 2)
+        k: 候選數量
+
+    Returns:
+        tuple: 基站索引 (P, k) 與距離平方 (P, k)，依距離由近到遠排序
+    """
+    k = min(k, len(coords))
+    d2 = ((points[:, np.newaxis, :] - coords[np.newaxis, :, :])**2).sum(axis=2)
+    idx = np.argpartition(d2, k - 1, axis=1)[:, :k] if k < len(coords) else np.tile(np.arange(k), (len(points), 1))
+    part = np.take_along_axis(d2, idx, axis=1)
+    order = np.argsort(part, axis=1, kind='stable')
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(part, order, axis=1)
+
+class HexStationIndex:
+    """
+    六角格基站空間索引：由位置的軸向座標直接查表取得附近的基站，每個查詢O(1)
+
+    只需要檢查所在格點周圍數環的基站，再從中挑出最近的k個；無法保證檢查範圍外
+    沒有更近基站的位置(例如地圖邊緣或基站不完整的外層)改用暴力法，確保結果正確。
+    """
+    def __init__(self, coords, center, spacing):
+        self.coords = np.asarray(coords, dtype=float)
+        self.center = np.asarray(center, dtype=float)
+        self.spacing = spacing
+
+        self.table = AxialTable(*axial_round(self.coords, self.center, spacing))
+
+    def query(self, points, k):
+        """
+        找出每個位置最近的k個基站
+
+        Args:
+            points: 位置 (..., 2)
+            k: 候選數量
+
+        Returns:
+            tuple: 基站索引 (..., k) 與距離平方 (..., k)，依距離由近到遠排序
+        """
+        points = np.asarray(points, dtype=float)
+        shape = points.shape[:-1]
+        flat = points.reshape(-1, 2)
+        k = min(k, len(self.coords))
+
+        # 環數足以涵蓋k個基站，再多檢查一環避免漏掉較近的基站
+        rings = 1
+        while 1 + 3 * rings * (rings + 1) < k:
+            rings += 1
+        offsets = axial_offsets(rings + 1)
+
+        q, r = axial_round(flat, self.center, self.spacing)
+        candidates = self.table.lookup(q[:, np.newaxis] + offsets[:, 0], r[:, np.newaxis] + offsets[:, 1])
+        valid = candidates >= 0
+        d2 = ((flat[:, np.newaxis, :] - self.coords[np.maximum(candidates, 0)])**2).sum(axis=2)
+        d2 = np.where(valid, d2, np.inf)
+
+        order = np.argsort(d2, axis=1, kind='stable')[:, :k]
+        idx = np.take_along_axis(candidates, order, axis=1)
+        dist2 = np.take_along_axis(d2, order, axis=1)
+
+        # 未檢查的基站與所在格點的六角距離至少為 rings+2，與位置的距離不小於 reach；
+        # 第k近的基站比 reach 遠 (或附近基站不足k個) 的位置可能漏掉較近的基站，改用暴力法
+        reach = (rings + 2) * self.spacing * np.sqrt(3) / 2 - self.spacing / np.sqrt(3)
+        short = ~(dist2[:, -1] <= reach**2)
+        if short.any():
+            idx[short], dist2[short] = nearest_stations(self.coords, flat[short], k)
+
+        return idx.reshape(shape + (k,)), dist2.reshape(shape + (k,))
+
+def build_station_index(config):
+    """由 SystemConfig 建立合法基站的六角格空間索引"""
+    return HexStationIndex(config.bs_coords, (config.center_x, config.center_y),
+                           config.radius * np.sqrt(3))
+
+def candidate_stations(index, ue_positions, k, always_include=None, block_size=3600, include=None):
+    """
+    找出每個UE在一段軌跡上曾經是最近k個基站之一的候選集合
+
+    以時間區塊查詢，只累積 (NUM_UE, 基站數) 的布林表，不產生 (NUM_UE, T, k) 陣列。
+    長時間模擬時候選集合會隨軌跡變大，應以時間區塊分別呼叫 (見 rogue_bs_data_candidates)，
+    每個區塊的候選數量只與區塊內移動的距離有關。
+
+    Args:
+        index: HexStationIndex
+        ue_positions: UE位置序列 (NUM_UE, T, 2)
+        k: 每個位置的候選數量
+        always_include: 所有UE一定要列入候選的基站索引，例如惡意基站
+        block_size: 每次查詢的時間步數
+        include: 每個UE各自一定要列入候選的基站索引 (NUM_UE, J)，-1表示沒有，
+            例如前一個區塊結束時的服務基站
+
+    Returns:
+        np.ndarray: 每個UE的候選基站索引 (NUM_UE, M)，依基站索引排序，不足M個以-1補齊
+    """
+    num_ue, num_steps = ue_positions.shape[:2]
+    num_stations = len(index.coords)
+    if always_include is not None:
+        num_stations = max(num_stations, int(np.max(always_include)) + 1)
+    if include is not None:
+        include = np.asarray(include, dtype=np.int64).reshape(num_ue, -1)
+        num_stations = max(num_stations, int(include.max(initial=-1)) + 1)
+    member = np.zeros((num_ue, num_stations), dtype=bool)
+
+    rows = np.arange(num_ue)[:, np.newaxis, np.newaxis]
+    for start in range(0, num_steps, block_size):
+        idx, _ = index.query(ue_positions[:, start:start + block_size], k)
+        member[np.broadcast_to(rows, idx.shape), idx] = True
+    if always_include is not None:
+        member[:, always_include] = True
+    if include is not None:
+        ue_idx, slot = np.nonzero(include >= 0)
+        member[ue_idx, include[ue_idx, slot]] = True
+
+    counts = member.sum(axis=1)
+    station_ids = np.full((num_ue, counts.max(initial=0)), -1, dtype=np.int64)
+    ue_idx, station_idx = np.nonzero(member)
+    slot = np.arange(len(ue_idx)) - np.repeat(np.cumsum(counts) - counts, counts)
+    station_ids[ue_idx, slot] = station_idx
+    return station_ids
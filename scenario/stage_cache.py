@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+META_FILE = 'meta.json'
+
+def hash_inputs(stage, inputs):
+    """
+    以階段名稱與輸入內容計算鍵值；陣列以型別、形狀與原始位元組計算，其餘以JSON表示
+
+    Args:
+        stage: 階段名稱
+        inputs: 輸入字典，值可為純量、字串、列表、numpy陣列或上游階段的鍵值
+
+    Returns:
+        str: 十六進位雜湊字串
+    """
+    digest = hashlib.sha1(stage.encode('utf-8'))
+    for name in sorted(inputs):
+        value = inputs[name]
+        digest.update(name.encode('utf-8'))
+        if isinstance(value, np.ndarray):
+            digest.update(repr((value.dtype.str, value.shape)).encode('utf-8'))
+            digest.update(np.ascontiguousarray(value).tobytes())
+        else:
+            digest.update(json.dumps(value, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()[:20]
+
+class StageCache:
+    """
+    依輸入內容定址的階段輸出快取
+
+    每個項目是一個目錄，內含各輸出陣列的 .npy 檔與 meta.json，讀取時以唯讀 memmap
+    載入。meta.json 的修改時間記錄最近使用時間，總大小超過 max_bytes 時先刪除最久
+    未使用的項目。
+    """
+    def __init__(self, cache_dir='result/stage_cache', max_bytes=2 * 2**30):
+        """
+        Args:
+            cache_dir: 快取目錄
+            max_bytes: 快取總大小上限(bytes)
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _entry(self, stage, key):
+        return os.path.join(self.cache_dir, f'{stage}_{key}')
+
+    def get(self, stage, key):
+        """
+        讀取快取項目
+
+        Returns:
+            tuple: (陣列字典, meta字典)，沒有快取時為 None
+        """
+        path = self._entry(stage, key)
+        meta_path = os.path.join(path, META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in meta['arrays']}
+        os.utime(meta_path)
+        return arrays, meta
+
+    def put(self, stage, key, arrays, **meta):
+        """
+        寫入快取項目(先寫入暫存目錄再改名)，並依大小上限刪除舊項目
+
+        Returns:
+            dict: 以唯讀 memmap 載入的陣列
+        """
+        path = self._entry(stage, key)
+        tmp_path = path + f'.tmp{os.getpid()}'
+        os.makedirs(tmp_path, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_path, f'{name}.npy'), array)
+        meta = dict(meta, stage=stage, key=key, arrays=list(arrays), created=time.time(),
+                    nbytes=int(sum(np.asarray(array).nbytes for array in arrays.values())))
+        with open(os.path.join(tmp_path, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        if os.path.exists(path):
+            shutil.rmtree(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+        self.evict(keep=path)
+        return self.get(stage, key)[0]
+
+    def evict(self, keep=None):
+        """刪除最久未使用的項目，直到總大小不超過上限 (keep 指定的項目不刪除)"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            meta_path = os.path.join(self.cache_dir, name, META_FILE)
+            if os.path.exists(meta_path):
+                size = sum(entry.stat().st_size for entry in os.scandir(os.path.join(self.cache_dir, name)))
+                entries.append((os.path.getmtime(meta_path), size, os.path.join(self.cache_dir, name)))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def cached(self, stage, inputs, compute, rng=None):
+        """
+        有快取時直接讀取，否則執行 compute() 並寫入快取
+
+        若指定 rng，快取會同時保存階段結束後的亂數產生器狀態，命中時還原，
+        使後續階段的亂數與不使用快取時完全相同；rng 執行前的狀態也列入鍵值。
+
+        Args:
+            stage: 階段名稱
+            inputs: 輸入字典 (見 hash_inputs)
+            compute: 計算輸出的函數，回傳陣列字典
+            rng: 階段使用的 np.random.Generator
+
+        Returns:
+            tuple: (陣列字典, 鍵值)，鍵值可作為下游階段的輸入
+        """
+        if rng is not None:
+            inputs = dict(inputs, rng_state=rng.bit_generator.state)
+        key = hash_inputs(stage, inputs)
+        found = self.get(stage, key)
+        if found is not None:
+            self.hits += 1
+            arrays, meta = found
+            if rng is not None:
+                rng.bit_generator.state = meta['rng_state']
+            return arrays, key
+
+        self.misses += 1
+        arrays = compute()
+        rng_state = rng.bit_generator.state if rng is not None else None
+        return self.put(stage, key, arrays, rng_state=rng_state), key
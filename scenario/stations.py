@@ -0,0 +1,72 @@
+import numpy as np
+
+class StationTable:
+    """
+    基站資料表 (structure of arrays)，合法基站在前、惡意基站在後
+
+    每個屬性都是長度為 NUM_STATIONS 的陣列，鏈路預算中與距離無關的部分
+    (發射功率、天線增益、波長) 在建立時就以dB預先算好。
+    """
+    def __init__(self, x, y, height, Pt_dBm, Gt_dBi, Gr_dBi, is_rogue, wavelength):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        num_stations = len(self.x)
+        self.height = np.broadcast_to(np.asarray(height, dtype=float), (num_stations,)).copy()
+        self.Pt_dBm = np.broadcast_to(np.asarray(Pt_dBm, dtype=float), (num_stations,)).copy()
+        self.Gt_dBi = np.broadcast_to(np.asarray(Gt_dBi, dtype=float), (num_stations,)).copy()
+        self.Gr_dBi = np.broadcast_to(np.asarray(Gr_dBi, dtype=float), (num_stations,)).copy()
+        self.is_rogue = np.broadcast_to(np.asarray(is_rogue, dtype=bool), (num_stations,)).copy()
+        self.wavelength = wavelength
+
+        # Friis方程的常數部分：Pt + Gt + Gr + 20log10(λ / 4π)，單位dBm
+        self.link_budget_dB = (self.Pt_dBm + self.Gt_dBi + self.Gr_dBi
+                               + 20 * np.log10(wavelength / (4 * np.pi)))
+
+    def __len__(self):
+        return len(self.x)
+
+    @property
+    def num_bs(self):
+        return int(np.count_nonzero(~self.is_rogue))
+
+    @property
+    def num_rbs(self):
+        return int(np.count_nonzero(self.is_rogue))
+
+    @property
+    def coords(self):
+        return np.column_stack([self.x, self.y])
+
+    def subset(self, index):
+        """回傳只包含指定基站的新資料表"""
+        return StationTable(self.x[index], self.y[index], self.height[index],
+                            self.Pt_dBm[index], self.Gt_dBi[index], self.Gr_dBi[index],
+                            self.is_rogue[index], self.wavelength)
+
+def concat_station_tables(tables):
+    """依序合併多個基站資料表"""
+    return StationTable(
+        np.concatenate([t.x for t in tables]),
+        np.concatenate([t.y for t in tables]),
+        np.concatenate([t.height for t in tables]),
+        np.concatenate([t.Pt_dBm for t in tables]),
+        np.concatenate([t.Gt_dBi for t in tables]),
+        np.concatenate([t.Gr_dBi for t in tables]),
+        np.concatenate([t.is_rogue for t in tables]),
+        tables[0].wavelength)
+
+def build_station_table(config):
+    """
+    由 SystemConfig 建立基站資料表
+
+    Args:
+        config: SystemConfig
+
+    Returns:
+        StationTable: 前 NUM_BS 個為合法基站，其後為惡意基站
+    """
+    bs = StationTable(config.bs_coords[:, 0], config.bs_coords[:, 1], config.BS_HEIGHT,
+                      config.Pt_bs, config.Gt_bs, config.Gr_bs, False, config.wavelength)
+    rbs = StationTable(config.rbs_coords[:, 0], config.rbs_coords[:, 1], config.RBS_HEIGHT,
+                       config.Pt_rbs, config.Gt_rbs, config.Gr_rbs, True, config.wavelength)
+    return concat_station_tables([bs, rbs])
@@ -0,0 +1,391 @@
+import csv
+import gzip
+import hashlib
+import itertools
+import json
+import os
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+META_FILE = 'trajectory.json'
+POSITIONS_FILE = 'positions.npy'
+TIME_FILE = 'time.npy'
+
+# CSV 軌跡可接受的欄位名稱 (UE編號, 時間, x, y)：一般格式與 SUMO xml2csv 輸出的 FCD 格式
+CSV_COLUMNS = [
+    ('id', 'time', 'x', 'y'),
+    ('vehicle_id', 'timestep_time', 'vehicle_x', 'vehicle_y')
+]
+
+class TrajectoryWriter:
+    """
+    將UE軌跡寫入記憶體映射的 float32 陣列 (NUM_UE, T, 2)
+
+    目錄內含 positions.npy、time.npy 與 trajectory.json (時間軸、地圖大小、UE編號)。
+    可以任意順序寫入UE或時間區塊，關閉時才標記為完成並記錄內容雜湊，
+    供階段快取辨識軌跡內容。
+    """
+    def __init__(self, path, T, ue_ids, map_size=None, source=None, import_params=None):
+        """
+        Args:
+            path: 輸出目錄
+            T: 時間序列 (T,)
+            ue_ids: UE編號列表 (整數或字串，例如車輛ID)
+            map_size: 地圖大小(m)，None表示未知
+            source: 軌跡來源說明，例如匯入的檔案路徑
+            import_params: 匯入時的座標與時間平移量等參數 (可序列化為JSON)，None表示非匯入
+        """
+        self.path = path
+        self.T = np.asarray(T, dtype=float)
+        self.ue_ids = [str(ue) for ue in ue_ids]
+        self.map_size = map_size
+        self.source = source
+        self.import_params = import_params
+
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, TIME_FILE), self.T)
+        self.positions = np.lib.format.open_memmap(os.path.join(path, POSITIONS_FILE), mode='w+',
+                                                   dtype=np.float32, shape=(len(self.ue_ids), len(self.T), 2))
+        self._write_meta(complete=False)
+
+    def _write_meta(self, complete, digest=None):
+        meta = {
+            'num_ue': len(self.ue_ids),
+            'num_steps': len(self.T),
+            't_start': float(self.T[0]),
+            't_end': float(self.T[-1]),
+            'map_size': self.map_size,
+            'ue_ids': self.ue_ids,
+            'source': self.source,
+            'import_params': self.import_params,
+            'sha1': digest,
+            'complete': complete
+        }
+        tmp_path = os.path.join(self.path, META_FILE + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.path, META_FILE))
+
+    def write(self, positions, ue_slice=slice(None), time_slice=slice(None)):
+        """
+        寫入一個 UE/時間區塊
+
+        Args:
+            positions: 位置 (U, B, 2)
+            ue_slice: 區塊對應的UE範圍
+            time_slice: 區塊對應的時間範圍
+        """
+        self.positions[ue_slice, time_slice] = positions
+
+    def close(self, block_ue=256):
+        """寫回磁碟並標記完成，依UE區塊計算內容雜湊"""
+        self.positions.flush()
+        digest = hashlib.sha1()
+        for start in range(0, len(self.ue_ids), block_ue):
+            digest.update(np.ascontiguousarray(self.positions[start:start + block_ue]).tobytes())
+        del self.positions
+        self._write_meta(complete=True, digest=digest.hexdigest()[:20])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+class TrajectoryStore:
+    """
+    唯讀的記憶體映射軌跡，positions 可直接切出 UE/時間範圍而不載入全部，
+    也可以直接傳給 calculate_Rxlev 或 iter_Rxlev_blocks
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if not self.meta['complete']:
+            raise ValueError(f"軌跡 {path} 尚未寫入完成")
+        self.T = np.load(os.path.join(path, TIME_FILE))
+        self.positions = np.load(os.path.join(path, POSITIONS_FILE), mmap_mode='r')
+        self.ue_ids = self.meta['ue_ids']
+        self.map_size = self.meta['map_size']
+
+    @property
+    def num_ue(self):
+        return self.meta['num_ue']
+
+    @property
+    def key(self):
+        """軌跡內容的雜湊值，作為階段快取的輸入"""
+        return self.meta['sha1']
+
+    def read(self, ue_slice=slice(None), time_slice=slice(None), dtype=np.float64):
+        """
+        讀取部分UE與時間的位置
+
+        Args:
+            ue_slice: UE範圍或索引
+            time_slice: 時間範圍或索引
+            dtype: 輸出型別
+
+        Returns:
+            np.ndarray: 位置 (U, B, 2)
+        """
+        return np.asarray(self.positions[ue_slice, time_slice], dtype=dtype)
+
+    def iter_blocks(self, block_size=3600, axis='time', dtype=np.float64):
+        """
+        逐時間區塊或UE區塊讀取位置
+
+        Yields:
+            tuple: (區塊範圍 slice, 位置 (U, B, 2))
+        """
+        length = self.positions.shape[1] if axis == 'time' else self.positions.shape[0]
+        for start in range(0, length, block_size):
+            block_slice = slice(start, min(start + block_size, length))
+            if axis == 'time':
+                yield block_slice, self.read(time_slice=block_slice, dtype=dtype)
+            else:
+                yield block_slice, self.read(ue_slice=block_slice, dtype=dtype)
+
+def save_trajectories(path, ue_positions, T, map_size=None, ue_ids=None, block_ue=256):
+    """
+    將 simulate_ue_movement 等產生的軌跡存為記憶體映射檔
+
+    Args:
+        path: 輸出目錄
+        ue_positions: UE位置序列 (NUM_UE, T, 2)
+        T: 時間序列
+        map_size: 地圖大小(m)
+        ue_ids: UE編號，None表示 0..NUM_UE-1
+        block_ue: 每次寫入的UE數量
+
+    Returns:
+        TrajectoryStore
+    """
+    num_ue = len(ue_positions)
+    ue_ids = range(num_ue) if ue_ids is None else ue_ids
+    with TrajectoryWriter(path, T, ue_ids, map_size, source='simulate_ue_movement') as writer:
+        for start in range(0, num_ue, block_ue):
+            block = slice(start, min(start + block_ue, num_ue))
+            writer.write(ue_positions[block], ue_slice=block)
+    return TrajectoryStore(path)
+
+def iter_csv_records(path, chunk_rows=200_000, columns=None):
+    """
+    逐區塊讀取CSV軌跡
+
+    Args:
+        path: CSV檔案路徑，需有標題列，分隔符號為逗號或分號 (SUMO xml2csv 預設)
+        chunk_rows: 每個區塊的列數
+        columns: (UE編號, 時間, x, y) 欄位名稱，None表示依標題自動判斷 CSV_COLUMNS
+
+    Yields:
+        tuple: (UE編號 (N,) 字串，時間 (N,)，位置 (N, 2))
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        first_line = f.readline()
+        f.seek(0)
+        reader = csv.reader(f, delimiter=';' if first_line.count(';') > first_line.count(',') else ',')
+        header = next(reader)
+        if columns is None:
+            columns = next((names for names in CSV_COLUMNS if set(names) <= set(header)), None)
+            if columns is None:
+                raise ValueError(f"無法辨識CSV欄位 {header}，需要 {' 或 '.join(map(str, CSV_COLUMNS))}")
+        index = [header.index(name) for name in columns]
+        while True:
+            rows = list(itertools.islice(reader, chunk_rows))
+            if not rows:
+                return
+            # 缺少座標的列 (例如SUMO中尚未出發的車輛) 略過
+            rows = [row for row in rows if all(row[i] for i in index)]
+            ids = np.array([row[index[0]] for row in rows])
+            values = np.array([[row[i] for i in index[1:]] for row in rows], dtype=float).reshape(-1, 3)
+            yield ids, values[:, 0], values[:, 1:]
+
+def iter_fcd_records(path, chunk_rows=200_000):
+    """
+    以串流方式解析 SUMO FCD XML 軌跡 (<timestep time=...><vehicle id= x= y=/>...)，
+    每個 timestep 解析完即釋放，記憶體與檔案大小無關
+
+    Yields:
+        tuple: (UE編號 (N,) 字串，時間 (N,)，位置 (N, 2))
+    """
+    ids, times, xy = [], [], []
+    root, time = None, None
+    with (gzip.open(path) if path.endswith('.gz') else open(path, 'rb')) as f:
+        for event, elem in ET.iterparse(f, events=('start', 'end')):
+            if root is None:
+                root = elem
+            if elem.tag == 'timestep':
+                if event == 'start':
+                    time = float(elem.get('time'))
+                    continue
+                root.clear()
+                if len(ids) >= chunk_rows:
+                    yield np.array(ids), np.array(times), np.array(xy, dtype=float).reshape(-1, 2)
+                    ids, times, xy = [], [], []
+            elif event == 'end' and elem.tag in ('vehicle', 'person'):
+                ids.append(elem.get('id'))
+                times.append(time)
+                xy.append((float(elem.get('x')), float(elem.get('y'))))
+    if ids:
+        yield np.array(ids), np.array(times), np.array(xy, dtype=float).reshape(-1, 2)
+
+def iter_trace_records(path, chunk_rows=200_000):
+    """依副檔名選擇 CSV 或 SUMO FCD XML 讀取器"""
+    if path.endswith('.xml') or path.endswith('.xml.gz'):
+        return iter_fcd_records(path, chunk_rows)
+    return iter_csv_records(path, chunk_rows)
+
+class TraceResampler:
+    """
+    將依時間遞增到達的軌跡樣本線性內插到等間隔的時間序列 T，直接寫入輸出陣列
+
+    每個UE只保留最後一個樣本，兩個相鄰樣本之間的時間點在收到後一個樣本時即可寫入，
+    因此每個區塊的記憶體只與區塊大小有關。第一個樣本之前與最後一個樣本之後
+    的時間點維持在該樣本的位置。
+    """
+    def __init__(self, positions, T):
+        """
+        Args:
+            positions: 輸出陣列 (NUM_UE, T, 2)，例如 TrajectoryWriter.positions
+            T: 時間序列
+        """
+        self.positions = positions
+        self.T = np.asarray(T, dtype=float)
+        num_ue = positions.shape[0]
+        self.first_t = np.full(num_ue, np.nan)
+        self.first_xy = np.zeros((num_ue, 2))
+        self.last_t = np.full(num_ue, np.nan)
+        self.last_xy = np.zeros((num_ue, 2))
+
+    def add(self, ue, t, xy):
+        """
+        加入一個區塊的樣本
+
+        Args:
+            ue: UE索引 (N,)
+            t: 時間 (N,)，同一個UE的樣本需依時間遞增 (可跨區塊)
+            xy: 位置 (N, 2)
+        """
+        order = np.lexsort((t, ue))
+        ue, t, xy = ue[order], t[order], xy[order]
+        new = np.append(True, ue[1:] != ue[:-1])
+        first_of_ue = np.isnan(self.last_t[ue]) & new
+        self.first_t[ue[first_of_ue]] = t[first_of_ue]
+        self.first_xy[ue[first_of_ue]] = xy[first_of_ue]
+
+        # 每個樣本與同一UE的前一個樣本 (可能來自前一個區塊) 組成一段
+        prev_t = np.where(new, self.last_t[ue], np.roll(t, 1))
+        prev_xy = np.where(new[:, np.newaxis], self.last_xy[ue], np.roll(xy, 1, axis=0))
+        if np.any(t < prev_t):
+            raise ValueError("同一個UE的軌跡樣本需依時間遞增")
+        segment = ~np.isnan(prev_t)
+
+        # 每段覆蓋的時間點 [i0, i1) 展開成一個索引陣列，一次內插
+        i0 = np.searchsorted(self.T, prev_t[segment], side='left')
+        i1 = np.searchsorted(self.T, t[segment], side='left')
+        lengths = i1 - i0
+        if lengths.sum():
+            seg = np.repeat(np.arange(len(i0)), lengths)
+            tick = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + i0[seg]
+            t0, t1 = prev_t[segment][seg], t[segment][seg]
+            fraction = ((self.T[tick] - t0) / (t1 - t0))[:, np.newaxis]
+            xy0 = prev_xy[segment][seg]
+            self.positions[ue[segment][seg], tick] = xy0 + (xy[segment][seg] - xy0) * fraction
+
+        last = np.append(ue[1:] != ue[:-1], True)
+        self.last_t[ue[last]] = t[last]
+        self.last_xy[ue[last]] = xy[last]
+
+    def finish(self):
+        """填補每個UE第一個樣本之前與最後一個樣本之後的時間點；沒有樣本的UE引發 ValueError"""
+        missing = np.isnan(self.last_t)
+        if missing.any():
+            raise ValueError(f"{int(missing.sum())} 個UE沒有任何軌跡樣本")
+        head = np.searchsorted(self.T, self.first_t, side='left')
+        tail = np.searchsorted(self.T, self.last_t, side='left')
+        for ue in range(len(head)):
+            self.positions[ue, :head[ue]] = self.first_xy[ue]
+            self.positions[ue, tail[ue]:] = self.last_xy[ue]
+
+def scan_trace_ids(records):
+    """第一次掃描：依第一次出現的順序列出所有UE編號"""
+    seen = {}
+    for ids, _, _ in records:
+        for ue in ids:
+            seen.setdefault(ue, len(seen))
+    return list(seen)
+
+def trace_import_params(offset=(0.0, 0.0), time_offset=0.0):
+    """記錄在 trajectory.json 的匯入參數，load_trace 以此判斷能否重複使用"""
+    return {'offset': [float(v) for v in np.asarray(offset, dtype=float)], 'time_offset': float(time_offset)}
+
+def import_trace(trace_path, store_path, T, num_ue=None, map_size=None, offset=(0.0, 0.0), time_offset=0.0,
+                 chunk_rows=200_000):
+    """
+    將外部移動軌跡 (CSV 或 SUMO FCD XML) 逐區塊重新取樣到 T，存為記憶體映射軌跡
+
+    Args:
+        trace_path: 軌跡檔路徑
+        store_path: 輸出目錄
+        T: 目標時間序列，例如 SystemConfig.T
+        num_ue: 只保留最先出現的 num_ue 個UE，None表示全部 (需要先掃描一次檔案)
+        map_size: 地圖大小(m)，記錄在軌跡資訊中
+        offset: 座標平移量 (x, y)，位置為檔案座標減去 offset
+        time_offset: 時間平移量，檔案時間減去 time_offset 對應到 T
+        chunk_rows: 每個區塊的樣本數
+
+    Returns:
+        TrajectoryStore
+    """
+    # 未指定數量時先掃描一次檔案取得所有UE，否則依第一次出現的順序編號，額滿後忽略新的UE
+    ue_ids = scan_trace_ids(iter_trace_records(trace_path, chunk_rows)) if num_ue is None else []
+    index = {ue: i for i, ue in enumerate(ue_ids)}
+    num_ue = len(ue_ids) if num_ue is None else num_ue
+    offset = np.asarray(offset, dtype=float)
+    writer = TrajectoryWriter(store_path, T, [''] * num_ue, map_size, source=os.path.abspath(trace_path),
+                              import_params=trace_import_params(offset, time_offset))
+    resampler = TraceResampler(writer.positions, T)
+
+    for ids, times, xy in iter_trace_records(trace_path, chunk_rows):
+        for name in ids:
+            if name not in index and len(index) < num_ue:
+                index[name] = len(index)
+                ue_ids.append(name)
+        ue = np.array([index.get(name, -1) for name in ids], dtype=np.int64)
+        keep = ue >= 0
+        resampler.add(ue[keep], times[keep] - time_offset, xy[keep] - offset)
+
+    if len(ue_ids) < num_ue:
+        raise ValueError(f"軌跡檔只有 {len(ue_ids)} 個UE，少於要求的 {num_ue} 個")
+    resampler.finish()
+    writer.ue_ids = ue_ids
+    writer.close()
+    return TrajectoryStore(store_path)
+
+def load_trace(trace_path, store_path, T, num_ue=None, map_size=None, offset=(0.0, 0.0), time_offset=0.0,
+               chunk_rows=200_000):
+    """
+    讀取已匯入的軌跡；尚未匯入、軌跡檔較新，或時間軸、UE數量、地圖大小、
+    座標與時間平移量不同時重新匯入
+
+    參數與 import_trace 相同。
+
+    Returns:
+        TrajectoryStore
+    """
+    try:
+        store = TrajectoryStore(store_path)
+    except (OSError, ValueError):
+        store = None
+    if (store is not None
+            and store.meta['source'] == os.path.abspath(trace_path)
+            and os.path.getmtime(trace_path) <= os.path.getmtime(os.path.join(store_path, META_FILE))
+            and np.array_equal(store.T, np.asarray(T, dtype=float))
+            and (num_ue is None or store.num_ue == num_ue)
+            and store.map_size == map_size
+            and store.meta.get('import_params') == trace_import_params(offset, time_offset)):
+        return store
+    return import_trace(trace_path, store_path, T, num_ue, map_size, offset, time_offset, chunk_rows)
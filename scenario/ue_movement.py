@@ -1,65 +1,161 @@
 import numpy as np
 
-def generate_random_positions(num_positions, map_size):
+def get_rng(rng=None):
+    """
+    取得隨機數產生器
+
+    參數：
+    rng: np.random.Generator、整數種子或None（None時使用新的預設產生器）
+
+    回傳：
+    np.random.Generator
+    """
+    if isinstance(rng, np.random.Generator):
+        return rng
+    return np.random.default_rng(rng)
+
+def generate_random_positions(num_positions, map_size, rng=None):
     """
     生成隨機位置
-    
+
     參數：
     num_positions: 位置數量
     map_size: 地圖大小
-    
+    rng: 隨機數產生器，None時使用全域np.random狀態
+
     回傳：
     隨機位置array，形狀為(num_positions, 2)
     """
-    return np.random.rand(num_positions, 2) * map_size
+    if rng is None:
+        return np.random.rand(num_positions, 2) * map_size
+    return get_rng(rng).random((num_positions, 2)) * map_size
 
-def generate_waypoint(map_size):
+def generate_waypoint(map_size, rng=None):
     """
     生成單一隨機路徑點
-    
+
     參數：
     map_size: 地圖大小
-    
+    rng: 隨機數產生器，None時使用全域np.random狀態
+
     回傳：
     隨機路徑點array，形狀為(2,)
     """
-    return np.random.rand(2) * map_size
+    if rng is None:
+        return np.random.rand(2) * map_size
+    return get_rng(rng).random(2) * map_size
+
+def generate_waypoint_legs(initial_positions, speed, time, map_size, pause_time=5, rng=None):
+    """
+    以路段(leg)為單位產生所有UE的隨機路徑點行程
+
+    每一段路徑由「起點 -> 路徑點」的等速移動加上固定暫停組成。抵達時間對齊到
+    時間序列：當剩餘距離不足一步時，UE於該時間點直接抵達路徑點，與逐步模擬相同。
+
+    參數：
+    initial_positions: 初始位置 array (NUM_UE, 2)
+    speed: 移動速度
+    time: 時間序列
+    map_size: 地圖大小
+    pause_time: 固定暫停時間
+    rng: 隨機數產生器
+
+    回傳：
+    tuple:
+        - origins: 每段起點 (NUM_UE, L, 2)
+        - waypoints: 每段路徑點 (NUM_UE, L, 2)
+        - move_starts: 每段開始移動的時間 (NUM_UE, L)
+        - arrivals: 每段抵達路徑點的時間 (NUM_UE, L)，未在模擬時間內抵達為inf
+    """
+    rng = get_rng(rng)
+    time = np.asarray(time, dtype=float)
+    num_ue = initial_positions.shape[0]
+
+    origin = np.asarray(initial_positions, dtype=float).copy()
+    move_start = np.full(num_ue, time[0])
+    origins, waypoints, move_starts, arrivals = [], [], [], []
+
+    while True:
+        waypoint = rng.random((num_ue, 2)) * map_size
+        distance = np.linalg.norm(waypoint - origin, axis=1)
+
+        # 第一個移動距離達到剩餘距離的時間點即為抵達時間
+        arrival_idx = np.searchsorted(time, move_start + distance / speed, side='left')
+        arrival = np.where(arrival_idx < len(time),
+                           time[np.minimum(arrival_idx, len(time) - 1)], np.inf)
+
+        origins.append(origin)
+        waypoints.append(waypoint)
+        move_starts.append(move_start)
+        arrivals.append(arrival)
+
+        # 暫停結束後從路徑點出發
+        origin = waypoint
+        move_start = arrival + pause_time
+        if np.all(move_start >= time[-1]):
+            break
+
+    return (np.stack(origins, axis=1), np.stack(waypoints, axis=1),
+            np.stack(move_starts, axis=1), np.stack(arrivals, axis=1))
+
+def interpolate_legs(origins, waypoints, move_starts, speed, time):
+    """
+    將路段行程內插成每個時間點的位置，所有UE一次向量化計算
 
-def simulate_ue_movement(initial_positions, speed, time, map_size, pause_time=5):
+    參數：
+    origins: 每段起點 (NUM_UE, L, 2)
+    waypoints: 每段路徑點 (NUM_UE, L, 2)
+    move_starts: 每段開始移動的時間 (NUM_UE, L)
+    speed: 移動速度
+    time: 時間序列
+
+    回傳：
+    位置array，形狀為(NUM_UE, len(time), 2)
     """
+    time = np.asarray(time, dtype=float)
+    num_ue, num_legs = move_starts.shape
+
+    # 每段路徑在時間序列上佔據連續區間，以repeat展開成每個時間點的路段參數
+    first_idx = np.searchsorted(time, move_starts, side='left')
+    first_idx[:, 0] = 0
+    counts = np.diff(np.concatenate([first_idx, np.full((num_ue, 1), len(time))], axis=1), axis=1)
+
+    direction = waypoints - origins
+    distance = np.linalg.norm(direction, axis=2)
+    unit = np.divide(direction, distance[:, :, np.newaxis],
+                     out=np.zeros_like(direction), where=distance[:, :, np.newaxis] > 0)
+
+    counts = counts.ravel()
+    start_t = np.repeat(move_starts.ravel(), counts)
+    leg_dist = np.repeat(distance.ravel(), counts)
+    t_flat = np.tile(time, num_ue)
+    travelled = np.clip(speed * (t_flat - start_t), 0, leg_dist)
+
+    positions = np.empty((num_ue * len(time), 2))
+    for axis in range(2):
+        positions[:, axis] = (np.repeat(origins[:, :, axis].ravel(), counts)
+                              + np.repeat(unit[:, :, axis].ravel(), counts) * travelled)
+    positions = positions.reshape(num_ue, len(time), 2)
+    return positions
+
+def simulate_ue_movement(initial_positions, speed, time, map_size, pause_time=5, rng=None):
+    """
+    隨機路徑點(random waypoint)移動模型
+
+    先以路段為單位產生路徑點與暫停時間，再對所有UE向量化內插出位置，
+    移動語意與逐步模擬相同：等速移動、固定暫停、剩餘距離不足一步即抵達。
+
     Args:
         initial_positions: 初始位置 array (NUM_UE, 2)
         speed: 移動速度
         time: 時間序列
         map_size: 地圖大小
         pause_time: 固定暫停時間，預設5秒
+        rng: 隨機數產生器或種子，指定後結果可重現
+
+    Returns:
+        位置array，形狀為(NUM_UE, len(time), 2)
     """
-    num_ue = initial_positions.shape[0]
-    num_timesteps = len(time)
-    positions = np.zeros((num_ue, num_timesteps, 2))
-    positions[:, 0] = initial_positions
-
-    current_positions = initial_positions.copy()
-    waypoints = np.array([generate_waypoint(map_size) for _ in range(num_ue)])
-    pause_times = np.zeros(num_ue)
-
-    for t in range(1, num_timesteps):
-        for i in range(num_ue):
-            if pause_times[i] > 0:
-                pause_times[i] -= time[t] - time[t-1]
-                current_positions[i] = positions[i, t-1]
-            else:
-                direction = waypoints[i] - current_positions[i]
-                distance = np.linalg.norm(direction)
-
-                if distance < speed * (time[t] - time[t-1]):
-                    current_positions[i] = waypoints[i]
-                    waypoints[i] = generate_waypoint(map_size)
-                    pause_times[i] = pause_time  # 固定5秒暫停
-                else:
-                    normalized_direction = direction / distance
-                    current_positions[i] = positions[i, t-1] + normalized_direction * speed * (time[t] - time[t-1])
-
-            positions[i, t] = current_positions[i]
-
-    return positions
\ No newline at end of file
+    origins, waypoints, move_starts, _ = generate_waypoint_legs(
+        initial_positions, speed, time, map_size, pause_time, rng)
+    return interpolate_legs(origins, waypoints, move_starts, speed, time)
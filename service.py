@@ -0,0 +1,406 @@
+import argparse
+import asyncio
+import inspect
+import json
+import struct
+import time
+
+import numpy as np
+
+from config import SystemConfig
+from scenario.online_detector import OnlineHandoverDetector
+
+# 每個批次訊框開頭的紀錄數 (uint32)，0 表示傳送結束
+FRAME_HEADER = struct.Struct('<I')
+
+def report_dtype(num_stations):
+    """
+    量測報告的二進位格式：UE編號、模擬時間、送出時間(time.monotonic)與各基站RSRP
+
+    Args:
+        num_stations: 基站數量
+
+    Returns:
+        np.dtype
+    """
+    return np.dtype([('ue', '<u4'), ('t', '<f8'), ('sent', '<f8'), ('rsrp', '<f4', (num_stations,))])
+
+def report_ranks(ue_ids):
+    """
+    每筆報告在同一UE報告中的先後順序 (0, 1, ...)
+
+    偵測器每次更新時每個UE只能有一筆樣本，同一批次內同一UE的多筆報告依此順序分次處理。
+    """
+    order = np.argsort(ue_ids, kind='stable')
+    sorted_ids = ue_ids[order]
+    index = np.arange(len(ue_ids))
+    group_start = np.ones(len(ue_ids), dtype=bool)
+    group_start[1:] = sorted_ids[1:] != sorted_ids[:-1]
+    ranks = np.empty(len(ue_ids), dtype=np.int64)
+    ranks[order] = index - np.maximum.accumulate(np.where(group_start, index, 0))
+    return ranks
+
+def percentiles_ms(samples):
+    """回傳 p50/p99 (毫秒)，沒有樣本時為 None"""
+    if not samples:
+        return {'p50_ms': None, 'p99_ms': None}
+    values = np.concatenate(samples) * 1e3
+    return {'p50_ms': float(np.percentile(values, 50)), 'p99_ms': float(np.percentile(values, 99))}
+
+class IngestService:
+    """
+    接收量測報告並以批次更新偵測器的 asyncio 服務
+
+    報告由 submit() 放入有上限的佇列，佇列滿時呼叫端會被暫停(背壓)；run() 每次
+    取出佇列中所有可用的報告合成一個批次，交給 OnlineHandoverDetector 向量化更新，
+    連上惡意基站的報告以警示發布給訂閱者。訂閱者處理不及時 run() 會等待，
+    背壓同樣傳回給 submit()。
+    """
+    def __init__(self, num_ue, NUM_BS, num_stations, queue_size=64, max_batch=65536,
+                 handover_threshold=3, time_window=10, min_time_between_handovers=20):
+        """
+        Args:
+            num_ue: UE數量
+            NUM_BS: 合法基站數量
+            num_stations: 所有基站數量
+            queue_size: 佇列可容納的報告區塊數量，超過時 submit 會等待
+            max_batch: 每次偵測器更新最多合併的報告數量
+            handover_threshold: 切換閾值(dB)
+            time_window: 平均信號的時間窗口(時間步數)
+            min_time_between_handovers: 兩次切換的最小間隔(時間步數)
+        """
+        self.detector = OnlineHandoverDetector(num_ue, NUM_BS, num_stations, handover_threshold,
+                                               time_window, min_time_between_handovers)
+        self.dtype = report_dtype(num_stations)
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.max_batch = max_batch
+        self.subscribers = []
+
+        self.num_reports = 0
+        self.num_batches = 0
+        self.num_alerts = 0
+        self.max_queue_depth = 0
+        self.blocked_submits = 0
+        self.blocked_seconds = 0.0
+        self.decision_latency = []
+        self.alert_latency = []
+        self._started = None
+
+    def subscribe(self, callback):
+        """
+        登記警示回呼函數，參數為警示字典列表
+
+        回呼可以是協程函數，run() 會等待它完成後才處理下一個批次，例如等待 writer.drain()。
+        """
+        self.subscribers.append(callback)
+
+    async def publish(self, alerts):
+        """將警示發布給所有訂閱者"""
+        if not alerts:
+            return
+        for callback in self.subscribers:
+            result = callback(alerts)
+            if inspect.isawaitable(result):
+                await result
+
+    async def submit(self, records):
+        """送入一個報告區塊；佇列已滿時等待，將背壓傳回給生產者"""
+        if self._started is None:
+            self._started = time.monotonic()
+        if self.queue.full():
+            self.blocked_submits += 1
+            start = time.monotonic()
+            await self.queue.put(records)
+            self.blocked_seconds += time.monotonic() - start
+        else:
+            self.queue.put_nowait(records)
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+
+    async def close(self):
+        """通知 run() 處理完剩餘報告後結束"""
+        await self.queue.put(None)
+
+    async def run(self):
+        """處理佇列中的報告直到 close()"""
+        done = False
+        while not done:
+            batch = [await self.queue.get()]
+            size = 0 if batch[0] is None else len(batch[0])
+            while size < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                size += 0 if batch[-1] is None else len(batch[-1])
+            done = any(records is None for records in batch)
+            records = [records for records in batch if records is not None]
+            if records:
+                await self.publish(self.process(np.concatenate(records)))
+            # 讓生產者有機會在批次之間繼續送入報告
+            await asyncio.sleep(0)
+
+    def process(self, records):
+        """以向量化方式更新偵測器，回傳這批報告產生的警示 (由 run() 發布)"""
+        alerts = []
+        ranks = report_ranks(records['ue'])
+        for rank in range(int(ranks.max()) + 1 if len(ranks) else 0):
+            reports = records[ranks == rank]
+            ue_ids = reports['ue'].astype(np.int64)
+            first = self.detector.t[ue_ids] == 0
+            serving, handover, labels = self.detector.update(ue_ids, reports['rsrp'])
+            now = time.monotonic()
+            latency = now - reports['sent']
+            self.decision_latency.append(latency)
+
+            alert = labels & (handover | first)
+            if alert.any():
+                self.alert_latency.append(latency[alert])
+                for ue, t, station, delay in zip(ue_ids[alert], reports['t'][alert], serving[alert], latency[alert]):
+                    alerts.append({'type': 'rogue', 'ue': int(ue), 't': float(t), 'station': int(station),
+                                   'latency_ms': float(delay * 1e3)})
+
+        self.num_reports += len(records)
+        self.num_batches += 1
+        self.num_alerts += len(alerts)
+        return alerts
+
+    def stats(self):
+        """吞吐量、批次大小、延遲百分位數與背壓統計"""
+        elapsed = time.monotonic() - self._started if self._started is not None else 0.0
+        return {
+            'reports': self.num_reports,
+            'batches': self.num_batches,
+            'mean_batch': self.num_reports / self.num_batches if self.num_batches else 0.0,
+            'alerts': self.num_alerts,
+            'reports_per_s': self.num_reports / elapsed if elapsed > 0 else 0.0,
+            'decision_latency': percentiles_ms(self.decision_latency),
+            'alert_latency': percentiles_ms(self.alert_latency),
+            'max_queue_depth': self.max_queue_depth,
+            'queue_size': self.queue.maxsize,
+            'blocked_submits': self.blocked_submits,
+            'blocked_seconds': self.blocked_seconds
+        }
+
+def simulate_reports(config, attack_periods):
+    """
+    以 simulate_ue_movement 與鏈路預算核心產生要重播的信號強度
+
+    Returns:
+        tuple: 時間序列 (T,)、信號強度 (NUM_UE, T, NUM_STATIONS) float32、合法基站數量
+    """
+    from scenario.signal_calculation import calculate_Rxlev
+    from scenario.stations import build_station_table
+    from scenario.ue_movement import simulate_ue_movement
+    from visualization.rogue_bs_signal_plot import attack_mask, clip_attack_periods
+
+    ue_positions = simulate_ue_movement(config.ue_initial_positions, config.V, config.T, config.MAP_SIZE,
+                                        rng=config.rng)
+    stations = build_station_table(config)
+    Rxlev = calculate_Rxlev(stations, ue_positions, config.UE_HEIGHT, rng=config.rng, dtype=np.float32)
+    # 攻擊區間外惡意基站信號為 -100 dBm，與 rogue_bs_data 相同
+    in_attack = attack_mask(config.T, clip_attack_periods(config.T, attack_periods), config.T[-1])
+    Rxlev[:, ~in_attack, stations.num_bs:] = -100.0
+    return config.T, Rxlev, stations.num_bs
+
+async def replay_reports(sink, T, Rxlev, speedup=0, ue_block=1024):
+    """
+    依模擬時間重播量測報告
+
+    Args:
+        sink: 接收報告區塊的協程函數，例如 IngestService.submit
+        T: 時間序列
+        Rxlev: 信號強度 (NUM_UE, T, NUM_STATIONS)
+        speedup: 相對於模擬時間的加速倍數，0 表示盡快送出
+        ue_block: 每個報告區塊包含的UE數量
+    """
+    num_ue, num_steps, num_stations = Rxlev.shape
+    dtype = report_dtype(num_stations)
+    ue_ids = np.arange(num_ue)
+    start = time.monotonic()
+    for step in range(num_steps):
+        if speedup > 0:
+            delay = start + (T[step] - T[0]) / speedup - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        for first in range(0, num_ue, ue_block):
+            ues = ue_ids[first:first + ue_block]
+            records = np.empty(len(ues), dtype=dtype)
+            records['ue'] = ues
+            records['t'] = T[step]
+            records['rsrp'] = Rxlev[ues, step]
+            records['sent'] = time.monotonic()
+            await sink(records)
+
+async def handle_connection(reader, writer, queue_size=64, max_batch=65536):
+    """
+    處理一個串流連線：第一行為JSON握手 {num_ue, NUM_BS, num_stations}，之後為
+    [uint32 紀錄數][報告紀錄] 訊框，紀錄數為0表示結束。警示以JSON行回傳，結束時
+    回傳一行統計結果。佇列滿或送端沒有讀取警示時停止讀取，背壓經由TCP流量控制傳回給送端。
+
+    送端中途斷線時視為串流結束：停止處理、不回傳統計結果，並關閉連線。
+
+    Returns:
+        dict: 統計結果，握手不完整時為 None
+    """
+    try:
+        handshake = json.loads(await reader.readline())
+    except (ValueError, ConnectionError):
+        writer.close()
+        return None
+    service = IngestService(handshake['num_ue'], handshake['NUM_BS'], handshake['num_stations'],
+                            queue_size=queue_size, max_batch=max_batch)
+
+    async def publish(alerts):
+        writer.write(''.join(json.dumps(a) + '\n' for a in alerts).encode())
+        try:
+            await writer.drain()
+        except ConnectionError:
+            # 送端已斷線，讀取迴圈會收到串流結束
+            pass
+
+    service.subscribe(publish)
+    worker = asyncio.create_task(service.run())
+
+    try:
+        while True:
+            count, = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+            if count == 0:
+                break
+            payload = await reader.readexactly(count * service.dtype.itemsize)
+            await service.submit(np.frombuffer(payload, dtype=service.dtype))
+
+        await service.close()
+        await worker
+        writer.write((json.dumps(dict(service.stats(), type='stats')) + '\n').encode())
+        await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        # 斷線或服務關閉時不再處理剩餘的報告，釋放偵測器
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+    return service.stats()
+
+async def serve(host='127.0.0.1', port=9000, unix_path=None, queue_size=64, max_batch=65536):
+    """啟動TCP或Unix socket服務直到被中斷"""
+    def handler(reader, writer):
+        return handle_connection(reader, writer, queue_size, max_batch)
+
+    if unix_path is not None:
+        server = await asyncio.start_unix_server(handler, path=unix_path)
+    else:
+        server = await asyncio.start_server(handler, host, port)
+    async with server:
+        await server.serve_forever()
+
+async def send_reports(T, Rxlev, NUM_BS, host='127.0.0.1', port=9000, unix_path=None, speedup=0, ue_block=1024,
+                       on_alert=None):
+    """
+    將重播的報告送到服務並接收警示
+
+    Returns:
+        dict: 服務回傳的統計結果
+    """
+    if unix_path is not None:
+        reader, writer = await asyncio.open_unix_connection(unix_path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    num_ue, _, num_stations = Rxlev.shape
+    writer.write((json.dumps({'num_ue': num_ue, 'NUM_BS': NUM_BS, 'num_stations': num_stations}) + '\n').encode())
+
+    async def sink(records):
+        writer.write(FRAME_HEADER.pack(len(records)) + records.tobytes())
+        await writer.drain()
+
+    async def receive():
+        async for line in reader:
+            message = json.loads(line)
+            if message.get('type') == 'stats':
+                return message
+            if on_alert is not None:
+                on_alert(message)
+
+    receiver = asyncio.create_task(receive())
+    await replay_reports(sink, T, Rxlev, speedup, ue_block)
+    writer.write(FRAME_HEADER.pack(0))
+    await writer.drain()
+    stats = await receiver
+    writer.close()
+    await writer.wait_closed()
+    return stats
+
+async def run_local(T, Rxlev, NUM_BS, transport='queue', speedup=0, ue_block=1024, queue_size=64,
+                    max_batch=65536, port=9000, unix_path='/tmp/rogue_bs_ingest.sock'):
+    """
+    在同一個程序內啟動服務與負載產生器並回傳統計結果
+
+    Args:
+        transport: 'queue' (程序內佇列)、'tcp' 或 'unix'
+    """
+    if transport == 'queue':
+        num_ue, _, num_stations = Rxlev.shape
+        service = IngestService(num_ue, NUM_BS, num_stations, queue_size=queue_size, max_batch=max_batch)
+        worker = asyncio.create_task(service.run())
+        await replay_reports(service.submit, T, Rxlev, speedup, ue_block)
+        await service.close()
+        await worker
+        return service.stats()
+
+    def handler(reader, writer):
+        return handle_connection(reader, writer, queue_size, max_batch)
+
+    if transport == 'unix':
+        server = await asyncio.start_unix_server(handler, path=unix_path)
+    else:
+        server = await asyncio.start_server(handler, '127.0.0.1', port)
+    async with server:
+        return await send_reports(T, Rxlev, NUM_BS, port=port, speedup=speedup, ue_block=ue_block,
+                                  unix_path=unix_path if transport == 'unix' else None)
+
+def print_stats(stats):
+    print(f"報告 {stats['reports']}，批次 {stats['batches']} (平均 {stats['mean_batch']:.0f} 筆)，"
+          f"警示 {stats['alerts']}，{stats['reports_per_s']:.0f} 筆/秒")
+    for name in ('decision_latency', 'alert_latency'):
+        latency = stats[name]
+        if latency['p50_ms'] is not None:
+            print(f"{name}: p50 {latency['p50_ms']:.2f} ms, p99 {latency['p99_ms']:.2f} ms")
+    print(f"佇列最大深度 {stats['max_queue_depth']}/{stats['queue_size']}，"
+          f"背壓等待 {stats['blocked_submits']} 次共 {stats['blocked_seconds']:.3f} 秒")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="量測報告接收服務與負載產生器")
+    parser.add_argument('mode', choices=['bench', 'serve', 'load'],
+                        help="bench: 同一程序內執行服務與負載；serve: 只啟動服務；load: 只送出負載")
+    parser.add_argument('--transport', choices=['queue', 'tcp', 'unix'], default='queue')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--unix-path', default='/tmp/rogue_bs_ingest.sock')
+    parser.add_argument('--num-ue', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=60, help="重播的模擬時間(秒)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--speedup', type=float, default=0, help="相對模擬時間的加速倍數，0表示盡快送出")
+    parser.add_argument('--ue-block', type=int, default=1024, help="每個報告區塊的UE數量")
+    parser.add_argument('--queue-size', type=int, default=64)
+    parser.add_argument('--max-batch', type=int, default=65536)
+    parser.add_argument('--attack', default='10:40', help="攻擊時間區間 start:end (秒)")
+    args = parser.parse_args()
+
+    if args.mode == 'serve':
+        asyncio.run(serve(args.host, args.port, args.unix_path if args.transport == 'unix' else None,
+                          args.queue_size, args.max_batch))
+    else:
+        config = SystemConfig(seed=args.seed, NUM_UE=args.num_ue)
+        dt = config.T[1] - config.T[0]
+        config.T = np.arange(int(round(args.duration / dt)) + 1) * dt
+        attack = tuple(float(v) for v in args.attack.split(':'))
+        T, Rxlev, NUM_BS = simulate_reports(config, [attack])
+        if args.mode == 'bench':
+            stats = asyncio.run(run_local(T, Rxlev, NUM_BS, args.transport, args.speedup, args.ue_block,
+                                          args.queue_size, args.max_batch, args.port, args.unix_path))
+        else:
+            stats = asyncio.run(send_reports(T, Rxlev, NUM_BS, args.host, args.port,
+                                             args.unix_path if args.transport == 'unix' else None,
+                                             args.speedup, args.ue_block))
+        print_stats(stats)
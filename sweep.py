@@ -0,0 +1,235 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from config import SystemConfig
+from instrumentation import StageProfiler
+
+# 切換參數：只影響切換階段，同一情境的所有組合在同一組信號上一次評估
+HANDOVER_KEYS = ('handover_threshold', 'handover_window', 'min_handover_interval')
+# 切換參數的預設值，與 run_scenario 相同
+HANDOVER_DEFAULTS = {'handover_threshold': 3, 'handover_window': 1.0, 'min_handover_interval': 2.0}
+# 傳給 run_scenario 的參數，其餘參數都視為 SystemConfig 的覆寫值
+SCENARIO_KEYS = ('attack_periods',) + HANDOVER_KEYS
+
+def expand_grid(grid, repeats=1):
+    """
+    展開參數網格為每一次執行的參數
+
+    Args:
+        grid: 參數網格，例如 {'Pt_rbs': [20, 25], 'NUM_UE': [1, 10]}
+        repeats: 每組參數重複執行的次數(使用不同種子)
+
+    Returns:
+        list[dict]: 每次執行的參數，含 repeat 索引
+    """
+    names = sorted(grid)
+    runs = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        for repeat in range(repeats):
+            run = dict(zip(names, values))
+            run['repeat'] = repeat
+            runs.append(run)
+    return runs
+
+def to_jsonable(value):
+    """將numpy陣列與tuple轉為可序列化的JSON型別"""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def run_key(params, base_seed=0):
+    """以參數內容與主種子計算每次執行的識別碼，兩者不變即可續跑"""
+    text = json.dumps(to_jsonable(dict(params, base_seed=base_seed)), sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+def scenario_params(params):
+    """去掉切換參數後的情境參數，同一組執行共用"""
+    return {k: v for k, v in params.items() if k not in HANDOVER_KEYS}
+
+def group_seed(params, base_seed=0):
+    """
+    由主種子與情境參數的雜湊衍生一組情境的 SeedSequence
+
+    種子只取決於參數內容，與情境在網格中的位置無關，增減網格的值不會改變
+    其他情境的種子，已存檔的結果仍然有效。
+    """
+    digest = hashlib.sha1(json.dumps(to_jsonable(scenario_params(params)), sort_keys=True).encode('utf-8')).digest()
+    spawn_key = tuple(int.from_bytes(digest[i:i + 4], 'little') for i in range(0, 16, 4))
+    return np.random.SeedSequence(base_seed, spawn_key=spawn_key)
+
+def build_config(params, seed_seq):
+    """
+    由執行參數建立 SystemConfig
+
+    duration (秒) 會以預設時間間隔重建時間序列；seed 若有指定則取代
+    SeedSequence 衍生的種子。
+    """
+    overrides = {k: v for k, v in params.items()
+                 if k not in SCENARIO_KEYS and k not in ('repeat', 'seed', 'duration')}
+    seed = params.get('seed', seed_seq)
+    config = SystemConfig(seed=seed, **overrides)
+    if 'duration' in params:
+        dt = config.T[1] - config.T[0]
+        config.T = np.linspace(0, params['duration'], int(round(params['duration'] / dt)) + 1)
+    return config
+
+def group_runs(runs):
+    """
+    將只有切換參數不同的執行分為一組，同一組共用UE移動與信號計算
+
+    Returns:
+        list[list[dict]]: 每組的執行參數，依第一次出現的順序
+    """
+    groups = {}
+    for params in runs:
+        groups.setdefault(run_key(scenario_params(params)), []).append(params)
+    return list(groups.values())
+
+def run_group(runs, seed_seq, profile=False):
+    """
+    在工作程序中執行一組情境(不繪圖)：UE移動與信號只計算一次，
+    所有切換參數組合以 run_handover_sweep 一次評估
+
+    Args:
+        runs: 只有切換參數不同的執行參數列表
+        seed_seq: 此組情境專屬的 np.random.SeedSequence
+        profile: 是否記錄各階段的牆鐘時間 (stage_<階段>_s 欄位，由同一組的執行共用)
+
+    Returns:
+        list[dict]: 每次執行的統計結果，順序與 runs 相同
+    """
+    from main import ATTACK_PERIODS, run_handover_sweep
+
+    params = runs[0]
+    config = build_config(params, seed_seq)
+    profiler = StageProfiler(enabled=profile, trace_memory=False)
+    values = {key: sorted({run.get(key, default) for run in runs}) for key, default in HANDOVER_DEFAULTS.items()}
+    sweep = run_handover_sweep(
+        config,
+        handover_thresholds=values['handover_threshold'],
+        handover_windows=values['handover_window'],
+        min_handover_intervals=values['min_handover_interval'],
+        attack_periods=params.get('attack_periods', ATTACK_PERIODS),
+        profiler=profiler)
+
+    shared = {f'stage_{stage}_s': seconds for stage, seconds in profiler.stage_times().items()}
+    shared['seed_entropy'] = str(seed_seq.entropy)
+    shared['spawn_key'] = list(seed_seq.spawn_key)
+    results = []
+    for run in runs:
+        # 網格中對應此次執行參數的那一組
+        match = np.ones(len(sweep['handover_threshold']), dtype=bool)
+        for key, default in HANDOVER_DEFAULTS.items():
+            match &= sweep[key] == run.get(key, default)
+        index = np.argmax(match)
+        result = {
+            'num_handovers': int(sweep['num_handovers'][index]),
+            'rogue_fraction': float(sweep['rogue_fraction'][index]),
+            'ue_captured_fraction': float(sweep['ue_captured_fraction'][index]),
+            'mean_time_to_first_rogue': float(sweep['mean_time_to_first_rogue'][index]),
+            'mean_rogue_time': float(sweep['mean_rogue_time'][index])
+        }
+        results.append(dict(result, **shared))
+    return results
+
+def write_json_atomic(path, data):
+    """先寫入暫存檔再改名，中斷時不會留下不完整的結果"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(to_jsonable(data), f)
+    os.replace(tmp_path, path)
+
+def collect_results(runs, run_dir, base_seed=0):
+    """
+    將每次執行的結果整理成欄位式輸出
+
+    Returns:
+        dict[str, np.ndarray]: 每個欄位一個陣列；非純量參數以JSON字串儲存
+    """
+    records = []
+    for params in runs:
+        path = os.path.join(run_dir, f'{run_key(params, base_seed)}.json')
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                records.append(json.load(f))
+
+    columns = {}
+    names = sorted({name for record in records for name in record})
+    for name in names:
+        values = [record.get(name) for record in records]
+        if all(isinstance(v, (int, float, bool)) and v is not None for v in values):
+            columns[name] = np.array(values)
+        else:
+            columns[name] = np.array([json.dumps(v) for v in values])
+    return columns
+
+def run_sweep(grid, output_dir='result/sweep', max_workers=None, base_seed=0, repeats=1, profile=False):
+    """
+    以多程序平行執行參數網格內所有情境的Monte Carlo模擬
+
+    只有切換參數不同的執行分為一組，每組的種子由 base_seed 與情境參數的雜湊衍生，
+    同一組在相同的信號上評估所有切換參數；結果依參數與 base_seed 的雜湊個別存檔，
+    再次執行時跳過已完成的結果，最後彙整為一個欄位式 .npz 檔。
+
+    Args:
+        grid: 參數網格，鍵可為 SystemConfig 屬性(Pt_rbs、Gt_rbs、NUM_UE、rbs_coords等)、
+            duration、seed、attack_periods、handover_threshold、handover_window(秒)、
+            min_handover_interval(秒)
+        output_dir: 輸出目錄
+        max_workers: 工作程序數量，None表示使用所有CPU核心
+        base_seed: 衍生各次執行種子的主種子
+        repeats: 每組參數重複執行的次數
+        profile: 是否在每次執行的結果中記錄各階段的牆鐘時間
+
+    Returns:
+        dict[str, np.ndarray]: 欄位式彙整結果
+    """
+    run_dir = os.path.join(output_dir, 'runs')
+    os.makedirs(run_dir, exist_ok=True)
+
+    runs = expand_grid(grid, repeats)
+    groups = group_runs(runs)
+    seed_seqs = [group_seed(group[0], base_seed) for group in groups]
+
+    # 一組中只要有未完成的執行就重新計算整組，切換參數的評估成本很低
+    pending = [(group, seed_seq) for group, seed_seq in zip(groups, seed_seqs)
+               if not all(os.path.exists(os.path.join(run_dir, f'{run_key(params, base_seed)}.json'))
+                       for params in group)]
+    num_pending = sum(len(group) for group, _ in pending)
+    print(f"共 {len(runs)} 次執行 ({len(groups)} 組情境)，已完成 {len(runs) - num_pending} 次")
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(run_group, group, seed_seq, profile): group for group, seed_seq in pending}
+        for done, future in enumerate(as_completed(futures), 1):
+            group = futures[future]
+            for params, result in zip(group, future.result()):
+                write_json_atomic(os.path.join(run_dir, f'{run_key(params, base_seed)}.json'), dict(params, **result))
+            print(f"[{done}/{len(pending)}] {run_key(group[0], base_seed)} 等 {len(group)} 次執行完成")
+
+    columns = collect_results(runs, run_dir, base_seed)
+    np.savez(os.path.join(output_dir, 'sweep_results.npz'), **columns)
+    return columns
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte Carlo 參數掃描")
+    parser.add_argument('grid', help="參數網格JSON檔，例如 {\"Pt_rbs\": [20, 25], \"NUM_UE\": [1, 10]}")
+    parser.add_argument('--output-dir', default='result/sweep')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeats', type=int, default=1)
+    parser.add_argument('--profile', action='store_true', help="記錄每次執行各階段的時間")
+    args = parser.parse_args()
+
+    with open(args.grid, encoding='utf-8') as f:
+        grid = json.load(f)
+    run_sweep(grid, args.output_dir, args.workers, args.seed, args.repeats, args.profile)
@@ -0,0 +1,141 @@
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+
+# 儲存圖檔的解析度
+SAVE_DPI = 300
+
+def use_headless_backend():
+    """切換到不需要視窗的 Agg 後端，只輸出圖檔時繪圖最快"""
+    if plt.get_backend().lower() != 'agg':
+        plt.switch_backend('Agg')
+
+def axes_pixel_width(ax, dpi=SAVE_DPI):
+    """座標軸在輸出圖檔中的寬度(像素)"""
+    return max(int(ax.bbox.width / ax.figure.dpi * dpi), 1)
+
+def m4_indices(x, y, num_buckets, x_range=None, breaks=None):
+    """
+    M4 抽樣：每個像素寬的區間只保留第一點、最後一點、最小值與最大值
+
+    畫成折線時與原始序列在該解析度下的外觀相同。
+
+    Args:
+        x: 時間 (N,)，需遞增
+        y: 數值 (N,)
+        num_buckets: 區間數量(通常為像素寬度)
+        x_range: 區間對應的x範圍，None表示使用 x 的範圍
+        breaks: 額外的切點 (N,) 布林，True 的位置開始新區間(例如顏色改變處)
+
+    Returns:
+        np.ndarray: 保留的索引，遞增排序
+    """
+    n = len(x)
+    if n <= 4 * num_buckets:
+        return np.arange(n)
+
+    x0, x1 = x_range if x_range is not None else (x[0], x[-1])
+    bucket = np.floor((x - x0) / max(x1 - x0, 1e-12) * num_buckets).astype(np.int64)
+    new_group = np.empty(n, dtype=bool)
+    new_group[0] = True
+    new_group[1:] = bucket[1:] != bucket[:-1]
+    if breaks is not None:
+        new_group |= breaks
+    starts = np.nonzero(new_group)[0]
+    ends = np.append(starts[1:], n) - 1
+
+    group = np.cumsum(new_group) - 1
+    idx = np.arange(n)
+    group_min = np.minimum.reduceat(y, starts)
+    group_max = np.maximum.reduceat(y, starts)
+    arg_min = np.minimum.reduceat(np.where(y == group_min[group], idx, n), starts)
+    arg_max = np.minimum.reduceat(np.where(y == group_max[group], idx, n), starts)
+
+    keep = np.concatenate([starts, ends, arg_min, arg_max])
+    return np.unique(keep[keep < n])
+
+def decimated_plot(ax, x, y, num_buckets=None, x_range=None, **kwargs):
+    """以M4抽樣後再畫折線，參數同 ax.plot"""
+    if num_buckets is None:
+        num_buckets = axes_pixel_width(ax)
+    idx = m4_indices(x, y, num_buckets, x_range)
+    return ax.plot(x[idx], y[idx], **kwargs)
+
+def colored_line_collection(ax, x, y, flag, num_buckets=None, x_range=None,
+                            colors=('blue', 'red'), linestyles=('-', '--'), alpha=0.7):
+    """
+    以 LineCollection 畫出依旗標分色的折線 (每種顏色一個物件，而非每段一個)
+
+    每段線的顏色與線型由終點的旗標決定，與逐段 ax.plot 相同；抽樣時在旗標
+    改變處切開，顏色邊界不會因抽樣而移動。
+
+    Args:
+        ax: matplotlib 座標軸
+        x: 時間 (N,)
+        y: 數值 (N,)
+        flag: 每個點的旗標 (N,)，False 使用 colors[0]，True 使用 colors[1]
+        num_buckets: 抽樣區間數量，None表示使用座標軸像素寬度
+        x_range: 抽樣區間對應的x範圍
+        colors: (False, True) 的顏色
+        linestyles: (False, True) 的線型
+        alpha: 透明度
+
+    Returns:
+        list[LineCollection]: 旗標為 False 與 True 的線段
+    """
+    if num_buckets is None:
+        num_buckets = axes_pixel_width(ax)
+    flag = np.asarray(flag, dtype=bool)
+    breaks = np.zeros(len(flag), dtype=bool)
+    breaks[1:] = flag[1:] != flag[:-1]
+    idx = m4_indices(x, y, num_buckets, x_range, breaks)
+
+    points = np.column_stack([x[idx], y[idx]])
+    segments = np.stack([points[:-1], points[1:]], axis=1)
+    segment_flag = flag[idx[1:]]
+
+    collections = []
+    for value in (False, True):
+        collection = LineCollection(segments[segment_flag == value],
+                                    colors=colors[int(value)],
+                                    linestyles=linestyles[int(value)],
+                                    alpha=alpha)
+        ax.add_collection(collection)
+        collections.append(collection)
+    ax.autoscale_view()
+    return collections
+
+def decimated_scatter(ax, x, y, flag, num_buckets=None, x_range=None, colors=('blue', 'red'), s=2, alpha=0.5):
+    """
+    以M4抽樣後再畫依旗標分色的散點 (每種顏色一次 scatter，而非逐點指定顏色)
+
+    與 colored_line_collection 相同在旗標改變處切開區間，每個像素寬保留的點
+    在該解析度下與原始散點的外觀相同。
+
+    Args:
+        ax: matplotlib 座標軸
+        x: 時間 (N,)
+        y: 數值 (N,)
+        flag: 每個點的旗標 (N,)，False 使用 colors[0]，True 使用 colors[1]
+        num_buckets: 抽樣區間數量，None表示使用座標軸像素寬度
+        x_range: 抽樣區間對應的x範圍
+        colors: (False, True) 的顏色
+        s: 點的大小
+        alpha: 透明度
+
+    Returns:
+        list[PathCollection]: 旗標為 False 與 True 的散點
+    """
+    if num_buckets is None:
+        num_buckets = axes_pixel_width(ax)
+    flag = np.asarray(flag, dtype=bool)
+    breaks = np.zeros(len(flag), dtype=bool)
+    breaks[1:] = flag[1:] != flag[:-1]
+    idx = m4_indices(x, y, num_buckets, x_range, breaks)
+
+    collections = []
+    for value in (False, True):
+        keep = idx[flag[idx] == value]
+        if len(keep):
+            collections.append(ax.scatter(x[keep], y[keep], c=colors[int(value)], s=s, alpha=alpha))
+    return collections
@@ -1,15 +1,41 @@
+import os
+
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
-from matplotlib.lines import Line2D
+from scenario.handover import (simulate_handover, simulate_handover_candidates, simulate_handover_reports,
+                               sweep_handover)
+from scenario.signal_calculation import calculate_Rxlev
+from scenario.spatial_index import candidate_stations
+from scenario.dataset import DatasetWriter, export_csv
+from scenario.attack_schedule import AttackSchedule
+from instrumentation import NULL_PROFILER
 
-def plot_all_bs_signal(T, Rxlev_bs, Rxlev_rbs, NUM_UE, NUM_BS, NUM_RBS):
-    plt.figure(figsize=(12, 8))
-    ax = plt.gca()
+# 圖檔預設輸出目錄；matplotlib 只在繪圖時才載入，不繪圖時不需付出匯入成本
+RESULT_DIR = 'result'
+
+def draw_all_bs_signal(ax, T, Rxlev_bs, Rxlev_rbs, NUM_UE, NUM_BS, NUM_RBS, label=True, fast=True, x_range=None):
+    """
+    在指定座標軸上繪製所有基站信號，可分區塊多次呼叫
+
+    Args:
+        ax: matplotlib 座標軸
+        T: 時間序列
+        Rxlev_bs: 合法基站信號強度 (NUM_UE, T, NUM_BS)
+        Rxlev_rbs: 惡意基站信號強度 (NUM_UE, T, NUM_RBS)
+        NUM_UE: UE數量
+        NUM_BS: 合法基站數量
+        NUM_RBS: 惡意基站數量
+        label: 是否加入圖例標籤(分區塊繪製時只在第一個區塊加入)
+        fast: 是否先以M4抽樣到像素寬度再繪製
+        x_range: 抽樣區間對應的時間範圍，分區塊繪製時傳入整段時間範圍
+    """
+    import matplotlib.pyplot as plt
+    from visualization.fast_render import decimated_plot
+
+    def plot_line(x, y, **kwargs):
+        if fast:
+            return decimated_plot(ax, x, y, x_range=x_range, **kwargs)
+        return ax.plot(x, y, **kwargs)
 
-    # 為每個UE設置顏色
-    ue_colors = plt.cm.rainbow(np.linspace(0, 1, NUM_UE))
     bs_colors = plt.cm.viridis(np.linspace(0, 1, NUM_BS))  # 合法基站用綠色系
     rbs_colors = plt.cm.Reds(np.linspace(0.3, 1, NUM_RBS))  # 惡意基站用紅色系
 
@@ -17,18 +43,22 @@ def plot_all_bs_signal(T, Rxlev_bs, Rxlev_rbs, NUM_UE, NUM_BS, NUM_RBS):
     for ue in range(NUM_UE):
         # 繪製合法基站信號
         for bs in range(NUM_BS):
-            ax.plot(T, Rxlev_bs[ue, :, bs],
-                    color=bs_colors[bs],
-                    alpha=0.7,
-                    label=f'BS{bs+1}')
+            plot_line(T, Rxlev_bs[ue, :, bs],
+                      color=bs_colors[bs],
+                      alpha=0.7,
+                      label=f'BS{bs+1}' if label else None)
 
         # 繪製惡意基站信號
         for rbs in range(NUM_RBS):
-            ax.plot(T, Rxlev_rbs[ue, :, rbs],
-                    color=rbs_colors[rbs],
-                    alpha=0.7,
-                    linestyle='--',
-                    label=f'RBS{rbs+1}')
+            plot_line(T, Rxlev_rbs[ue, :, rbs],
+                      color=rbs_colors[rbs],
+                      alpha=0.7,
+                      linestyle='--',
+                      label=f'RBS{rbs+1}' if label else None)
+
+def finish_all_bs_signal(ax, output_dir=RESULT_DIR):
+    """設定所有基站信號圖的屬性並儲存到 output_dir"""
+    import matplotlib.pyplot as plt
 
     ax.set_title("RSRP from All Base Stations")
     ax.set_xlabel("Time (s)")
@@ -36,9 +66,195 @@ def plot_all_bs_signal(T, Rxlev_bs, Rxlev_rbs, NUM_UE, NUM_BS, NUM_RBS):
     ax.grid(True)
     ax.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
     plt.tight_layout()
-    plt.savefig('result/RSRP_from_All_Base_Stations.png', bbox_inches='tight', dpi=300)
+    os.makedirs(output_dir, exist_ok=True)
+    plt.savefig(os.path.join(output_dir, 'RSRP_from_All_Base_Stations.png'), bbox_inches='tight', dpi=300)
+
+def plot_all_bs_signal(T, Rxlev_bs, Rxlev_rbs, NUM_UE, NUM_BS, NUM_RBS, fast=True, output_dir=RESULT_DIR):
+    import matplotlib.pyplot as plt
+    from visualization.fast_render import use_headless_backend
+
+    if fast:
+        use_headless_backend()
+    plt.figure(figsize=(12, 8))
+    ax = plt.gca()
+    draw_all_bs_signal(ax, T, Rxlev_bs, Rxlev_rbs, NUM_UE, NUM_BS, NUM_RBS, fast=fast)
+    finish_all_bs_signal(ax, output_dir)
+
+def draw_attack_periods(ax, attack_periods):
+    """標示攻擊區間"""
+    if attack_periods is None:
+        return
+    first_attack = True
+    ymin, ymax = -100, -30  # 設定固定的y軸範圍
+    for start_time, end_time in attack_periods:
+        ax.axvspan(start_time, end_time, 
+                   color='red', alpha=0.1,
+                   label='Attack Period' if first_attack else None)
+        ax.text((start_time + end_time)/2, ymax, 
+                f'Attack\n{end_time-start_time}s',
+                horizontalalignment='center',
+                verticalalignment='top')
+        first_attack = False
+
+def draw_handover_signal(ax, T, handover_signal, serving, handover, NUM_BS, annotate_first=True,
+                         fast=True, x_range=None):
+    """
+    在指定座標軸上繪製服務基站信號與切換標記，可分區塊多次呼叫
+
+    Args:
+        ax: matplotlib 座標軸
+        T: 時間序列
+        handover_signal: 服務基站信號強度 (NUM_UE, T)
+        serving: 服務基站索引 (NUM_UE, T)
+        handover: 切換事件 (NUM_UE, T)
+        NUM_BS: 合法基站數量
+        annotate_first: 是否標記第一個時間點的服務基站
+        fast: 是否以抽樣後的 LineCollection 取代逐段繪製
+        x_range: 抽樣區間對應的時間範圍，分區塊繪製時傳入整段時間範圍
+    """
+    from visualization.fast_render import colored_line_collection, decimated_scatter
+
+    for ue in range(serving.shape[0]):
+        is_rogue = serving[ue] >= NUM_BS
+
+        # 標記第一個點與每次切換
+        marks = np.nonzero(handover[ue])[0]
+        if annotate_first:
+            marks = np.concatenate([[0], marks])
+        for t in marks:
+            bs_name = f'RBS{serving[ue, t]-NUM_BS+1}' if is_rogue[t] else f'BS{serving[ue, t]+1}'
+            color = 'purple' if is_rogue[t] else 'orange'
+            ax.annotate(bs_name,
+                        (T[t], handover_signal[ue, t]),
+                        textcoords="offset points",
+                        xytext=(0, 20),
+                        ha='center',
+                        fontsize=12,
+                        color=color,
+                        weight='bold',
+                        arrowprops=dict(arrowstyle="->", color=color))
+
+        # 繪製連接線和散點
+        if fast:
+            colored_line_collection(ax, T, handover_signal[ue], is_rogue, x_range=x_range)
+            decimated_scatter(ax, T, handover_signal[ue], is_rogue, x_range=x_range)
+        else:
+            for i in range(1, len(T)):
+                color = 'red' if is_rogue[i] else 'blue'
+                linestyle = '--' if is_rogue[i] else '-'
+                ax.plot([T[i-1], T[i]], 
+                        [handover_signal[ue, i-1], handover_signal[ue, i]],
+                        color=color, linestyle=linestyle, alpha=0.7)
+            ax.scatter(T, handover_signal[ue],
+                       c=np.where(is_rogue, 'red', 'blue'),
+                       s=2, alpha=0.5)
+
+def finish_handover_signal(ax, output_dir=RESULT_DIR):
+    """設定切換情況圖的屬性並儲存到 output_dir"""
+    import matplotlib.pyplot as plt
+    import matplotlib.patches as mpatches
+    from matplotlib.lines import Line2D
+
+    ax.set_title("Multiple Rogue BS Attacks RSRP")
+    ax.set_xlabel("Time (s)")
+    ax.set_ylabel("RSRP (dBm)")
+    ax.grid(True)
+
+    # 添加圖例
+    legend_elements = [
+        Line2D([0], [0], color='blue', label='Legitimate BS', alpha=0.7),
+        Line2D([0], [0], color='red', linestyle='--', label='Rogue BS', alpha=0.7),
+        mpatches.Patch(color='red', alpha=0.1, label='Attack Period')
+    ]
+    ax.legend(handles=legend_elements, bbox_to_anchor=(1.05, 1), loc='upper left')
+    
+    plt.tight_layout()
+    os.makedirs(output_dir, exist_ok=True)
+    plt.savefig(os.path.join(output_dir, 'Multiple_Rogue_bs_attacks_RSRP.png'), bbox_inches='tight', dpi=300)
+
+def plot_handover_signal(T, all_signals, serving, handover, NUM_BS, attack_periods=None, fast=True,
+                         output_dir=RESULT_DIR):
+    """
+    繪製服務基站信號與切換情況，使用切換引擎的輸出
+
+    Args:
+        T: 時間序列
+        all_signals: 所有基站信號強度 (NUM_UE, T, NUM_BS + NUM_RBS)
+        serving: 服務基站索引 (NUM_UE, T)
+        handover: 切換事件 (NUM_UE, T)
+        NUM_BS: 合法基站數量
+        attack_periods: 攻擊時間區間列表
+        fast: 是否使用快速繪圖(Agg後端、抽樣、LineCollection)
+        output_dir: 圖檔輸出目錄
+    """
+    import matplotlib.pyplot as plt
+    from visualization.fast_render import use_headless_backend
+
+    if fast:
+        use_headless_backend()
+    plt.figure(figsize=(12, 8))
+    ax2 = plt.gca()
+    draw_attack_periods(ax2, attack_periods)
+    handover_signal = np.take_along_axis(all_signals, serving[:, :, np.newaxis], axis=2)[:, :, 0]
+    draw_handover_signal(ax2, T, handover_signal, serving, handover, NUM_BS, fast=fast)
+    finish_handover_signal(ax2, output_dir)
+
+def clip_attack_periods(T, attack_periods):
+    """確保攻擊時間在範圍內"""
+    if attack_periods is None:
+        return None
+    return [(start, min(end, T[-1])) for start, end in attack_periods if start < T[-1]]
+
+def attack_mask(T_block, attack_periods, t_end):
+    """
+    計算時間點是否位於攻擊區間內
+
+    Args:
+        T_block: 時間點 (B,)
+        attack_periods: 已裁切的攻擊時間區間列表
+        t_end: 整個模擬的最後時間點，結束於此的攻擊包含最後一個時間點
+
+    Returns:
+        np.ndarray: 布林遮罩 (B,)
+    """
+    mask = np.zeros(len(T_block), dtype=bool)
+    for start_time, end_time in attack_periods or []:
+        mask |= (T_block >= start_time) & ((T_block < end_time) | (end_time >= t_end))
+    return mask
+
+def resolve_attack_schedule(T, attack_periods, attack_schedule, NUM_RBS):
+    """未指定 attack_schedule 時由 attack_periods 建立(所有惡意基站同時攻擊所有UE)，並裁切到 T 的範圍"""
+    if attack_schedule is None:
+        attack_schedule = AttackSchedule.from_periods(attack_periods, NUM_RBS)
+    return attack_schedule.clip(T)
+
+def build_dataset_rows(T, Rxlev_bs, attack_rbs, serving, labels):
+    """
+    組合資料集列：time, connected_bs, BS1..BSn, RBS1..RBSm, label，依UE排列
+
+    Args:
+        T: 時間點 (B,)
+        Rxlev_bs: 合法基站信號強度 (NUM_UE, B, NUM_BS)
+        attack_rbs: 攻擊區間的惡意基站信號強度 (NUM_UE, B, NUM_RBS)
+        serving: 服務基站索引 (NUM_UE, B)
+        labels: 是否連上惡意基站 (NUM_UE, B)
 
-def rogue_bs_data(T, Rxlev_bs, Rxlev_rbs, NUM_UE, NUM_BS, NUM_RBS, attack_periods=None, handover_threshold=3, plot=True):
+    Returns:
+        np.ndarray: 資料集 (NUM_UE * B, NUM_BS + NUM_RBS + 3)
+    """
+    num_ue, num_steps, num_bs = Rxlev_bs.shape
+    num_rbs = attack_rbs.shape[2]
+    rows = np.zeros((num_ue * num_steps, num_bs + num_rbs + 3))
+    rows[:, 0] = np.tile(T, num_ue)
+    rows[:, 1] = serving.ravel() + 1
+    rows[:, 2:2 + num_bs] = Rxlev_bs.reshape(-1, num_bs)
+    rows[:, 2 + num_bs:2 + num_bs + num_rbs] = attack_rbs.reshape(-1, num_rbs)
+    rows[:, -1] = labels.ravel()
+    return rows
+
+def rogue_bs_data(T, Rxlev_bs, Rxlev_rbs, NUM_UE, NUM_BS, NUM_RBS, attack_periods=None, handover_threshold=3, plot=True,
+                  time_window=10, min_time_between_handovers=20, dataset_path='result/rogue_bs_dataset',
+                  csv_path=None, fast_plot=True, output_dir=RESULT_DIR, profiler=None, attack_schedule=None):
     """
     產生多次攻擊的惡意基地台數據
     
@@ -52,175 +268,375 @@ def rogue_bs_data(T, Rxlev_bs, Rxlev_rbs, NUM_UE, NUM_BS, NUM_RBS, attack_period
         attack_periods: 攻擊時間區間列表，例如: [(1201, 1320), (4201, 4320)]
         handover_threshold: 切換閾值
         plot: 是否繪圖
+        time_window: 平均信號的時間窗口(時間步數)
+        min_time_between_handovers: 兩次切換的最小間隔(時間步數)
+        dataset_path: 欄位式資料集輸出目錄，None表示不輸出
+        csv_path: 另外匯出CSV的路徑，None表示不匯出(需要 dataset_path)
+        fast_plot: 是否使用快速繪圖(Agg後端、M4抽樣、LineCollection)
+        output_dir: 圖檔輸出目錄
+        profiler: StageProfiler，分別量測 handover、plot_rsrp、dataset_io 階段，None表示不量測
+        attack_schedule: AttackSchedule，指定各惡意基站的攻擊區間、功率爬升與目標UE，
+            指定時忽略 attack_periods
+    """
+    if csv_path is not None and dataset_path is None:
+        raise ValueError("匯出CSV需要指定 dataset_path")
+    profiler = profiler or NULL_PROFILER
+    work = NUM_UE * len(T)
+
+    with profiler.stage('handover', work):
+        # 產生攻擊區間的RBS信號，其餘時間為-100dBm
+        schedule = resolve_attack_schedule(T, attack_periods, attack_schedule, NUM_RBS)
+        attack_rbs = schedule.apply(Rxlev_rbs, T, num_ue=NUM_UE)
+
+        # 基站切換
+        all_signals = np.concatenate([Rxlev_bs, attack_rbs], axis=2)
+        serving, handover, labels = simulate_handover(
+            all_signals, NUM_BS,
+            handover_threshold=handover_threshold,
+            time_window=time_window,
+            min_time_between_handovers=min_time_between_handovers)
+
+        # 準備資料集
+        dataset = build_dataset_rows(T, Rxlev_bs, attack_rbs, serving, labels)
+        profiler.describe(all_signals=all_signals, serving=serving, dataset=dataset)
+
+    if plot:
+        with profiler.stage('plot_rsrp', work):
+            # 畫第一張圖：所有基地台信號
+            plot_all_bs_signal(T, Rxlev_bs, Rxlev_rbs, NUM_UE, NUM_BS, NUM_RBS, fast=fast_plot,
+                               output_dir=output_dir)
+            # 創建第二張圖：切換情況
+            plot_handover_signal(T, all_signals, serving, handover, NUM_BS, schedule.periods(), fast=fast_plot,
+                                 output_dir=output_dir)
+
+    # 儲存數據集
+    if dataset_path is not None:
+        with profiler.stage('dataset_io', work):
+            with DatasetWriter(dataset_path, NUM_BS, NUM_RBS, NUM_UE) as writer:
+                writer.append(np.arange(NUM_UE), T, serving, Rxlev_bs, attack_rbs, labels)
+            if csv_path is not None:
+                export_csv(dataset_path, csv_path)
+
+    return dataset
+
+def rogue_bs_data_stream(T, Rxlev_blocks, NUM_UE, NUM_BS, NUM_RBS, attack_periods=None, handover_threshold=3,
+                         plot=True, time_window=10, min_time_between_handovers=20, axis='time',
+                         dataset_path='result/rogue_bs_dataset', csv_path=None, fast_plot=True,
+                         output_dir=RESULT_DIR, attack_schedule=None):
     """
-    # 準備資料集
-    total_points = len(T) * NUM_UE
-    num_features = 1 + 1 + NUM_BS + NUM_RBS + 1
-    dataset = np.zeros((total_points, num_features))
+    分區塊產生惡意基地台數據，不需要完整的 (NUM_UE, T, 基站數) 信號矩陣
 
-    # 產生攻擊區間的RBS信號
-    attack_rbs = np.ones_like(Rxlev_rbs) * -100  # 初始化為-100dBm
+    切換狀態在時間區塊之間延續；資料集逐區塊附加到欄位式資料集，ue 欄位
+    標示每一列所屬的UE。繪圖時每個區塊直接畫到同一張圖上。
 
-    # 確保攻擊時間在範圍內
-    if attack_periods is not None:
-        attack_periods = [(start, min(end, T[-1])) for start, end in attack_periods if start < T[-1]]
-        
-        # 在指定的攻擊時間區間設定RBS信號
-        for start_time, end_time in attack_periods:
-            start_idx = np.where(T >= start_time)[0][0]
-            end_idx = np.where(T >= end_time)[0][0] if end_time < T[-1] else len(T)
-            attack_rbs[:, start_idx:end_idx, :] = Rxlev_rbs[:, start_idx:end_idx, :]
+    Args:
+        T: 時間序列
+        Rxlev_blocks: 產生 (block_slice, Rxlev_bs, Rxlev_rbs) 的可迭代物件，
+            例如由兩個 iter_Rxlev_blocks 以 zip 組合
+        NUM_UE: UE數量
+        NUM_BS: 合法基站數量
+        NUM_RBS: 惡意基站數量
+        attack_periods: 攻擊時間區間列表
+        handover_threshold: 切換閾值
+        plot: 是否繪圖
+        time_window: 平均信號的時間窗口(時間步數)
+        min_time_between_handovers: 兩次切換的最小間隔(時間步數)
+        axis: 區塊方向，'time' 或 'ue'，需與 iter_Rxlev_blocks 一致
+        dataset_path: 欄位式資料集輸出目錄
+        csv_path: 另外匯出CSV的路徑，None表示不匯出
+        fast_plot: 是否使用快速繪圖(Agg後端、M4抽樣、LineCollection)
+        output_dir: 圖檔輸出目錄
+        attack_schedule: AttackSchedule，指定時忽略 attack_periods
+
+    Returns:
+        int: 寫入的資料列數
+    """
+    schedule = resolve_attack_schedule(T, attack_periods, attack_schedule, NUM_RBS)
+    writer = DatasetWriter(dataset_path, NUM_BS, NUM_RBS, NUM_UE)
 
     if plot:
-        # 畫第一張圖：所有基地台信號
-        plot_all_bs_signal(T, Rxlev_bs, Rxlev_rbs, NUM_UE, NUM_BS, NUM_RBS)
-        
-        # 創建第二張圖：切換情況
+        import matplotlib.pyplot as plt
+        from visualization.fast_render import use_headless_backend
+
+        if fast_plot:
+            use_headless_backend()
+        plt.figure(figsize=(12, 8))
+        ax = plt.gca()
         plt.figure(figsize=(12, 8))
         ax2 = plt.gca()
-        
-        # 標示攻擊區間
-        if attack_periods is not None:
-            first_attack = True
-            ymin, ymax = -100, -30  # 設定固定的y軸範圍
-            for start_time, end_time in attack_periods:
-                ax2.axvspan(start_time, end_time, 
-                            color='red', alpha=0.1,
-                            label='Attack Period' if first_attack else None)
-                ax2.text((start_time + end_time)/2, ymax, 
-                        f'Attack\n{end_time-start_time}s',
-                        horizontalalignment='center',
-                        verticalalignment='top')
-                first_attack = False
-
-    row_idx = 0
-    for ue in range(NUM_UE):
-        # 初始化：選擇信號最強的基站
-        all_signals_initial = np.concatenate([Rxlev_bs[ue, 0, :], attack_rbs[ue, 0, :]])
-        current_bs = np.argmax(all_signals_initial)
-        is_rogue = current_bs >= NUM_BS
+        draw_attack_periods(ax2, schedule.periods())
 
-        # 追蹤信號
-        handover_signal = [all_signals_initial[current_bs]]
-        bs_type = ['rogue' if is_rogue else 'Legitimate']
+    state = None
+    previous = None
+    first_block = True
+    for block_slice, Rxlev_bs, Rxlev_rbs in Rxlev_blocks:
+        if axis == 'time':
+            T_block = T[block_slice]
+            ue_ids = np.arange(NUM_UE)
+        else:
+            T_block = T
+            ue_ids = np.arange(block_slice.start, block_slice.stop)
+            state = None
+            previous = None
 
-        # 第一個點標記
-        if plot:
-            bs_name = f'RBS{current_bs-NUM_BS+1}' if is_rogue else f'BS{current_bs+1}'
-            color = 'purple' if is_rogue else 'orange'
-            ax2.annotate(bs_name,
-                        (T[0], all_signals_initial[current_bs]),
-                        textcoords="offset points",
-                        xytext=(0, 20),
-                        ha='center',
-                        fontsize=12,
-                        color=color,
-                        weight='bold',
-                        arrowprops=dict(arrowstyle="->", color=color))
+        attack_rbs = schedule.apply(Rxlev_rbs, T_block, ue_ids=ue_ids, num_ue=NUM_UE, t_end=T[-1])
+        all_signals = np.concatenate([Rxlev_bs, attack_rbs], axis=2)
+        serving, handover, labels, state = simulate_handover(
+            all_signals, NUM_BS, handover_threshold, time_window,
+            min_time_between_handovers, state=state, return_state=True)
 
-        signal_history = {bs: [] for bs in range(NUM_BS + NUM_RBS)}
-        time_window = 10
-        last_handover_time = 0
-        min_time_between_handovers = 20
-        
-        # 儲存第一個時間點的數據
-        dataset[row_idx] = [T[0], current_bs + 1] + \
-                        list(Rxlev_bs[ue, 0, :]) + \
-                        [attack_rbs[ue, 0, 0]] + \
-                        [1 if is_rogue else 0]
-        row_idx += 1
-
-        # 處理剩餘時間點
-        for t in range(1, len(T)):
-            all_signals = np.concatenate([Rxlev_bs[ue, t, :], attack_rbs[ue, t, :]])
-            current_signal = all_signals[current_bs]
-
-            # 更新信號歷史
-            for bs in range(NUM_BS + NUM_RBS):
-                signal_history[bs].append(all_signals[bs])
-                if len(signal_history[bs]) > time_window:
-                    signal_history[bs].pop(0)
-
-            # 檢查是否需要切換基站
-            if t - last_handover_time >= min_time_between_handovers:
-                max_signal = current_signal
-                max_bs = current_bs
-
-                for bs in range(NUM_BS + NUM_RBS):
-                    if bs != current_bs:
-                        avg_current_signal = np.mean(signal_history[current_bs])
-                        avg_candidate_signal = np.mean(signal_history[bs])
-
-                        if avg_candidate_signal >= avg_current_signal + handover_threshold:
-                            if avg_candidate_signal > max_signal:
-                                max_signal = avg_candidate_signal
-                                max_bs = bs
-
-                if max_bs != current_bs:
-                    current_bs = max_bs
-                    is_rogue = current_bs >= NUM_BS
-                    last_handover_time = t
-
-                    if plot:
-                        bs_name = f'RBS{current_bs-NUM_BS+1}' if is_rogue else f'BS{current_bs+1}'
-                        color = 'purple' if is_rogue else 'orange'
-                        ax2.annotate(bs_name,
-                                (T[t], all_signals[current_bs]),
-                                textcoords="offset points",
-                                xytext=(0, 20),
-                                ha='center',
-                                fontsize=12,
-                                color=color,
-                                weight='bold',
-                                arrowprops=dict(arrowstyle="->", color=color))
-
-            handover_signal.append(all_signals[current_bs])
-            bs_type.append('rogue' if is_rogue else 'Legitimate')
-
-            # 儲存數據
-            dataset[row_idx] = [T[t], current_bs + 1] + \
-                            list(Rxlev_bs[ue, t, :]) + \
-                            [attack_rbs[ue, t, 0]] + \
-                            [1 if is_rogue else 0]
-            row_idx += 1
+        writer.append(ue_ids, T_block, serving, Rxlev_bs, attack_rbs, labels)
 
         if plot:
-            # 繪製連接線和散點
-            for i in range(1, len(T)):
-                color = 'red' if bs_type[i] == 'rogue' else 'blue'
-                linestyle = '--' if bs_type[i] == 'rogue' else '-'
-                ax2.plot([T[i-1], T[i]], 
-                        [handover_signal[i-1], handover_signal[i]],
-                        color=color, linestyle=linestyle, alpha=0.7)
+            handover_signal = np.take_along_axis(all_signals, serving[:, :, np.newaxis], axis=2)[:, :, 0]
+            current = (T_block, Rxlev_bs, Rxlev_rbs, handover_signal, serving, handover)
+            if previous is not None:
+                # 接上前一個區塊的最後一個時間點，讓線段連續
+                current_plot = [np.concatenate([p[-1:], c]) if c.ndim == 1
+                                else np.concatenate([p[:, -1:], c], axis=1)
+                                for p, c in zip(previous, current)]
+                current_plot[5][:, 0] = False
+            else:
+                current_plot = current
+            draw_all_bs_signal(ax, current_plot[0], current_plot[1], current_plot[2],
+                               len(ue_ids), NUM_BS, NUM_RBS, label=first_block,
+                               fast=fast_plot, x_range=(T[0], T[-1]))
+            draw_handover_signal(ax2, current_plot[0], current_plot[3], current_plot[4], current_plot[5],
+                                 NUM_BS, annotate_first=previous is None,
+                                 fast=fast_plot, x_range=(T[0], T[-1]))
+            previous = current
+        first_block = False
 
-            ax2.scatter(T, handover_signal,
-                    c=['red' if t == 'rogue' else 'blue' for t in bs_type],
-                    s=2, alpha=0.5)
-
-    # 儲存數據集
-    header = ['time', 'connected_bs'] + \
-            [f'BS{i+1}' for i in range(NUM_BS)] + \
-            ['RBS1', 'label']
-    
-    df = pd.DataFrame(dataset, columns=header)
-    df.to_csv('result/rogue_bs_dataset.csv', index=False)
+    writer.close()
+    if csv_path is not None:
+        export_csv(dataset_path, csv_path)
 
     if plot:
-        # 設定圖表屬性
-        ax2.set_title("Multiple Rogue BS Attacks RSRP")
-        ax2.set_xlabel("Time (s)")
-        ax2.set_ylabel("RSRP (dBm)")
-        ax2.grid(True)
-
-        # 添加圖例
-        legend_elements = [
-            Line2D([0], [0], color='blue', label='Legitimate BS', alpha=0.7),
-            Line2D([0], [0], color='red', linestyle='--', label='Rogue BS', alpha=0.7),
-            mpatches.Patch(color='red', alpha=0.1, label='Attack Period')
-        ]
-        ax2.legend(handles=legend_elements, bbox_to_anchor=(1.05, 1), loc='upper left')
-        
-        plt.tight_layout()
-        plt.savefig('result/Multiple_Rogue_bs_attacks_RSRP.png', bbox_inches='tight', dpi=300)
-
-    return dataset
\ No newline at end of file
+        plt.sca(ax)
+        finish_all_bs_signal(ax, output_dir)
+        plt.sca(ax2)
+        finish_handover_signal(ax2, output_dir)
+
+    return writer.num_rows
+
+def rogue_bs_data_candidates(T, stations, ue_positions, index, num_candidates, attack_periods=None,
+                             handover_threshold=3, time_window=10, min_time_between_handovers=20,
+                             block_size=3600, ue_height=1, rng=None, fading=None,
+                             dataset_path='result/rogue_bs_dataset', csv_path=None, profiler=None,
+                             attack_schedule=None, dtype=np.float32):
+    """
+    大量基站部署時只在候選基站上計算信號與切換，不繪圖
+
+    每個時間區塊重新選擇候選集合：區塊內曾經是最近 num_candidates 個合法基站之一、
+    前一個區塊結束時的服務基站，以及所有惡意基站。候選數量只與區塊內的移動距離
+    有關，不隨模擬時間增加。每個區塊另外重新計算開始前 time_window-1 個時間點，
+    作為新加入候選基站的平均信號歷史。
+
+    Args:
+        T: 時間序列
+        stations: StationTable，前 NUM_BS 個為合法基站，其後為惡意基站
+        ue_positions: UE位置序列 (NUM_UE, T, 2)
+        index: 合法基站的 HexStationIndex
+        num_candidates: 每個位置的合法候選基站數量，也是資料集儲存的候選欄位數
+        attack_periods: 攻擊時間區間列表
+        handover_threshold: 切換閾值
+        time_window: 平均信號的時間窗口(時間步數)
+        min_time_between_handovers: 兩次切換的最小間隔(時間步數)
+        block_size: 每個區塊的時間步數
+        ue_height: UE高度(m)
+        rng: 隨機數產生器
+        fading: 每個樣本獨立的衰落模型 (見 scenario.fading.is_memoryless)，None表示均勻衰落
+        dataset_path: 欄位式資料集輸出目錄
+        csv_path: 另外匯出CSV的路徑，None表示不匯出
+        profiler: StageProfiler，逐區塊量測 signal、handover、dataset_io 階段，None表示不量測
+        attack_schedule: AttackSchedule，指定時忽略 attack_periods
+        dtype: 信號強度型別
+
+    Returns:
+        dict: num_rows 寫入的資料列數、num_handovers 切換次數、rogue_fraction 連上惡意基站的比例、
+            max_candidates 單一區塊的最大候選欄位數 (含惡意基站)
+    """
+    profiler = profiler or NULL_PROFILER
+    num_ue, num_steps = ue_positions.shape[:2]
+    NUM_BS, NUM_RBS = stations.num_bs, stations.num_rbs
+    schedule = resolve_attack_schedule(T, attack_periods, attack_schedule, NUM_RBS)
+    writer = DatasetWriter(dataset_path, NUM_BS, NUM_RBS, num_ue, num_candidates)
+    ue_ids = np.arange(num_ue)
+    rogue_ids = np.broadcast_to(np.arange(NUM_BS, NUM_BS + NUM_RBS), (num_ue, NUM_RBS))
+
+    state = None
+    include = None
+    num_handovers = 0
+    num_rogue = 0
+    max_candidates = 0
+    for start in range(0, num_steps, block_size):
+        end = min(start + block_size, num_steps)
+        history_steps = min(time_window - 1, start)
+        work = num_ue * (end - start)
+
+        with profiler.stage('signal', work):
+            legit_ids = candidate_stations(index, ue_positions[:, start:end], num_candidates,
+                                           block_size=block_size, include=include)
+            station_ids = np.concatenate([legit_ids, rogue_ids], axis=1)
+            Rxlev = calculate_Rxlev(stations, ue_positions[:, start - history_steps:end], ue_height, rng=rng,
+                                    dtype=dtype, station_ids=station_ids, fading=fading)
+            profiler.describe(Rxlev=Rxlev)
+
+        with profiler.stage('handover', work):
+            num_legit = legit_ids.shape[1]
+            attack_rbs = schedule.apply(Rxlev[:, :, num_legit:], T[start - history_steps:end], num_ue=num_ue,
+                                        t_end=T[-1])
+            Rxlev[:, :, num_legit:] = attack_rbs
+            serving, handover, labels, state = simulate_handover_candidates(
+                Rxlev, station_ids, stations.is_rogue, handover_threshold, time_window,
+                min_time_between_handovers, state=state, return_state=True, history_steps=history_steps)
+
+        with profiler.stage('dataset_io', work):
+            writer.append_candidates(ue_ids, T[start:end], serving, legit_ids, Rxlev[:, history_steps:, :num_legit],
+                                     attack_rbs[:, history_steps:], labels)
+
+        # 合法的服務基站必須留在下一個區塊的候選集合中
+        include = np.where(serving[:, -1] < NUM_BS, serving[:, -1], -1)[:, np.newaxis]
+        num_handovers += int(np.count_nonzero(handover))
+        num_rogue += int(np.count_nonzero(labels))
+        max_candidates = max(max_candidates, station_ids.shape[1])
+
+    writer.close()
+    if csv_path is not None:
+        export_csv(dataset_path, csv_path)
+
+    return {
+        'num_rows': writer.num_rows,
+        'num_handovers': num_handovers,
+        'rogue_fraction': num_rogue / max(writer.num_rows, 1),
+        'max_candidates': max_candidates
+    }
+
+def rogue_bs_reports(reports, Rxlev_bs, Rxlev_rbs, NUM_BS, NUM_RBS, attack_periods=None, handover_threshold=3,
+                     window_seconds=1.0, min_handover_interval=2.0, dataset_path='result/rogue_bs_dataset',
+                     csv_path=None, profiler=None, attack_schedule=None):
+    """
+    在量測報告時間點上產生惡意基地台數據，各UE的報告時間可以不同，不繪圖
+
+    Args:
+        reports: ReportSamples
+        Rxlev_bs: 每筆報告的合法基站信號強度 (N, NUM_BS)
+        Rxlev_rbs: 每筆報告的惡意基站信號強度 (N, NUM_RBS)
+        NUM_BS: 合法基站數量
+        NUM_RBS: 惡意基站數量
+        attack_periods: 攻擊時間區間列表
+        handover_threshold: 切換閾值
+        window_seconds: 平均信號的時間窗口(秒)
+        min_handover_interval: 兩次切換的最小間隔(秒)
+        dataset_path: 欄位式資料集輸出目錄，None表示不輸出
+        csv_path: 另外匯出CSV的路徑，None表示不匯出(需要 dataset_path)
+        profiler: StageProfiler，分別量測 handover、dataset_io 階段，None表示不量測
+        attack_schedule: AttackSchedule，指定時忽略 attack_periods
+
+    Returns:
+        np.ndarray: 資料集 (N, NUM_BS + NUM_RBS + 3)，依UE再依時間排列
+    """
+    if csv_path is not None and dataset_path is None:
+        raise ValueError("匯出CSV需要指定 dataset_path")
+    profiler = profiler or NULL_PROFILER
+    T = reports.T
+
+    with profiler.stage('handover', len(reports)):
+        schedule = resolve_attack_schedule(T, attack_periods, attack_schedule, NUM_RBS)
+        attack_rbs = schedule.apply_reports(Rxlev_rbs, reports.ue, reports.tick, T, reports.num_ue)
+        all_signals = np.concatenate([Rxlev_bs, attack_rbs], axis=1)
+        serving, handover, labels = simulate_handover_reports(
+            all_signals, reports, NUM_BS, handover_threshold, window_seconds, min_handover_interval)
+        dataset = build_dataset_rows(reports.t, Rxlev_bs[np.newaxis], attack_rbs[np.newaxis],
+                                     serving[np.newaxis], labels[np.newaxis])
+        profiler.describe(all_signals=all_signals, dataset=dataset)
+
+    if dataset_path is not None:
+        with profiler.stage('dataset_io', len(reports)):
+            with DatasetWriter(dataset_path, NUM_BS, NUM_RBS, reports.num_ue) as writer:
+                writer.append_reports(reports.ue, reports.t, serving, Rxlev_bs, attack_rbs, labels)
+            if csv_path is not None:
+                export_csv(dataset_path, csv_path)
+
+    return dataset
+
+def rogue_bs_handover_sweep(T, Rxlev_bs, Rxlev_rbs, NUM_UE, NUM_BS, NUM_RBS, attack_periods=None,
+                            handover_thresholds=(3,), time_windows=(10,), min_times_between_handovers=(20,),
+                            return_serving=False, profiler=None, attack_schedule=None):
+    """
+    在同一組信號上一次評估多組切換參數，攻擊情境與 rogue_bs_data 相同，不繪圖也不輸出資料集
+
+    Args:
+        T: 時間序列
+        Rxlev_bs: 合法基站信號強度 (NUM_UE, T, NUM_BS)
+        Rxlev_rbs: 惡意基站信號強度 (NUM_UE, T, NUM_RBS)
+        NUM_UE: UE數量
+        NUM_BS: 合法基站數量
+        NUM_RBS: 惡意基站數量
+        attack_periods: 攻擊時間區間列表
+        handover_thresholds: 切換閾值(dB)列表
+        time_windows: 平均信號的時間窗口(時間步數)列表
+        min_times_between_handovers: 兩次切換的最小間隔(時間步數)列表
+        return_serving: 是否回傳每組參數的服務基站序列
+        profiler: StageProfiler，量測 handover 階段，None表示不量測
+        attack_schedule: AttackSchedule，指定時忽略 attack_periods
+
+    Returns:
+        dict: sweep_handover 的結果，另外加上每組參數的
+            - ue_captured_fraction: 曾連上惡意基站的UE比例 (P,)
+            - mean_time_to_first_rogue: 第一次連上惡意基站的平均時間(秒)，沒有UE連上為nan (P,)
+            - mean_rogue_time: 每個UE連上惡意基站的平均時間(秒) (P,)
+    """
+    profiler = profiler or NULL_PROFILER
+    T = np.asarray(T)
+
+    with profiler.stage('handover', NUM_UE * len(T)):
+        schedule = resolve_attack_schedule(T, attack_periods, attack_schedule, NUM_RBS)
+        attack_rbs = schedule.apply(Rxlev_rbs, T, num_ue=NUM_UE)
+        all_signals = np.concatenate([Rxlev_bs, attack_rbs], axis=2)
+        del attack_rbs
+        results = sweep_handover(all_signals, NUM_BS, handover_thresholds, time_windows,
+                                 min_times_between_handovers, return_serving=return_serving)
+
+        # 被捕獲比例與平均首次連上惡意基站時間，後者只計入曾連上惡意基站的UE
+        attached = results['first_rogue_step'] >= 0
+        num_attached = attached.sum(axis=1)
+        first_time = np.where(attached, T[np.maximum(results['first_rogue_step'], 0)], 0.0).sum(axis=1)
+        results['mean_time_to_first_rogue'] = np.where(num_attached > 0, first_time / np.maximum(num_attached, 1),
+                                                       np.nan)
+        results['ue_captured_fraction'] = attached.mean(axis=1)
+        results['mean_rogue_time'] = results['rogue_steps'].mean(axis=1) * (T[-1] - T[0]) / (len(T) - 1)
+        profiler.describe(all_signals=all_signals)
+    return results
+
+def plot_detection_histograms(evaluator, bins=20, output_dir=RESULT_DIR):
+    """
+    繪製偵測品質的直方圖 (偵測時間與每次執行的 precision、recall、誤報率、被捕獲比例)
+
+    Args:
+        evaluator: scenario.evaluation.DetectionEvaluator
+        bins: 每個直方圖的區間數量
+        output_dir: 圖檔輸出目錄
+    """
+    import matplotlib.pyplot as plt
+
+    # 沒有資料的指標 (例如未提供 serving 時的被捕獲比例) 不繪製
+    histograms = {name: value for name, value in evaluator.histograms(bins).items() if value[0].any()}
+    labels = {
+        'time_to_detect_s': "Time to detect (s)",
+        'precision': "Precision per run",
+        'recall': "Recall per run",
+        'false_alarms_per_ue_hour': "False alarms per UE-hour",
+        'ue_captured_fraction': "UE captured fraction per run"
+    }
+    fig, axes = plt.subplots(1, len(histograms), figsize=(4 * len(histograms), 3.5))
+    for ax, (name, (counts, edges)) in zip(np.atleast_1d(axes), histograms.items()):
+        ax.stairs(counts, edges, fill=True, alpha=0.7)
+        ax.set_xlabel(labels.get(name, name))
+        ax.set_ylabel("Count")
+        ax.grid(True)
+    fig.suptitle("Detection Quality")
+    plt.tight_layout()
+    os.makedirs(output_dir, exist_ok=True)
+    plt.savefig(os.path.join(output_dir, 'Detection_Evaluation_Histograms.png'), bbox_inches='tight', dpi=150)
+    plt.close(fig)
@@ -1,20 +1,81 @@
+import os
+
 import matplotlib.pyplot as plt
+from matplotlib.colors import LogNorm
 from matplotlib.patches import Circle
 import numpy as np
 
-def plot_ue_trajectories(bs_coords, rbs_coords, ue_positions, map_size, radius):
+# 圖檔預設輸出目錄
+RESULT_DIR = 'result'
+
+# UE 數量超過此值時改用密度圖
+DENSITY_MIN_UE = 20
+
+def trajectory_histogram(ue_positions, map_size, bins=256, ue_chunk=64):
+    """
+    將所有 UE 的軌跡取樣點累計成二維佔用直方圖，逐批 UE 計算以限制記憶體用量。
+
+    Args:
+        ue_positions (np.ndarray): UE 的移動軌跡 (K, T, 2)，可為 memmap。
+        map_size (float): 地圖大小（正方形邊長）。
+        bins (int): 每個方向的格數。
+        ue_chunk (int): 每批處理的 UE 數量。
+
+    Returns:
+        np.ndarray: 每格的取樣點數 (bins, bins)，第一維為 y、第二維為 x。
+    """
+    counts = np.zeros(bins * bins, dtype=np.int64)
+    scale = bins / map_size
+    for start in range(0, len(ue_positions), ue_chunk):
+        points = np.asarray(ue_positions[start:start + ue_chunk]).reshape(-1, 2)
+        ix = np.clip((points[:, 0] * scale).astype(np.int64), 0, bins - 1)
+        iy = np.clip((points[:, 1] * scale).astype(np.int64), 0, bins - 1)
+        counts += np.bincount(iy * bins + ix, minlength=bins * bins)
+    return counts.reshape(bins, bins)
+
+def sample_ue_indices(num_ue, num_samples):
+    """在所有 UE 中平均挑選 num_samples 個 UE 的索引"""
+    num_samples = min(num_samples, num_ue)
+    if num_samples <= 0:
+        return np.empty(0, dtype=np.int64)
+    return np.unique(np.linspace(0, num_ue - 1, num_samples).round().astype(np.int64))
+
+def plot_ue_trajectories(bs_coords, rbs_coords, ue_positions, map_size, radius, mode='auto',
+                         sample_ues=None, num_sample_paths=5, bins=256, ue_chunk=64, output_dir=RESULT_DIR):
     """
     繪製 UE 的移動軌跡，包括合法基站和偽基站的位置。
 
+    'paths' 模式逐一畫出每個 UE 的軌跡；'density' 模式將所有軌跡累計成一張佔用密度圖，
+    只另外畫出少數樣本 UE 的軌跡，適合數百至數千個 UE。
+
     Args:
         bs_coords (np.ndarray): 合法基站的座標 (N, 2)。
         rbs_coords (np.ndarray): 偽基站的座標 (M, 2)。
         ue_positions (np.ndarray): UE 的移動軌跡 (K, T, 2)，K 表示 UE 數量，T 表示時間步長。
         map_size (float): 地圖大小（正方形邊長）。
         radius (float): 基站的覆蓋半徑。
+        mode (str): 'paths'、'density' 或 'auto'（UE 數量超過 DENSITY_MIN_UE 時使用密度圖）。
+        sample_ues (list[int]): 密度圖模式下要畫出軌跡的 UE 索引，None 表示平均挑選。
+        num_sample_paths (int): sample_ues 為 None 時挑選的 UE 數量。
+        bins (int): 密度圖每個方向的格數。
+        ue_chunk (int): 計算密度圖時每批處理的 UE 數量。
+        output_dir (str): 圖檔輸出目錄。
     """
+    if mode not in ('auto', 'paths', 'density'):
+        raise ValueError(f"mode 必須是 'auto'、'paths' 或 'density'，收到 {mode!r}")
+    if mode == 'auto':
+        mode = 'density' if len(ue_positions) > DENSITY_MIN_UE else 'paths'
+
     plt.figure(figsize=(10, 10))
 
+    # 繪製軌跡密度圖，置於基站與覆蓋範圍之下
+    if mode == 'density':
+        counts = trajectory_histogram(ue_positions, map_size, bins, ue_chunk)
+        image = plt.imshow(np.ma.masked_equal(counts, 0), origin='lower', extent=(0, map_size, 0, map_size),
+                           cmap='viridis', norm=LogNorm(vmin=1, vmax=max(counts.max(), 1)),
+                           interpolation='nearest', zorder=0)
+        plt.colorbar(image, orientation='horizontal', fraction=0.046, pad=0.08, label='UE samples per cell')
+
     # 繪製合法基站的覆蓋範圍及標籤
     for idx, pos in enumerate(bs_coords[:7]):  # 只標記前 7 個合法基站
         circle = Circle(pos, radius, facecolor='none', edgecolor='gray', alpha=0.5)
@@ -25,8 +86,14 @@ def plot_ue_trajectories(bs_coords, rbs_coords, ue_positions, map_size, radius):
     plt.scatter(bs_coords[:, 0], bs_coords[:, 1], c='blue', s=100, label='Legitimate BS')
     plt.scatter(rbs_coords[:, 0], rbs_coords[:, 1], c='red', s=100, marker='s', label='Rogue BS')
 
-    # 繪製 UE 的移動軌跡
-    for ue in range(len(ue_positions)):
+    # 繪製 UE 的移動軌跡 (密度圖模式只畫樣本 UE)
+    if mode == 'paths':
+        ues = range(len(ue_positions))
+    elif sample_ues is None:
+        ues = sample_ue_indices(len(ue_positions), num_sample_paths)
+    else:
+        ues = sample_ues
+    for ue in ues:
         color = plt.cm.rainbow(ue / len(ue_positions))
         plt.plot(ue_positions[ue, :, 0], ue_positions[ue, :, 1], color=color, alpha=0.5, label=f'UE {ue+1} path')
         plt.scatter(ue_positions[ue, 0, 0], ue_positions[ue, 0, 1], color=color, s=100, marker='o',
@@ -42,4 +109,5 @@ def plot_ue_trajectories(bs_coords, rbs_coords, ue_positions, map_size, radius):
     # 繪製地圖邊界
     plt.plot([0, map_size, map_size, 0, 0], [0, 0, map_size, map_size, 0], 'k--', label='Map Boundary')
     plt.tight_layout()
-    plt.savefig('result/UE_Movement_Trajectories.png', bbox_inches='tight', dpi=300)
+    os.makedirs(output_dir, exist_ok=True)
+    plt.savefig(os.path.join(output_dir, 'UE_Movement_Trajectories.png'), bbox_inches='tight', dpi=300)